@@ -0,0 +1,267 @@
+"""
+scraping pipeline benchmark - replays recorded (or synthetic) explore and results pages without the live site.
+
+run from the flightScraper dir:
+    python -m benchmarks.bench_pipeline --out bench_results.json [--browser] [--compare previous.json]
+    python -m benchmarks.bench_pipeline --record   (saves the live pages as fixtures, once)
+"""
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+from functools import partial
+from threading import Thread
+from datetime import datetime
+import urllib.request
+import statistics
+import argparse
+import platform
+import tempfile
+import json
+import time
+import os
+
+from benchmarks.fixtures import build_explore_page, build_results_page, load_page, save_page
+from flights.shortener import LinkShortener
+from flights.deals import Deal, DealSet
+from flights.ranking import rank_deals
+from flights.report import DealReport
+from flights.flights import Flights
+from flights.selector_registry import SelectorRegistry
+from flights import parser
+
+
+def timed(func, runs):
+    """
+    run func several times
+    :param func:
+    :param runs:
+    :return: timings (seconds), last result
+    """
+    timings = []
+    result = None
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - start)
+
+    return timings, result
+
+
+def summarize(timings):
+    return {'runs': len(timings), 'mean': statistics.mean(timings), 'min': min(timings), 'max': max(timings)}
+
+
+def serve_pages(pages):
+    """
+    local http stand-in for the site - serves the pages from a temp dir
+    :param pages: {file name: html}
+    :return: server, base url
+    """
+    pages_dir = tempfile.mkdtemp(prefix='flights-bench-')
+    for name, html in pages.items():
+        with open(os.path.join(pages_dir, name), 'w', encoding='utf-8') as page:
+            page.write(html)
+
+    handler = partial(QuietHandler, directory=pages_dir)
+    server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    Thread(target=server.serve_forever, daemon=True).start()
+
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+class QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+def run_benchmark(cfg_data, runs=20, use_browser=False, cfg_file='flights/cfg.json'):
+    """
+    per-stage timings of the scraping pipeline
+    :param cfg_data: loaded cfg.json
+    :param runs: repetitions per stage
+    :param use_browser: measure page load/wait in a real (headless) chrome instead of plain http
+    :param cfg_file:
+    :return: results dict
+    """
+    xpaths = cfg_data['xPaths']
+    explore_html, explore_recorded = load_page('explore.html', build_explore_page, xpaths)
+    results_html, results_recorded = load_page('results.html', build_results_page, xpaths)
+    stages = {}
+
+    # parse
+    selectors = SelectorRegistry.from_cfg(xpaths)
+    general_timings, general_results = timed(lambda: parser.parse_general_results(explore_html, selectors.explore),
+                                             runs)
+    stages['explore_parse'] = summarize(general_timings)
+
+    parse_timings, (boxes, _) = timed(lambda: parser.parse_flight_boxes(results_html, selectors.flight_box), runs)
+    stages['results_parse'] = summarize(parse_timings)
+
+    # deal records (price/dates/times decoding)
+    def build_deals():
+        deals = DealSet()
+        for box in boxes:
+            if box.from_company == box.to_company:
+                deals.append(Deal.from_flight_box(box, 'Athens', 'Sep 5 - Sep 12', 2023, cfg_data['site']))
+        return deals
+
+    deal_timings, deals = timed(build_deals, runs)
+    stages['deal_build'] = summarize(deal_timings)
+
+    # shorten (local stub backend, cold cache every run)
+    links = deals.column('link')
+    shorten_timings, _ = timed(lambda: LinkShortener(backend=lambda url: f"https://tiny.example/{hash(url)}")
+                               .shorten_all(links), runs)
+    stages['shorten'] = summarize(shorten_timings)
+
+    # ranking + report render (text pages and html body, as in Flights.generate_top_deal_table)
+    rank_timings, ranked = timed(lambda: rank_deals(deals, cfg_data['ranking']), runs)
+    stages['ranking'] = summarize(rank_timings)
+
+    def render_report():
+        report = DealReport(ranked, "Top Flights", page_size=cfg_data['report']['page_size'],
+                            group_by_destination=cfg_data['report']['group_by_destination'], sort=False)
+        return report.pages(), report.html()
+
+    render_timings, _ = timed(render_report, runs)
+    stages['table_render'] = summarize(render_timings)
+
+    # page load + wait
+    server, base_url = serve_pages({'explore.html': explore_html, 'results.html': results_html})
+    try:
+        if use_browser:
+            load_timings, wait_timings = browser_page_load(cfg_file, base_url, runs)
+            stages['page_load'] = summarize(load_timings)
+            stages['wait'] = summarize(wait_timings)
+        else:
+            load_timings, _ = timed(lambda: urllib.request.urlopen(f"{base_url}/results.html").read(), runs)
+            stages['page_load_http'] = summarize(load_timings)
+    finally:
+        server.shutdown()
+
+    # per destination: load (+ wait) the results page, parse it, build the deals
+    per_destination = sum(stages[stage]['mean'] for stage in
+                          ('page_load', 'wait', 'page_load_http', 'results_parse', 'deal_build') if stage in stages)
+
+    return {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'parser': 'lxml' if parser.has_fast_parser() else 'bs4',
+        'fixtures': {'explore_recorded': explore_recorded, 'results_recorded': results_recorded,
+                     'destinations': len(general_results), 'flight_boxes': len(boxes), 'deals': len(deals)},
+        'stages': stages,
+        'throughput': {
+            'destinations_per_minute': 60 / per_destination,
+            'flight_boxes_per_second': len(boxes) / stages['results_parse']['mean'],
+        },
+    }
+
+
+def browser_page_load(cfg_file, base_url, runs):
+    """
+    results page load and results wait timings in headless chrome (against the local stand-in)
+    :param cfg_file:
+    :param base_url:
+    :param runs:
+    :return: load timings, wait timings
+    """
+    load_timings = []
+    wait_timings = []
+    with Flights(sender=None, receiver=None, s_password=None, subject=None, body=None, driver_path='',
+                 cfg_file=cfg_file, teardown=True) as bot:
+        for _ in range(runs):
+            start = time.perf_counter()
+            bot.get(f"{base_url}/results.html")
+            load_timings.append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            bot._wait_for('flight_box_xpath')
+            wait_timings.append(time.perf_counter() - start)
+
+    return load_timings, wait_timings
+
+
+def record_fixtures(cfg_file):
+    """
+    save the live explore page and the first destination's results page as fixtures - recorded in the browser
+    (no http fast path, result store, capture or ranking), the results page while it is open
+    :param cfg_file:
+    :return:
+    """
+    with open(cfg_file) as config_file:
+        cfg_data = json.load(config_file)
+    for section in ('http', 'store', 'capture', 'ranking'):
+        cfg_data[section]['enabled'] = False
+
+    with tempfile.NamedTemporaryFile('w', suffix='.json', delete=False) as record_cfg:
+        json.dump(cfg_data, record_cfg)
+
+    try:
+        with Flights(sender=None, receiver=None, s_password=None, subject=None, body=None, driver_path='',
+                     cfg_file=record_cfg.name, teardown=True) as bot:
+            bot.load_explore_page()
+            bot._wait_for('flight_xpath', timeout=bot.cfg_data['waits']['results_timeout'])
+            save_page('explore.html', bot.page_source)
+
+            bot.get_general_flights_info()
+            results_url = bot._destination_results_url(0)
+            if not results_url:
+                raise ValueError(f"no results page url for {bot.cities[0]} (destination code or dates unknown)")
+            bot._load_results_page(results_url, bot.cities[0])
+            save_page('results.html', bot.page_source)
+    finally:
+        os.remove(record_cfg.name)
+
+
+def compare(current, previous_file):
+    """
+    print the per-stage change from a previous results file
+    :param current: results dict
+    :param previous_file:
+    :return:
+    """
+    with open(previous_file) as previous_results:
+        previous = json.load(previous_results)
+
+    print(f"\n{'Stage':<18}{'Previous(ms)':>14}{'Current(ms)':>14}{'Change':>10}")
+    for stage, summary in current['stages'].items():
+        if stage not in previous['stages']:
+            continue
+        before = previous['stages'][stage]['mean'] * 1000
+        after = summary['mean'] * 1000
+        print(f"{stage:<18}{before:>14.3f}{after:>14.3f}{(after - before) / before:>+10.1%}")
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Flights scraping pipeline benchmark")
+    arg_parser.add_argument('--cfg', default='flights/cfg.json')
+    arg_parser.add_argument('--runs', type=int, default=20)
+    arg_parser.add_argument('--browser', action='store_true', help="measure page load/wait in headless chrome")
+    arg_parser.add_argument('--out', default='bench_results.json', help="machine-readable results file")
+    arg_parser.add_argument('--compare', help="previous results file to compare with")
+    arg_parser.add_argument('--record', action='store_true', help="record the live pages as fixtures")
+    args = arg_parser.parse_args()
+
+    if args.record:
+        record_fixtures(args.cfg)
+        return
+
+    with open(args.cfg) as config_file:
+        cfg_data = json.load(config_file)
+
+    results = run_benchmark(cfg_data, runs=args.runs, use_browser=args.browser, cfg_file=args.cfg)
+
+    print(f"\n{'Stage':<18}{'Mean(ms)':>10}{'Min(ms)':>10}{'Max(ms)':>10}")
+    for stage, summary in results['stages'].items():
+        print(f"{stage:<18}{summary['mean'] * 1000:>10.3f}{summary['min'] * 1000:>10.3f}"
+              f"{summary['max'] * 1000:>10.3f}")
+    print(f"\nDestinations/minute: {results['throughput']['destinations_per_minute']:.1f}")
+    print(f"Flight boxes/second: {results['throughput']['flight_boxes_per_second']:.1f}")
+
+    with open(args.out, 'w') as out:
+        json.dump(results, out, indent=2)
+
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
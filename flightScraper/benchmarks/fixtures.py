@@ -0,0 +1,96 @@
+import os
+import re
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+CITIES = [('Athens', 'ATH'), ('Rome', 'FCO'), ('Paris', 'CDG'), ('London', 'LHR'), ('Berlin', 'BER'),
+          ('Vienna', 'VIE'), ('Prague', 'PRG'), ('Budapest', 'BUD'), ('Madrid', 'MAD'), ('Larnaca', 'LCA')]
+CARRIERS = ['El Al', 'Aegean', 'Wizz Air', 'Ryanair', 'Lufthansa']
+
+
+def _classes_of(xpath):
+    """
+    class value of an xpath like //div[@class="a b"] or //div[contains(@class, "a")]
+    :param xpath:
+    :return:
+    """
+    return re.search(r'@class[^"]*"([^"]+)"', xpath).group(1)
+
+
+def build_explore_page(xpaths, destinations=30):
+    """
+    synthetic explore page matching the cfg xPaths (used when no recorded page is saved)
+    :param xpaths: cfg 'xPaths'
+    :param destinations: number of results
+    :return: html
+    """
+    results = []
+    for i in range(destinations):
+        city, code = CITIES[i % len(CITIES)]
+        day = 1 + i % 20
+        results.append(f"""
+        <div class="{_classes_of(xpaths['flight_xpath'])}">
+          <a href="/flights/TLV-{code}/2023-09-{day:02d}/2023-09-{day + 7:02d}">
+            <div class="{xpaths['city_class']}">{city}</div>
+            <div class="{xpaths['date_class']}">Sep {day} - Sep {day + 7}</div>
+            <div class="{xpaths['price_class']}">from ${120 + 17 * i}</div>
+          </a>
+        </div>""")
+
+    return f"<html><body><main>{''.join(results)}</main></body></html>"
+
+
+def build_results_page(xpaths, boxes=40):
+    """
+    synthetic results page matching the cfg xPaths (used when no recorded page is saved)
+    :param xpaths: cfg 'xPaths'
+    :param boxes: number of flight boxes
+    :return: html
+    """
+    results = []
+    for i in range(boxes):
+        carrier = CARRIERS[i % len(CARRIERS)]
+        return_carrier = carrier if i % 4 else CARRIERS[(i + 1) % len(CARRIERS)]
+        results.append(f"""
+        <div class="{_classes_of(xpaths['flight_box_xpath'])} nrc6-mod-pres-default">
+          <div class="legs">
+            <div class="{xpaths['f_times_class']}">{6 + i % 6}:05 am – {1 + i % 11}:40 pm</div>
+            <div class="carrier">{carrier}</div>
+          </div>
+          <div class="legs">
+            <div class="{xpaths['f_times_class']}">{1 + i % 10}:15 pm – {2 + i % 10}:55 pm</div>
+            <div class="carrier">{return_carrier}</div>
+          </div>
+          <div class="fees">
+            <div class="{xpaths['f_carry_bag_class']}">1</div>
+            <div class="{xpaths['f_carry_bag_class']}">{'?' if i % 3 == 0 else '0'}</div>
+          </div>
+          <div class="{xpaths['f_link_class']}">
+            <a href="/book/flight?code=bench{i}&amp;sort=price">View Deal</a>
+            <div class="{xpaths['f_price_class']}">${150 + 11 * i}</div>
+          </div>
+        </div>""")
+
+    return f"<html><body><section>{''.join(results)}</section></body></html>"
+
+
+def load_page(name, builder, xpaths, **kwargs):
+    """
+    recorded page from the fixtures dir if saved (see bench_pipeline --record), synthetic page otherwise
+    :param name: fixture file name
+    :param builder: synthetic page builder
+    :param xpaths: cfg 'xPaths'
+    :return: html, True if recorded
+    """
+    path = os.path.join(FIXTURES_DIR, name)
+    if os.path.exists(path):
+        with open(path, encoding='utf-8') as page:
+            return page.read(), True
+
+    return builder(xpaths, **kwargs), False
+
+
+def save_page(name, html):
+    os.makedirs(FIXTURES_DIR, exist_ok=True)
+    with open(os.path.join(FIXTURES_DIR, name), 'w', encoding='utf-8') as page:
+        page.write(html)
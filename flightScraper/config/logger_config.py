@@ -1,5 +1,12 @@
+from logging.handlers import RotatingFileHandler, QueueHandler, QueueListener
+from datetime import datetime
+from threading import Lock
 import logging
-from logging.handlers import RotatingFileHandler
+import atexit
+import queue
+import copy
+import json
+import os
 
 
 # Logging Levels:
@@ -87,3 +94,102 @@ def configure_logger(
     logger.propagate = propagate
 
     return logger
+
+
+# standard LogRecord attributes (anything else on a record is an 'extra' field)
+_RECORD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'asctime', 'taskName'}
+
+# one log file and listener per process (see configure_structured_logger)
+_structured_lock = Lock()
+_structured_handler = None
+_structured_listener = None
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    json lines log format - one object per record (time, level, logger, thread, message, extra fields, exception)
+    """
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'thread': record.threadName,
+            'message': record.getMessage(),
+        }
+        entry.update({key: value for key, value in vars(record).items() if key not in _RECORD_ATTRS})
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+
+        return json.dumps(entry, default=str)
+
+
+class _StructuredQueueHandler(QueueHandler):
+    """
+    queue handler that keeps the exception as a separate field (instead of formatting it into the message)
+    """
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        if record.exc_info:
+            record.exception = logging.Formatter().formatException(record.exc_info)
+        record.exc_info = None
+        record.exc_text = None
+
+        return record
+
+
+def configure_structured_logger(
+        logger_name=None,
+        logging_level=logging.INFO,
+        stream_level=logging.CRITICAL,
+        print_logging=False,
+        log_dir='log_files',
+        file_prefix='bot',
+        message_format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+):
+    """
+    non-blocking structured logging - loggers only put records on a queue (QueueHandler), a background
+    QueueListener writes them as json lines to the process log file (and prints them as text).
+    idempotent - every logger of the process shares one listener and one timestamped file in log_dir
+    :param logger_name:
+    :param logging_level:
+    :param stream_level:
+    :param print_logging:
+    :param log_dir: relative or absolute dir (created if missing)
+    :param file_prefix: log file name prefix (of the first call)
+    :param message_format: printed format
+    :return: Logging.logger object
+    """
+    global _structured_handler, _structured_listener
+
+    with _structured_lock:
+        if _structured_listener is None:
+            os.makedirs(log_dir, exist_ok=True)
+            log_output_path = os.path.join(log_dir, f"{file_prefix}-log_file-{datetime.now():%d-%m-%Y_%H-%M-%S}.jsonl")
+
+            file_handler = logging.FileHandler(log_output_path, encoding='utf-8')
+            file_handler.setFormatter(JsonFormatter())
+            handlers = [file_handler]
+            if print_logging:
+                terminal_handle = logging.StreamHandler()
+                terminal_handle.setLevel(stream_level)
+                terminal_handle.setFormatter(logging.Formatter(message_format))
+                handlers.append(terminal_handle)
+
+            log_queue = queue.SimpleQueue()
+            _structured_handler = _StructuredQueueHandler(log_queue)
+            _structured_listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+            _structured_listener.start()
+            # flush the queued records on exit
+            atexit.register(_structured_listener.stop)
+
+        logger = logging.getLogger(logger_name)
+        if _structured_handler not in logger.handlers:
+            logger.addHandler(_structured_handler)
+        logger.setLevel(logging_level)
+        logger.propagate = False
+
+    return logger
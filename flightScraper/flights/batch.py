@@ -0,0 +1,161 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from threading import Lock
+import logging
+import json
+import os
+
+from flights.selector_registry import SelectorRegistry
+from flights.session_pool import SessionPool
+from flights.throttle import RateLimiter
+
+
+def load_jobs(jobs_file):
+    """
+    load batch search jobs - a json list of jobs, each with an origin and either a month (range search) or
+    depart/return dates (exact search), e.g.
+    {"origin": "TLV", "year": 2024, "month": 9, "duration": "5,10", "carry": 1, "checked": 0}
+    {"origin": "TLV", "depart": 20240905, "return": 20240912, "carry": 0, "checked": 1}
+    :param jobs_file:
+    :return: list of jobs (with an 'id' used for resuming)
+    """
+    with open(jobs_file) as jobs:
+        jobs_data = json.load(jobs)
+
+    for job in jobs_data:
+        if 'month' not in job and not ('depart' in job and 'return' in job):
+            raise ValueError(f"job needs a month or depart/return dates: {job}")
+        job['id'] = job_id(job)
+
+    return jobs_data
+
+
+def job_id(job):
+    """
+    stable job identifier (same search = same id)
+    :param job:
+    :return:
+    """
+    keys = ['origin', 'year', 'month', 'duration', 'depart', 'return', 'carry', 'checked']
+    return "|".join(str(job.get(key, '')) for key in keys)
+
+
+def scrape_job(flights_bot, job, desc=None, refresh=False):
+    """
+    run a search job in a (borrowed) browser session
+    :param flights_bot: Flights instance
+    :param job:
+    :param desc: progress bar description
+    :param refresh: scrape even the routes that are fresh in the result store (e.g. price monitoring)
+    :return: all the deals (a copy - the session goes back to the pool), ranking is left to the reports
+    """
+    flights_bot.loc_from = job['origin']
+    if 'depart' in job:
+        flights_bot.load_explore_page(is_exact=True, depart_date=job['depart'], return_date=job['return'])
+    else:
+        flights_bot.load_explore_page(duration=job.get('duration'), year=job.get('year'), month=job['month'])
+    flights_bot.get_general_flights_info()
+    flights_bot.get_top_flights(carry=job.get('carry'), checked=job.get('checked'),
+                                desc=desc if desc else f"Finding Top Deals ({job['id']}): ", refresh=refresh)
+
+    return flights_bot.deals.copy()
+
+
+class BatchScheduler:
+    def __init__(self, flights_factory, cfg_data, output_file=None, state_file=None, on_results=None, logger=None):
+        """
+        runs batch search jobs across a bounded pool of browser workers (rate limited per site),
+        writing all the deals to one output file. completed jobs are recorded in the state file,
+        so an interrupted run resumes from where it stopped
+        :param flights_factory: callable(rate_limiter, slot index) -> new Flights instance (see SessionPool)
+        :param cfg_data: loaded cfg.json
+        :param output_file: consolidated results (json lines), cfg 'batch' -> 'output_file' if not given
+        :param state_file: completed jobs (json lines), cfg 'batch' -> 'state_file' if not given
+        :param on_results: callable(job, deals) called with every completed job's DealSet (e.g. fan-out)
+        :param logger:
+        """
+        # fail before any browser starts if the selectors are broken
+        SelectorRegistry.from_cfg(cfg_data['xPaths'])
+
+        batch_cfg = cfg_data['batch']
+        self.workers = batch_cfg['workers']
+        self.output_file = output_file if output_file else batch_cfg['output_file']
+        self.state_file = state_file if state_file else batch_cfg['state_file']
+        self.on_results = on_results
+        self.logger = logger if logger else logging.getLogger(__name__)
+
+        self.rate_limiter = RateLimiter.from_cfg(cfg_data['throttle'], min_interval=batch_cfg['min_request_interval'],
+                                                logger=self.logger)
+        self.session_pool = SessionPool(lambda index: flights_factory(self.rate_limiter, index), self.workers,
+                                        logger=self.logger)
+        self._write_lock = Lock()
+
+    def completed_jobs(self):
+        """
+        ids of the jobs completed by previous (interrupted) runs
+        :return: set of job ids
+        """
+        if not os.path.exists(self.state_file):
+            return set()
+
+        with open(self.state_file) as state:
+            return {json.loads(line)['id'] for line in state if line.strip()}
+
+    def run(self, jobs):
+        """
+        run all the jobs that weren't completed yet
+        :param jobs: list of jobs (see load_jobs)
+        :return: number of jobs that failed
+        """
+        completed = self.completed_jobs()
+        pending = [job for job in jobs if job['id'] not in completed]
+        self.logger.info(f"batch: {len(pending)} jobs to run ({len(jobs) - len(pending)} already completed)")
+
+        with self.session_pool:
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                failed = sum(not ok for ok in executor.map(self._run_job, pending))
+
+        self.logger.info(f"batch finished ({failed} failed jobs)")
+        return failed
+
+    def _run_job(self, job):
+        """
+        run a single search job in a borrowed browser session
+        :param job:
+        :return: True if the job completed
+        """
+        try:
+            with self.session_pool.borrow() as flights_bot:
+                deals = scrape_job(flights_bot, job)
+        except Exception as e:
+            self.logger.exception(f"issue with batch job {job['id']}: {e}")
+            return False
+
+        # fan-out first - a job is only recorded as completed (not re-run on resume) once it was delivered
+        if self.on_results:
+            try:
+                self.on_results(job, deals)
+            except Exception as e:
+                self.logger.exception(f"issue with the results of batch job {job['id']}: {e}")
+                return False
+
+        self._write_results(job, deals.to_records())
+        return True
+
+    def _write_results(self, job, deals):
+        """
+        append the job's deals to the output and mark it as completed
+        :param job:
+        :param deals:
+        :return:
+        """
+        scraped_at = datetime.now().isoformat(timespec='seconds')
+        with self._write_lock:
+            with open(self.output_file, 'a') as output:
+                for deal in deals:
+                    output.write(json.dumps({'job': job['id'], 'origin': job['origin'], 'scraped_at': scraped_at,
+                                             **deal}) + "\n")
+            with open(self.state_file, 'a') as state:
+                state.write(json.dumps({'id': job['id'], 'deals': len(deals), 'scraped_at': scraped_at}) + "\n")
+
+        self.logger.info(f"batch job {job['id']} done ({len(deals)} deals)")
@@ -0,0 +1,85 @@
+import re
+
+# the page is parsed (when lxml is available) for the headings and captcha elements of a block page
+try:
+    from lxml import etree, html as lxml_html
+except ImportError:
+    etree = None
+
+# page states
+OK = 'ok'
+EMPTY = 'empty'
+BLOCKED = 'blocked'
+CAPTCHA = 'captcha'
+
+
+class SiteBlockedError(Exception):
+    def __init__(self, state, url):
+        """
+        the site served a block / captcha page instead of the results
+        :param state: BLOCKED or CAPTCHA
+        :param url:
+        """
+        super().__init__(f"site returned a {state} page: {url}")
+        self.state = state
+        self.url = url
+
+
+def phrases_pattern(phrases):
+    """
+    case insensitive regex matching any of the phrases (literal text, not regexes)
+    :param phrases: list of phrases
+    :return: compiled pattern, None if no phrases
+    """
+    if not phrases:
+        return None
+
+    return re.compile("(?:" + "|".join(re.escape(phrase) for phrase in phrases) + ")", re.IGNORECASE)
+
+
+def _search(pattern, *texts):
+    return pattern is not None and any(pattern.search(text or '') for text in texts)
+
+
+class BlockDetector:
+    def __init__(self, blocking_cfg):
+        """
+        classifies a loaded page as ok, empty (no results), blocked or captcha (cfg 'blocking').
+        only what a block page shows is checked - the url, the title, the page headings and captcha widget elements,
+        not the whole source (a normal page can embed a captcha script or mention 'access denied' in its scripts)
+        :param blocking_cfg: cfg 'blocking'
+        """
+        self.captcha_pattern = phrases_pattern(blocking_cfg['captcha_patterns'])
+        self.block_pattern = phrases_pattern(blocking_cfg['block_patterns'])
+        self.block_url_pattern = phrases_pattern(blocking_cfg['block_url_patterns'])
+        self.heading_xpath = None
+        self.captcha_element_xpath = None
+        if etree is not None:
+            self.heading_xpath = etree.XPath(blocking_cfg['heading_xpath'])
+            self.captcha_element_xpath = etree.XPath(" | ".join(blocking_cfg['captcha_element_xpaths']))
+
+    def classify(self, url, title, page_html, results_found):
+        """
+        page state
+        :param url: current url
+        :param title: page title
+        :param page_html: page source (only parsed when no results were found, and lxml is available)
+        :param results_found: the expected results loaded
+        :return: OK, EMPTY, BLOCKED or CAPTCHA
+        """
+        if results_found:
+            return OK
+
+        headings = []
+        has_captcha_element = False
+        if etree is not None and page_html:
+            tree = lxml_html.fromstring(page_html)
+            headings = [element.text_content() for element in self.heading_xpath(tree)]
+            has_captcha_element = bool(self.captcha_element_xpath(tree))
+
+        if has_captcha_element or _search(self.captcha_pattern, url, title, *headings):
+            return CAPTCHA
+        if _search(self.block_url_pattern, url) or _search(self.block_pattern, title, *headings):
+            return BLOCKED
+
+        return EMPTY
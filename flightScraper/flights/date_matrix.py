@@ -0,0 +1,133 @@
+from datetime import date, timedelta
+from calendar import monthrange
+
+import numpy as np
+
+
+def matrix_axes(year, month, duration, today=None):
+    """
+    depart days (the month's days that haven't passed) and trip lengths of a date matrix search
+    :param year:
+    :param month:
+    :param duration: trip length range (d,d)
+    :param today: first possible depart day (today if not given)
+    :return: list of depart dates, array of trip lengths (days)
+    """
+    today = today if today else date.today()
+    min_days, max_days = (int(days) for days in str(duration).split(','))
+    if min_days > max_days:
+        raise ValueError(f"invalid duration range: {duration}")
+
+    depart_dates = [date(year, month, day) for day in range(1, monthrange(year, month)[1] + 1)
+                    if date(year, month, day) >= today]
+
+    return depart_dates, np.arange(min_days, max_days + 1)
+
+
+def trip_dates_text(depart_date, return_date):
+    """
+    trip dates in the explore page format (see urls.parse_explore_dates)
+    :param depart_date:
+    :param return_date:
+    :return: e.g. 'Sep 05 - Sep 12'
+    """
+    return f"{depart_date.strftime('%b %d')} - {return_date.strftime('%b %d')}"
+
+
+class DateMatrix:
+    def __init__(self, destination, depart_dates, durations):
+        """
+        depart x return price grid of one destination - a dense array (depart day rows, trip length columns,
+        return = depart + trip length), nan for the cells without a price
+        :param destination:
+        :param depart_dates: list of date
+        :param durations: trip lengths (days)
+        """
+        self.destination = destination
+        self.depart_dates = list(depart_dates)
+        self.durations = np.asarray(durations, dtype=np.intc)
+        self.prices = np.full((len(self.depart_dates), len(self.durations)), np.nan)
+        # (row, col) -> cheapest Deal of the cell
+        self.deals = {}
+
+    @classmethod
+    def for_month(cls, destination, year, month, duration, today=None):
+        """
+        grid of a whole month
+        :param destination:
+        :param year:
+        :param month:
+        :param duration: trip length range (d,d)
+        :param today:
+        :return: DateMatrix
+        """
+        return cls(destination, *matrix_axes(year, month, duration, today=today))
+
+    @property
+    def shape(self):
+        return self.prices.shape
+
+    def return_date(self, row, col):
+        return self.depart_dates[row] + timedelta(days=int(self.durations[col]))
+
+    def cells(self):
+        """
+        all the cells of the grid
+        :return: list of (row, col, depart date, return date)
+        """
+        return [(row, col, depart_date, self.return_date(row, col))
+                for row, depart_date in enumerate(self.depart_dates) for col in range(len(self.durations))]
+
+    def fill(self, row, col, deal):
+        """
+        set a cell to its cheapest deal
+        :param row:
+        :param col:
+        :param deal: Deal, None if the cell has no results
+        :return:
+        """
+        if deal is None:
+            return
+
+        self.prices[row, col] = deal.price
+        self.deals[(row, col)] = deal
+
+    @property
+    def filled(self):
+        return int(np.count_nonzero(~np.isnan(self.prices)))
+
+    def cheapest(self, k=1):
+        """
+        cheapest date combinations (vectorized over the whole grid)
+        :param k: number of combinations
+        :return: list of (depart date, return date, Deal), cheapest first
+        """
+        k = min(k, self.filled)
+        if not k:
+            return []
+
+        flat = np.where(np.isnan(self.prices), np.inf, self.prices).ravel()
+        if k == 1:
+            top = np.array([np.argmin(flat)])
+        else:
+            top = np.argpartition(flat, k - 1)[:k]
+            top = top[np.argsort(flat[top], kind='stable')]
+
+        rows, cols = np.unravel_index(top, self.shape)
+        return [(self.depart_dates[row], self.return_date(row, col), self.deals[(row, col)])
+                for row, col in zip(rows.tolist(), cols.tolist())]
+
+    def render(self):
+        """
+        the grid as a table (depart days x trip lengths)
+        :return: table string
+        """
+        from prettytable import PrettyTable
+
+        currency = next(iter(self.deals.values())).currency if self.deals else ''
+        table = PrettyTable(["Depart"] + [f"{days} days" for days in self.durations.tolist()])
+        for row, depart_date in enumerate(self.depart_dates):
+            table.add_row([depart_date.strftime('%a %b %d')] +
+                          ['-' if np.isnan(price) else f"{currency}{price:.0f}" for price in self.prices[row]])
+
+        return table.get_string()
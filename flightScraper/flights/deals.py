@@ -0,0 +1,269 @@
+from datetime import date
+from array import array
+import re
+
+import numpy as np
+
+from flights.urls import parse_explore_dates
+
+
+PRICE_PATTERN = re.compile(r"([^\d\s,.]*)\s*([\d,]+)")
+TIME_PATTERN = re.compile(r"(\d{1,2}):(\d{2})\s*([ap]m)?", re.IGNORECASE)
+
+# minutes of day / date ordinal when unknown
+UNKNOWN = -1
+
+
+def parse_price(price_text):
+    """
+    display price (e.g. '$1,234') to a number and currency - decoded once at scrape time
+    :param price_text:
+    :return: price (int), currency
+    """
+    match = PRICE_PATTERN.search(price_text or '')
+    if not match:
+        raise ValueError(f"unknown price format: {price_text}")
+
+    return int(match.group(2).replace(',', '')), match.group(1)
+
+
+def parse_times(times_text):
+    """
+    flight times text (e.g. '6:00 am – 9:35 am') to departure and arrival minutes of day
+    :param times_text:
+    :return: departure minute, arrival minute (UNKNOWN if missing)
+    """
+    minutes = []
+    for hour, minute, period in TIME_PATTERN.findall(times_text or ''):
+        hour = int(hour) % 12 + (12 if period.lower() == 'pm' else 0) if period else int(hour)
+        minutes.append(hour * 60 + int(minute))
+
+    minutes += [UNKNOWN] * (2 - len(minutes))
+    return minutes[0], minutes[1]
+
+
+class Deal:
+    __slots__ = ('city', 'dates', 'depart_date', 'return_date', 'price', 'currency', 'is_final_price', 'company',
+                 'time_from', 'time_to', 'out_depart', 'out_arrive', 'in_depart', 'in_arrive', 'link')
+
+    def __init__(self, city, dates, price, currency, is_final_price, company, time_from, time_to, link,
+                 depart_date=None, return_date=None):
+        """
+        a single top deal - numeric price and parsed dates/times (decoded once)
+        :param city:
+        :param dates: explore page dates text
+        :param price: int
+        :param currency:
+        :param is_final_price:
+        :param company:
+        :param time_from: outbound times text
+        :param time_to: inbound times text
+        :param link:
+        :param depart_date: date or None
+        :param return_date: date or None
+        """
+        self.city = city
+        self.dates = dates
+        self.depart_date = depart_date
+        self.return_date = return_date
+        self.price = price
+        self.currency = currency
+        self.is_final_price = is_final_price
+        self.company = company
+        self.time_from = time_from
+        self.time_to = time_to
+        self.out_depart, self.out_arrive = parse_times(time_from)
+        self.in_depart, self.in_arrive = parse_times(time_to)
+        self.link = link
+
+    @classmethod
+    def from_flight_box(cls, box, city, dates, year, site):
+        """
+        deal from a parsed flight box (see parser.FlightBox)
+        :param box: FlightBox
+        :param city:
+        :param dates: explore page dates text
+        :param year: search year
+        :param site: for the full link
+        :return: Deal
+        """
+        price, currency = parse_price(box.price)
+        trip_dates = parse_explore_dates(dates, year) or (None, None)
+        # relative links are completed with the site ('' if the box had no link)
+        link = box.link or ''
+        if link and not link.startswith('http'):
+            link = f"{site}{link}"
+
+        return cls(city=city, dates=dates, price=price, currency=currency, is_final_price=box.is_final_price,
+                   company=box.from_company, time_from=box.time_from, time_to=box.time_to,
+                   link=link,
+                   depart_date=trip_dates[0], return_date=trip_dates[1])
+
+    @property
+    def display_price(self):
+        return f"{self.currency}{self.price}"
+
+    def to_record(self):
+        """
+        json/sql friendly record
+        :return: dict of RECORD_FIELDS
+        """
+        record = {field: getattr(self, field) for field in RECORD_FIELDS}
+        for field in ('depart_date', 'return_date'):
+            record[field] = record[field].isoformat() if record[field] else None
+
+        return record
+
+    @classmethod
+    def from_record(cls, record):
+        """
+        deal from a record (see to_record)
+        :param record: dict
+        :return: Deal
+        """
+        values = dict(record)
+        for field in ('depart_date', 'return_date'):
+            values[field] = date.fromisoformat(values[field]) if values.get(field) else None
+        values['price'] = int(values['price'])
+        values['is_final_price'] = values['is_final_price'] in (True, 1, 'True', '1')
+
+        return cls(**{field: values[field] for field in RECORD_FIELDS})
+
+
+RECORD_FIELDS = ['city', 'dates', 'depart_date', 'return_date', 'price', 'currency', 'is_final_price', 'company',
+                 'time_from', 'time_to', 'link']
+
+
+class DealSet:
+    # compact typed columns (dates as ordinals, times as minutes of day)
+    NUMERIC_COLUMNS = {'price': ('i', np.intc), 'is_final_price': ('b', np.int8), 'depart_date': ('i', np.intc),
+                       'return_date': ('i', np.intc), 'out_depart': ('h', np.short), 'out_arrive': ('h', np.short),
+                       'in_depart': ('h', np.short), 'in_arrive': ('h', np.short)}
+    TEXT_COLUMNS = ['city', 'dates', 'currency', 'company', 'time_from', 'time_to', 'link']
+
+    def __init__(self):
+        """
+        columnar store of deals - numeric columns are compact typed arrays exposed as numpy arrays,
+        so sorting, filtering and aggregation are vectorized
+        """
+        self._numeric = {name: array(typecode) for name, (typecode, _) in self.NUMERIC_COLUMNS.items()}
+        self._text = {name: [] for name in self.TEXT_COLUMNS}
+
+    def __len__(self):
+        return len(self._numeric['price'])
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+    def __getitem__(self, i):
+        """
+        deal record at row i
+        :param i:
+        :return: Deal
+        """
+        depart_date, return_date = [date.fromordinal(self._numeric[name][i]) if self._numeric[name][i] > 0 else None
+                                    for name in ('depart_date', 'return_date')]
+        deal = Deal(city=self._text['city'][i], dates=self._text['dates'][i], price=self._numeric['price'][i],
+                    currency=self._text['currency'][i], is_final_price=bool(self._numeric['is_final_price'][i]),
+                    company=self._text['company'][i], time_from=self._text['time_from'][i],
+                    time_to=self._text['time_to'][i], link=self._text['link'][i],
+                    depart_date=depart_date, return_date=return_date)
+        return deal
+
+    def append(self, deal):
+        """
+        add a deal (row)
+        :param deal: Deal
+        :return:
+        """
+        for name in self.TEXT_COLUMNS:
+            self._text[name].append(getattr(deal, name))
+        for name in ('price', 'out_depart', 'out_arrive', 'in_depart', 'in_arrive'):
+            self._numeric[name].append(getattr(deal, name))
+        self._numeric['is_final_price'].append(int(deal.is_final_price))
+        for name in ('depart_date', 'return_date'):
+            value = getattr(deal, name)
+            self._numeric[name].append(value.toordinal() if value else UNKNOWN)
+
+    def extend(self, deals):
+        """
+        add deals (Deal records or another DealSet)
+        :param deals:
+        :return:
+        """
+        if isinstance(deals, DealSet):
+            for name in self.NUMERIC_COLUMNS:
+                self._numeric[name].extend(deals._numeric[name])
+            for name in self.TEXT_COLUMNS:
+                self._text[name].extend(deals._text[name])
+        else:
+            for deal in deals:
+                self.append(deal)
+
+    def clear(self):
+        for name, (typecode, _) in self.NUMERIC_COLUMNS.items():
+            self._numeric[name] = array(typecode)
+        for name in self.TEXT_COLUMNS:
+            self._text[name].clear()
+
+    def column(self, name):
+        """
+        a single column
+        :param name: column name
+        :return: numpy array (numeric columns) or list (text columns)
+        """
+        if name in self._numeric:
+            # copy - a buffer view would block appending to the typed array
+            return np.frombuffer(self._numeric[name], dtype=self.NUMERIC_COLUMNS[name][1]).copy() \
+                if len(self) else np.empty(0, dtype=self.NUMERIC_COLUMNS[name][1])
+        return self._text[name]
+
+    def take(self, indices):
+        """
+        new DealSet with the rows at indices (in that order)
+        :param indices: int array / list, or a boolean mask
+        :return: DealSet
+        """
+        indices = np.asarray(indices)
+        if indices.dtype == bool:
+            indices = np.flatnonzero(indices)
+
+        subset = DealSet()
+        for name, (typecode, dtype) in self.NUMERIC_COLUMNS.items():
+            subset._numeric[name] = array(typecode, self.column(name)[indices].tobytes())
+        for name in self.TEXT_COLUMNS:
+            column = self._text[name]
+            subset._text[name] = [column[i] for i in indices]
+
+        return subset
+
+    def copy(self):
+        return self.take(np.arange(len(self)))
+
+    def sorted_by(self, name='price'):
+        """
+        sorted copy (stable, on the numeric column)
+        :param name: numeric column
+        :return: DealSet
+        """
+        return self.take(np.argsort(self.column(name), kind='stable'))
+
+    def set_links(self, links):
+        """
+        replace the links column (e.g. shortened links)
+        :param links: same length as the set
+        :return:
+        """
+        self._text['link'][:] = links
+
+    def to_records(self):
+        return [deal.to_record() for deal in self]
+
+    def display_columns(self):
+        """
+        columns for the results table
+        :return: list of columns (city, dates, price, is final price, company, times from, times to, link)
+        """
+        prices = [f"{currency}{price}" for currency, price in zip(self._text['currency'], self._numeric['price'])]
+        return [self._text['city'], self._text['dates'], prices, [bool(v) for v in self._numeric['is_final_price']],
+                self._text['company'], self._text['time_from'], self._text['time_to'], self._text['link']]
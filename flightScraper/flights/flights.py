@@ -1,38 +1,44 @@
-from datetime import datetime
-from calendar import monthrange
 from datetime import date
-import time
 
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.common.action_chains import ActionChains
-from selenium.webdriver.support.wait import WebDriverWait
 from selenium.webdriver.common.keys import Keys
-from selenium.common import TimeoutException
+from selenium.common import TimeoutException, WebDriverException
 from selenium.webdriver.common.by import By
 from selenium import webdriver
 
-from bs4 import BeautifulSoup
-
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from html import escape
 import json
+import time
 import os
 
-from prettytable import PrettyTable
-from tqdm import tqdm
-import pyshorteners
-from pyshorteners import shorteners
-
-from config.logger_config import configure_logger
+from flights.waits import WaitProfiler
+from flights.session_pool import SessionPool, debugger_addresses
+from flights.network_capture import NetworkCapture, enable_performance_logging
+from flights.lean_profile import apply_lean_options, block_resources, acquire_cache_dir, release_cache_dir
+from flights.blocking import BlockDetector, SiteBlockedError, OK, BLOCKED, CAPTCHA
+from flights.throttle import RateLimiter
+from flights.shortener import LinkShortener
+from flights.store import ResultStore, RouteKey
+from flights.deals import Deal, DealSet
+from flights.date_matrix import DateMatrix, trip_dates_text
+from flights.ranking import rank_deals
+from flights.report import DealReport
+from flights.selector_registry import SelectorRegistry
+from flights.urls import build_search_explore_url, build_results_url, parse_explore_dates, airport_code
+from flights import metrics
+from flights import parser
+
+from config.logger_config import configure_structured_logger
 import logging
 
-from email.message import EmailMessage
-import smtplib
-import ssl
-
 
 class Flights(webdriver.Chrome):
     def __init__(self,  sender, receiver, s_password, subject, body, server='smtp.gmail.com', port=465,
                  driver_path=r"C:\DRIVERS\SeleniumDrivers", cfg_file='flights/cfg.json',
-                 teardown=False, loc_from=None, loc_to=None):
+                 teardown=False, loc_from=None, loc_to=None, logger=None, shortener=None, debugger_address=None,
+                 rate_limiter=None, result_store=None, mailer=None, sink=None):
         """
         init
         :param driver_path:
@@ -40,12 +46,30 @@ class Flights(webdriver.Chrome):
         :param teardown: leave driver open or quit
         :param loc_from:
         :param loc_to:
+        :param logger: shared logger (used by pool workers), creates a new one if not given
+        :param shortener: LinkShortener for the deal links (e.g. with a local stub backend), from cfg if not given
+        :param debugger_address: host:port of a running (warm) chrome to attach to instead of launching one,
+                                 the first session pool daemon browser if not given and cfg 'session_pool' -> 'attach'
+        :param rate_limiter: shared (per site) RateLimiter for page loads, a new one from cfg 'throttle' if not given
+        :param result_store: ResultStore of scraped routes, from cfg 'store' if not given (and enabled)
+        :param mailer: shared Mailer (email queue) for the results, a new one (closed on exit) when the first email
+                       is sent if not given
+        :param sink: DealSink every deal is streamed to as soon as it is found (see sinks.open_sinks)
         """
         self.driver_path = driver_path
         self.teardown = teardown
-        self.logger = self.init_logger()
+        self.logger = logger if logger else self.init_logger()
         self.cfg_file = cfg_file
         self.cfg_data = self._load_config()
+        # validated and compiled before starting the browser (a bad config fails fast)
+        self.selectors = SelectorRegistry.from_cfg(self.cfg_data['xPaths'])
+        self.shortener = shortener if shortener else LinkShortener(
+            cache_file=self.cfg_data['shortener']['cache_file'],
+            concurrency=self.cfg_data['shortener']['concurrency'], logger=self.logger)
+        if not result_store and self.cfg_data['store']['enabled']:
+            result_store = ResultStore(self.cfg_data['store']['path'], self.cfg_data['store']['ttl_hours'])
+        self.result_store = result_store
+        self.sink = sink
 
         # email attributes
         self.sender = sender
@@ -55,20 +79,69 @@ class Flights(webdriver.Chrome):
         self.body = body
         self.server = server
         self.port = port
+        self._owns_mailer = mailer is None
+        self._mailer = mailer
+
+        # warm browsers (see session_pool.run_daemon)
+        pool_cfg = self.cfg_data['session_pool']
+        if not debugger_address and pool_cfg['attach']:
+            debugger_address = debugger_addresses(pool_cfg)[0]
+        self.debugger_address = debugger_address
+        self.session_pool = None
+        self.rate_limiter = rate_limiter if rate_limiter else RateLimiter.from_cfg(self.cfg_data['throttle'],
+                                                                                    logger=self.logger)
+        self.block_detector = BlockDetector(self.cfg_data['blocking'])
 
-        # runs chrome in the background if enabled
         options = webdriver.ChromeOptions()
-        if self.cfg_data['headless']:
-            options.add_argument("--headless=new")
-
-        # to ignore warnings when running from cmd
-        options.add_experimental_option('excludeSwitches', ['enable-logging'])
+        if self.debugger_address:
+            # attach to an already running browser (quitting the driver leaves it running)
+            options.add_experimental_option('debuggerAddress', self.debugger_address)
+        else:
+            # runs chrome in the background if enabled
+            if self.cfg_data['headless']:
+                options.add_argument("--headless=new")
+
+            # to ignore warnings when running from cmd
+            options.add_experimental_option('excludeSwitches', ['enable-logging'])
+
+        # lean browser (no images/fonts/trackers, eager page load, reused disk cache) if enabled
+        lean_cfg = self.cfg_data['lean']
+        self._cache_slot = None
+        if lean_cfg['enabled']:
+            cache_dir = None
+            if not self.debugger_address:
+                self._cache_slot, cache_dir = acquire_cache_dir(lean_cfg)
+            apply_lean_options(options, lean_cfg, cache_dir=cache_dir)
+
+        # read the site's api responses instead of the rendered dom (if enabled)
+        self.network_capture = None
+        if self.cfg_data['capture']['enabled']:
+            enable_performance_logging(options)
 
         os.environ['PATH'] += self.driver_path
-        super(Flights, self).__init__(options=options)
+        try:
+            super(Flights, self).__init__(options=options)
+        except WebDriverException:
+            self._release_cache_dir()
+            raise
 
-        # implicit waiting for elements to load
-        self.implicitly_wait(15)
+        if lean_cfg['enabled']:
+            block_resources(self, lean_cfg, self.logger)
+
+        if self.cfg_data['capture']['enabled']:
+            self.execute_cdp_cmd('Network.enable', {})
+            self.network_capture = NetworkCapture(self, self.cfg_data['capture'])
+
+        # explore results straight from the server response (no page load) when they are in it
+        self.explore_fetcher = None
+        if self.cfg_data['http']['enabled']:
+            from flights.http_fetcher import ExploreFetcher
+
+            self.explore_fetcher = ExploreFetcher(self.cfg_data, self.logger, rate_limiter=self.rate_limiter,
+                                                  block_detector=self.block_detector)
+
+        # no implicit waiting - elements are waited for explicitly (and timed) by _wait_for
+        self.wait_profiler = WaitProfiler()
 
         # main site
         self.site = self.cfg_data['site']
@@ -84,25 +157,51 @@ class Flights(webdriver.Chrome):
         # errors
         self.f_error_count = 0
 
+        # current search
+        self.explore_url = None
+        self.search_year = date.today().year
+        self._on_explore_page = False
+        self._prefetched_results = None
+
+        # results pages already scraped by the date matrix search (url -> cheapest Deal, None if no results)
+        self._page_cache = {}
+
         # general info
         self.cities = []
         self.prices = []
         self.dates = []
+        self.dest_codes = []  # destination codes (if found in the explore page) for direct results urls
+        self.origin_code = None  # origin code (if found in the explore page links)
 
         self.generic_data = [self.cities, self.dates, self.prices]
 
         # top info
-        self.f_prices_ls = []
-        self.f_isFinal_price = []
-        self.f_cities_ls = []
-        self.f_dates_ls = []
-        self.companies_ls = []
-        self.times_from_ls = []
-        self.times_to_ls = []
-        self.deals_link_ls = []
-
-        self.top_data = [self.f_cities_ls, self.f_dates_ls, self.f_prices_ls, self.f_isFinal_price, self.companies_ls,
-                         self.times_from_ls, self.times_to_ls, self.deals_link_ls]
+        self.deals = DealSet()
+
+    @property
+    def mailer(self):
+        """
+        email queue (smtp is only imported and connected once there is something to send)
+        :return: Mailer
+        """
+        if self._mailer is None:
+            from flights.mailer import Mailer
+
+            self._mailer = Mailer.from_cfg(self.cfg_data['email'], self.server, self.port, self.sender,
+                                           self.s_password, logger=self.logger)
+        return self._mailer
+
+    def ranked_deals(self):
+        """
+        the deals to report - filtered and top k per destination by score (cfg 'ranking'),
+        all the deals by price if ranking is disabled
+        :return: DealSet
+        """
+        if self.cfg_data['ranking']['enabled']:
+            with metrics.stage_seconds.time(stage='ranking'):
+                return rank_deals(self.deals, self.cfg_data['ranking'])
+
+        return self.deals.sorted_by('price')
 
     def _load_config(self):
         with open(self.cfg_file) as config_file:
@@ -120,187 +219,267 @@ class Flights(webdriver.Chrome):
         :param return_date:
         :return:
         """
-        stops = self.cfg_data['explore']['filters']['stops']
+        url, year = build_search_explore_url(self.site, self.cfg_data['explore'], self.loc_from, is_exact=is_exact,
+                                             duration=duration, year=year, month=month, depart_date=depart_date,
+                                             return_date=return_date)
 
-        if is_exact:
-            f_loc_temp = self.cfg_data['explore']['location']['from']
-            url = fr"{self.site}/explore/{f_loc_temp}-anywhere/{depart_date},{return_date}"
-        else:
-            if not duration and not month:
-                duration = self.cfg_data['explore']['dates']['range']['duration']
-                month = self.cfg_data['explore']['dates']['range']['month']
-            if not year:
-                year = date.today().year
-            month_days = monthrange(year, month)
-            month = f'0{month}' if len(str(month)) == 1 else month
-            dates_to_explore = self._correct_dates_format(year, month, month_days)
-
-            url = fr"{self.site}/explore/{self.loc_from}-anywhere/{dates_to_explore}\
-                                                        \?stops={stops}&tripdurationrange={duration}"
+        # the explore page doesn't show the year (needed for the results urls)
+        self.search_year = year
+
+        self.explore_url = url
+
+        # the browser page is loaded lazily (when needed) if the results could be fetched over http
+        self._prefetched_results = self.explore_fetcher.fetch_general_results(url) if self.explore_fetcher else None
+        if self._prefetched_results:
+            self._on_explore_page = False
+            return
 
         # navigate to URL
-        self.get(url)
+        self._load_explore_url()
 
-    @staticmethod
-    def _correct_dates_format(year, month, month_days):
+    def get(self, url):
         """
-        convert dates format to website format
-        :param year:
-        :param month:
-        :param month_days:
+        navigate to url (after the rate limiter allows it, if one is set)
+        :param url:
+        :return:
+        """
+        self.rate_limiter.acquire()
+        if self.network_capture:
+            self.network_capture.reset()
+        with metrics.page_load_seconds.time():
+            super(Flights, self).get(url)
+        metrics.pages_loaded.inc()
+
+    def _load_explore_url(self):
+        """
+        (re)load the explore page of the current search
         :return:
         """
-        dates = [datetime.fromisoformat(f"{year}-{month}-01"),
-                 datetime.fromisoformat(f"{year}-{month}-{month_days[1]}")]
-        dates = [dates[0].strftime("%Y%m%d"), dates[1].strftime("%Y%m%d")]
-        dates = f"{dates[0]},{dates[1]}"
+        self.get(self.explore_url)
+        self._on_explore_page = True
 
-        return dates
+    def quit(self):
+        super(Flights, self).quit()
+        self._release_cache_dir()
+
+    def _release_cache_dir(self):
+        if self._cache_slot is not None:
+            release_cache_dir(self._cache_slot)
+            self._cache_slot = None
 
     def __exit__(self, exc_type, exc_val, exc_tb):
+        if self.session_pool:
+            self.session_pool.close()
+        if self.explore_fetcher:
+            self.explore_fetcher.close()
+        if self._owns_mailer and self._mailer:
+            # queued emails are sent before exiting
+            self._mailer.close()
         if self.teardown:
             self.quit()
 
+    def reset_results(self):
+        """
+        clear the results of a previous search (used when a session is reused)
+        :return:
+        """
+        for col in self.generic_data + [self.dest_codes]:
+            col.clear()
+        self.origin_code = None
+        self.deals.clear()
+        self._prefetched_results = None
+        self.f_error_count = 0
+        self.wait_profiler = WaitProfiler()
+
+    def accept_consent(self):
+        """
+        accept the cookies consent dialog if it shows up
+        :return:
+        """
+        try:
+            self._wait_for('consent_xpath', timeout=self.cfg_data['waits']['consent_timeout']).click()
+        except (TimeoutException, WebDriverException):
+            pass
+
     def get_general_flights_info(self, user_mode=False):
         """
         getting the general info about the current cheapest destinations
         :param user_mode:
         :return:
         """
+        stage_start = time.perf_counter()
         if user_mode:
+            if not self._on_explore_page:
+                self._load_explore_url()
             self._modify_locations_to_explore()
-            f_xpath = self.cfg_data['xPaths']['specific_flight_xpath']
-            price_class = self.cfg_data['xPaths']['specific_price_class']
-            city_class = self.cfg_data['xPaths']['specific_city_class']
-            date_class = self.cfg_data['xPaths']['specific_date_class']
-
-            flights = self.find_elements(By.XPATH, f_xpath)
+            self.explore_url = self.current_url
+            selectors = self.selectors.specific_explore
+            f_key = 'specific_flight_xpath'
 
         else:
-            f_xpath = self.cfg_data['xPaths']['flight_xpath']
-            price_class = self.cfg_data['xPaths']['price_class']
-            city_class = self.cfg_data['xPaths']['city_class']
-            date_class = self.cfg_data['xPaths']['date_class']
-
-            flights = self.find_elements(By.XPATH, f_xpath)
+            selectors = self.selectors.explore
+            f_key = 'flight_xpath'
+
+        results = None
+        if self._prefetched_results and not user_mode:
+            results = self._prefetched_results
+        elif self.network_capture and not user_mode:
+            results = self._wait_for_capture('explore_api', self.network_capture.explore_results)
+
+        if results is None:
+            try:
+                self._wait_for(f_key, timeout=self.cfg_data['waits']['results_timeout'])
+            except TimeoutException:
+                try:
+                    self._check_page(results_found=False)
+                except SiteBlockedError as e:
+                    # the caller (e.g. a batch job) fails instead of finishing with no results
+                    self.logger.critical(f"Bot encountered a {e.state} page, try again later ...")
+                    raise
+                self.logger.critical("Bot encountered and error/block, try again later ...")
+                return
+
+            # parse the whole page at once (one page_source call) if a fast parser is available
+            if parser.has_fast_parser():
+                results = parser.parse_general_results(self.page_source, selectors)
+            else:
+                flights = self.find_elements(By.XPATH, self.selectors.xpath(f_key))
+                results = parser.parse_general_result_elements(flights, selectors)
 
-        if not flights:
+        if not results:
             self.logger.critical("Bot encountered and error/block, try again later ...")
             return
 
+        self._check_page(results_found=True)
+        metrics.stage_seconds.observe(time.perf_counter() - stage_start, stage='explore')
+
         # tqdm general
         # TODO: create tqdm objects for the different progress bars (for styling)
 
         # get general flights info
-        print("\n")
-        for web_element in tqdm(flights, desc='Gathering General Flights Info: ', colour='cyan', ncols=90):
-            element_html = web_element.get_attribute('outerHTML')
-            element_soup = BeautifulSoup(element_html, 'html.parser')
+        from tqdm import tqdm
 
-            price = element_soup.find("div", {"class": price_class})
+        print("\n")
+        for result in tqdm(results, desc='Gathering General Flights Info: ', colour='cyan', ncols=90):
             if user_mode:
                 city = self.loc_to
             else:
-                city = element_soup.find("div", {"class": city_class}).text
-            dates = element_soup.find("div", {"class": date_class})
+                city = result.city
 
-            self.prices.append(price.text.split()[1])
+            self.prices.append(result.price.split()[1])
             self.cities.append(city)
-            self.dates.append(dates.text)
+            self.dates.append(result.dates)
+            self.dest_codes.append(result.dest_code)
+            self.origin_code = self.origin_code or result.origin_code
 
         print("\n")
 
-    def get_top_flights(self, user_mode=None, carry=None, checked=None):
+    def get_top_flights(self, user_mode=None, carry=None, checked=None, indices=None, desc='Finding Top Deals: ',
+                        shorten=True, refresh=False):
         """
         getting top flights info for the explored destination/s
         :param user_mode:
         :param carry:
         :param checked:
+        :param indices: indices (in self.cities) of the destinations to explore, all destinations if not given
+        :param desc: progress bar description
+        :param shorten: shorten the deal links after scraping (pool workers leave it to the merging instance)
+        :param refresh: scrape even the routes that are fresh in the result store (e.g. price monitoring)
         :return:
         """
+        if indices is None:
+            indices = range(len(self.cities))
+
+        from tqdm import tqdm
+
         print("\n")
-        for i, city in enumerate(tqdm(self.cities, desc='Finding Top Deals: ', colour='cyan', ncols=100)):
-            # select location (in explore page)
-            if user_mode:
-                curr_cheap_dest_xpath = self.cfg_data['xPaths']['check_flights_xpath']
+        for i in tqdm(indices, desc=desc, colour='cyan', ncols=100):
+            # skip routes that were scraped recently (stored deals are used instead)
+            route_key = self._route_key(i, carry=carry, checked=checked)
+            if self.result_store and not refresh and self.result_store.is_fresh(route_key):
+                for deal in self.result_store.load_deals(route_key):
+                    self._add_deal(deal)
+                continue
+
+            first_row = len(self.deals)
+            # a blocked destination is retried after the backoff (and the circuit breaker pause)
+            for attempt in range(self.cfg_data['blocking']['retries'] + 1):
+                try:
+                    with metrics.stage_seconds.time(stage='destination'):
+                        self._get_destination_top_flights(i, self.cities[i], user_mode=user_mode, carry=carry,
+                                                          checked=checked)
+                    break
+                except SiteBlockedError as e:
+                    self.logger.error(f"{e.state} page for {self.cities[i]} (attempt {attempt + 1})")
             else:
-                curr_cheap_dest_xpath = self.cfg_data['xPaths']['curr_cheap_dest_xpath']
+                self.f_error_count += 1
+                continue
 
-            self._select_destination_to_explore_by_index(i, curr_cheap_dest_xpath)
+            if self.result_store:
+                self.result_store.save_deals(route_key, self.deals.take(range(first_row, len(self.deals))))
+        print("\n")
 
-            # search flights for that location
-            check_flights_xpath = self.cfg_data['xPaths']['check_flights_xpath']
-            self._element_click_by_xpath(check_flights_xpath)
+        if shorten:
+            self._shorten_deal_links()
 
-            self.implicitly_wait(10)
+    def _get_destination_top_flights(self, i, city, user_mode=None, carry=None, checked=None):
+        """
+        getting top flights info for a single destination - opens the results page directly if its url can be built,
+        otherwise clicks through from the explore page
+        :param i: index of the destination in the explore page
+        :param city:
+        :param user_mode:
+        :param carry:
+        :param checked:
+        :return:
+        """
+        results_url = self._destination_results_url(i, carry=carry, checked=checked)
+        if results_url:
+            # luggage and stops filters are encoded in the url
+            self._collect_flight_boxes(i, city, flight_boxes=self._load_results_page(results_url, city))
+            return
 
-            # currently opened tabs (=handles)
-            handles = self.window_handles
-            explore_tab = handles[0]
-            cur_flights_tab = handles[1]
-            self.switch_to.window(cur_flights_tab)  # switch to 'flights' tab
+        if not self._on_explore_page:
+            self._load_explore_url()
 
-            self.refresh()
-            time.sleep(2)
+        # select location (in explore page)
+        if user_mode:
+            curr_cheap_dest_key = 'check_flights_xpath'
+        else:
+            curr_cheap_dest_key = 'curr_cheap_dest_xpath'
 
-            # add luggage
-            self._add_luggage(carry_on_bag=carry, checked_bag=checked)
+        self._select_destination_to_explore_by_index(i, curr_cheap_dest_key)
 
-            # apply 0 stops
-            self._apply_nonstop_flight()
+        # search flights for that location
+        self._element_click_by_xpath('check_flights_xpath')
 
-            time.sleep(2)
+        # wait for the flights tab to open
+        self._wait_for('flights_tab', EC.number_of_windows_to_be(2))
 
-            # paths
-            flight_box_xpath = self.cfg_data['xPaths']['flight_box_xpath']
-            flight_boxes = self.find_elements(By.XPATH, flight_box_xpath)
-            f_price_class = self.cfg_data['xPaths']['f_price_class']
-            f_times_class = self.cfg_data['xPaths']['f_times_class']
+        # currently opened tabs (=handles)
+        handles = self.window_handles
+        explore_tab = handles[0]
+        cur_flights_tab = handles[1]
+        self.switch_to.window(cur_flights_tab)  # switch to 'flights' tab
 
-            # get flights info
-            for element in flight_boxes:
-                try:
-                    element_html = element.get_attribute('outerHTML')
-                except Exception as e:
-                    self.logger.exception(f"issue with html element (soup): {e}")
-                    self.f_error_count += 1
-                    break
+        self.refresh()
+
+        # wait for the results to load, then apply the filters and wait for the results to refresh
+        first_box = self._wait_for_results(city)
+        if first_box:
+            # add luggage
+            filters_changed = self._add_luggage(carry_on_bag=carry, checked_bag=checked)
+
+            # apply 0 stops
+            filters_changed = self._apply_nonstop_flight() or filters_changed
 
-                element_soup = BeautifulSoup(element_html, 'html.parser')
-
-                if not element_soup:
-                    self.logger.error("Bot encountered and error/block, try again later ...")
-                    return
-
-                # check if no carry-on option available on site (maybe only available when booking)
-                is_final_price = self._check_if_carry_available(element_soup)
-
-                time_from = element_soup.findAll("div", {"class": f_times_class})[0]
-                time_to = element_soup.findAll("div", {"class": f_times_class})[1]
-                from_company = time_from.next_sibling
-                to_company = time_to.next_sibling
-                price = element_soup.findAll("div", {"class": f_price_class})[0]
-                link = element_soup.findAll("a", href=True)[0].parent.contents[0].attrs['href']
-
-                link = f"{self.site}{link}"
-                link = self._shorten_link(link)
-
-                # checking if the flight company is the same for both directions (if not we skip this flight)
-                # this is inorder to get good flights
-                if from_company.text != to_company.text:
-                    continue
-                else:
-                    company = from_company
-
-                self.f_prices_ls.append(price.text)
-                self.f_isFinal_price.append(is_final_price)
-                self.f_cities_ls.append(city)
-                self.f_dates_ls.append(self.dates[i])  # from general results
-                self.companies_ls.append(company.text)  # from general results
-                self.times_from_ls.append(time_from.text)
-                self.times_to_ls.append(time_to.text)
-                self.deals_link_ls.append(link)
+            if filters_changed:
+                self._wait_for_results_refresh(first_box)
 
+        try:
+            self._check_page(first_box is not None)
+            self._collect_flight_boxes(i, city)
+        finally:
             # close current flights tab
             self.close()
 
@@ -308,85 +487,543 @@ class Flights(webdriver.Chrome):
             self.switch_to.window(explore_tab)
             self.back()
 
-    print("\n")
+    def _route_key(self, i, carry=None, checked=None):
+        """
+        store key of a destination's route
+        :param i: index of the destination in the explore page
+        :param carry:
+        :param checked:
+        :return: RouteKey
+        """
+        carry, checked = self._resolve_luggage(carry, checked)
+        destination = self.dest_codes[i] if i < len(self.dest_codes) and self.dest_codes[i] else self.cities[i]
 
-    def _element_click_by_xpath(self, xpath):
+        return RouteKey(self.loc_from, destination, self.dates[i], carry, checked)
+
+    def _destination_results_url(self, i, carry=None, checked=None):
         """
-        wait for element to be present and click it
-        :param xpath: of the element
+        build the results page url of a destination (cfg 'navigation' -> 'direct')
+        :param i: index of the destination in the explore page
+        :param carry:
+        :param checked:
+        :return: url, None if the origin / destination code or dates are unknown (click-through instead)
+        """
+        if not self.cfg_data['navigation']['direct']:
+            return None
+
+        airports = self.cfg_data['explore']['airports']
+        # the origin may be a typed city name (user mode) - the code from the explore page links is used instead
+        origin_code = self.origin_code or airport_code(self.loc_from, airports)
+        dest_code = self.dest_codes[i] if i < len(self.dest_codes) else None
+        dest_code = dest_code or airports.get(self.cities[i])
+        trip_dates = parse_explore_dates(self.dates[i], self.search_year)
+        if not origin_code or not dest_code or not trip_dates:
+            return None
+
+        carry, checked = self._resolve_luggage(carry, checked)
+
+        return build_results_url(self.site, origin_code, dest_code, *trip_dates, carry_on_bag=carry,
+                                 checked_bag=checked, stops=self.cfg_data['explore']['filters']['stops'])
+
+    def _load_results_page(self, url, city):
+        """
+        open a results page directly (filters encoded in the url) and get its flight boxes
+        :param url:
+        :param city:
+        :return: list of FlightBox (captured from the site's api or parsed from the page)
+        """
+        self.get(url)
+        self._on_explore_page = False
+
+        captured_boxes = None
+        if self.network_capture:
+            captured_boxes = self._wait_for_capture('results_api', self.network_capture.flight_boxes)
+        if captured_boxes is not None:
+            self._check_page(bool(captured_boxes))
+            return captured_boxes
+
+        self._check_page(self._wait_for_results(city) is not None)
+        return self._parse_flight_boxes(city)
+
+    def _wait_for_results(self, city):
+        """
+        wait for the flight results to load
+        :param city:
+        :return: first flight box element, None if no results loaded
+        """
+        try:
+            return self._wait_for('flight_box_xpath', timeout=self.cfg_data['waits']['results_timeout'])
+        except TimeoutException:
+            self.logger.error(f"no flight results loaded for {city}")
+            return None
+
+    def _check_page(self, results_found):
+        """
+        classify the current page - back off (and raise) if the site blocked us, recover the rate otherwise
+        :param results_found: the expected results loaded
+        :return: page state (OK or EMPTY)
+        """
+        if results_found:
+            state = OK
+        else:
+            state = self.block_detector.classify(self.current_url, self.title, self.page_source, results_found)
+        metrics.page_states.inc(state=state)
+
+        if state in (BLOCKED, CAPTCHA):
+            self.logger.warning(f"{state} page: {self.current_url}")
+            self.rate_limiter.penalize()
+            raise SiteBlockedError(state, self.current_url)
+        if state == OK:
+            self.rate_limiter.reward()
+
+        return state
+
+    def _wait_for_capture(self, key, getter):
+        """
+        wait for the site's api response to be captured (instead of waiting for the page to render)
+        :param key: label in the timing report
+        :param getter: NetworkCapture method returning the parsed records (None if not captured yet)
+        :return: parsed records, None if nothing was captured in time
+        """
+        try:
+            # an empty payload is a valid capture (no results) - only None means not captured yet
+            self._wait_for(key, lambda _: getter() is not None, timeout=self.cfg_data['capture']['timeout'])
+            return getter()
+        except TimeoutException:
+            self.logger.info(f"nothing captured ({key}), falling back to the page")
+            return None
+
+    def _collect_flight_boxes(self, i, city, flight_boxes=None):
+        """
+        parse the flight boxes of the current results page and keep the top deals
+        :param i: index of the destination in the explore page
+        :param city:
+        :param flight_boxes: already parsed (captured) flight boxes, parsed from the page if not given
         :return:
         """
-        WebDriverWait(self, 10).until(EC.presence_of_element_located((By.XPATH, xpath)))
-        self.find_element(By.XPATH, xpath).click()
+        if flight_boxes is None:
+            flight_boxes = self._parse_flight_boxes(city)
+
+        for deal in self._deals_from_flight_boxes(city, self.dates[i], self.search_year, flight_boxes):
+            self._add_deal(deal)
 
-    def _element_double_click_by_xpath(self, xpath):
-        wait = WebDriverWait(self, 10).until(EC.presence_of_element_located((By.XPATH, xpath)))
-        ActionChains(self).double_click(wait).perform()
+    def _deals_from_flight_boxes(self, city, dates, year, flight_boxes):
+        """
+        top deals of parsed flight boxes
+        :param city:
+        :param dates: explore page dates text
+        :param year: search year
+        :param flight_boxes: list of FlightBox
+        :return: list of Deal
+        """
+        metrics.flight_boxes_parsed.inc(len(flight_boxes))
+
+        # get flights info
+        deals = []
+        for box in flight_boxes:
+            # checking if the flight company is the same for both directions (if not we skip this flight)
+            # this is inorder to get good flights
+            if box.from_company != box.to_company:
+                continue
+
+            # decode price, dates and times once (dates from general results)
+            try:
+                deals.append(Deal.from_flight_box(box, city, dates, year, self.site))
+            except ValueError as e:
+                self.logger.error(f"issue with flight box (price) for {city}: {e}")
+                self.f_error_count += 1
+                metrics.flight_box_errors.inc()
+
+        return deals
+
+    def _add_deal(self, deal):
+        """
+        keep a top deal (and stream it to the sink)
+        :param deal: Deal
+        :return:
+        """
+        self.deals.append(deal)
+        if self.sink:
+            self.sink.write(deal)
 
-    def _shorten_link(self, link):
+    def _parse_flight_boxes(self, city):
         """
-        shorten url for convince
-        :param link: original url
-        :return: shortened link
+        parse the flight boxes of the current results page
+        :param city:
+        :return: list of FlightBox
+        """
+        # parse all the flight boxes at once (one page_source call) if a fast parser is available
+        if parser.has_fast_parser():
+            flight_boxes, errors = parser.parse_flight_boxes(self.page_source, self.selectors.flight_box)
+        else:
+            flight_boxes, errors = parser.parse_flight_box_elements(
+                self.find_elements(By.XPATH, self.selectors.xpath('flight_box_xpath')), self.selectors.flight_box)
+        if errors:
+            self.logger.error(f"issue with {errors} flight boxes (parsing) for {city}")
+            self.f_error_count += errors
+            metrics.flight_box_errors.inc(errors)
+
+        return flight_boxes
+
+    def get_top_flights_pooled(self, user_mode=None, carry=None, checked=None, workers=None):
+        """
+        getting top flights info by splitting the explored destinations across several browser workers.
+        each worker is an independent Flights (chrome) instance that loads the current explore page.
+        the results are merged (in destinations order) into the deals
+        :param user_mode:
+        :param carry:
+        :param checked:
+        :param workers: number of browser workers (cfg 'pool' -> 'workers' if not given, 0 = number of cores)
+        :return:
+        """
+        if workers is None:
+            workers = self.cfg_data['pool']['workers']
+        if not workers:
+            workers = os.cpu_count() or 1
+        workers = min(workers, len(self.cities))
+
+        # nothing to split - run in the current browser
+        if workers <= 1:
+            self.get_top_flights(user_mode=user_mode, carry=carry, checked=checked)
+            return
+
+        # contiguous chunks keep the destinations order when merging the results
+        chunk_size, remainder = divmod(len(self.cities), workers)
+        chunks = []
+        start = 0
+        for w in range(workers):
+            end = start + chunk_size + (1 if w < remainder else 0)
+            chunks.append(range(start, end))
+            start = end
+
+        explore_url = self.explore_url if self.explore_url else self.current_url
+        self.logger.info(f"splitting {len(self.cities)} destinations across {workers} workers")
+
+        if self.session_pool is None:
+            self.session_pool = self._create_session_pool(workers)
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(self._run_top_flights_worker, w, chunk, explore_url, user_mode, carry, checked)
+                       for w, chunk in enumerate(chunks)]
+            results = [future.result() for future in futures]
+
+        for worker_deals, worker_error_count, worker_wait_profiler in results:
+            self.deals.extend(worker_deals)
+            self.f_error_count += worker_error_count
+            self.wait_profiler.merge(worker_wait_profiler)
+
+        self._shorten_deal_links()
+
+    def _run_top_flights_worker(self, worker_id, indices, explore_url, user_mode, carry, checked):
+        """
+        scrape a chunk of destinations in a new browser instance
+        :param worker_id:
+        :param indices: indices (in self.cities) of the destinations to explore
+        :param explore_url: explore page to start from
+        :param user_mode:
+        :param carry:
+        :param checked:
+        :return: worker deals, error count and wait profiler
         """
-        shortener_l = pyshorteners.Shortener()
         try:
-            link = shortener_l.tinyurl.short(link)
+            with self.session_pool.borrow() as worker:
+                # the explore page is only loaded if a destination needs click-through
+                worker.explore_url = explore_url
+                worker.search_year = self.search_year
+                worker.cities[:] = self.cities
+                worker.dates[:] = self.dates
+                worker.dest_codes[:] = self.dest_codes
+                worker.origin_code = self.origin_code
+                worker.get_top_flights(user_mode=user_mode, carry=carry, checked=checked, indices=indices,
+                                       desc=f'Finding Top Deals (worker {worker_id}): ', shorten=False)
+
+                # copies - the session goes back to the pool
+                return worker.deals.copy(), worker.f_error_count, worker.wait_profiler
         except Exception as e:
-            self.logger.exception(f"\nunsuccessful link shortening: {e}")
+            self.logger.exception(f"issue with top flights worker {worker_id}: {e}")
+            return DealSet(), 1, WaitProfiler()
+
+    def get_date_matrix(self, loc_to=None, year=None, month=None, duration=None, carry=None, checked=None,
+                        workers=None, refresh=False):
+        """
+        flexible dates search - the cheapest price of every depart day / trip length of a month to one destination.
+        the cells (results pages) are scraped concurrently by browser workers, pages already scraped (by this
+        instance, or fresh in the result store) are not loaded again. the cheapest deal of every cell is kept
+        in the deals
+        :param loc_to: destination (city in cfg 'explore' -> 'airports' or airport code), self.loc_to if not given
+        :param year: current year if not given
+        :param month: cfg range month if not given
+        :param duration: trip length range (d,d), cfg range duration if not given
+        :param carry:
+        :param checked:
+        :param workers: number of browser workers (cfg 'pool' -> 'workers' if not given, 0 = number of cores)
+        :param refresh: scrape even the pages that were already scraped
+        :return: DateMatrix
+        """
+        loc_to = loc_to if loc_to else self.loc_to
+        airports = self.cfg_data['explore']['airports']
+        # every cell is a results page url - it needs both airport codes (e.g. not 'anywhere')
+        origin_code, dest_code = airport_code(self.loc_from, airports), airport_code(loc_to, airports)
+        if not origin_code or not dest_code:
+            raise ValueError(f"date matrix needs airport codes (or cities in cfg 'explore' -> 'airports'): "
+                             f"{self.loc_from} - {loc_to}")
+
+        range_cfg = self.cfg_data['explore']['dates']['range']
+        matrix = DateMatrix.for_month(loc_to, year if year else date.today().year,
+                                      month if month else range_cfg['month'],
+                                      duration if duration else range_cfg['duration'])
+        carry, checked = self._resolve_luggage(carry, checked)
+
+        # cells of pages already scraped are filled from the cache / store
+        pending = []
+        for row, col, depart_date, return_date in matrix.cells():
+            url = build_results_url(self.site, origin_code, dest_code, depart_date, return_date, carry_on_bag=carry,
+                                    checked_bag=checked, stops=self.cfg_data['explore']['filters']['stops'])
+            route_key = RouteKey(origin_code, dest_code, trip_dates_text(depart_date, return_date), carry, checked)
+            if not refresh and url in self._page_cache:
+                self._fill_matrix_cell(matrix, row, col, self._page_cache[url])
+            elif not refresh and self.result_store and self.result_store.is_fresh(route_key):
+                cell_deals = self.result_store.load_deals(route_key)
+                self._page_cache[url] = min(cell_deals, key=lambda deal: deal.price) if cell_deals else None
+                self._fill_matrix_cell(matrix, row, col, self._page_cache[url])
+            else:
+                pending.append((row, col, url, route_key, depart_date.year))
+
+        self.logger.info(f"date matrix {self.loc_from}-{loc_to}: {len(matrix.cells())} cells, "
+                         f"{len(pending)} pages to scrape")
+
+        if workers is None:
+            workers = self.cfg_data['pool']['workers']
+        if not workers:
+            workers = os.cpu_count() or 1
+        workers = min(workers, len(pending))
+
+        from tqdm import tqdm
+
+        print("\n")
+        progress = tqdm(total=len(pending), desc='Filling Date Matrix: ', colour='cyan', ncols=100)
+        if workers <= 1:
+            # nothing to split - run in the current browser
+            for row, col, url, route_key, search_year in pending:
+                cell_deals, _ = self._scrape_matrix_cell(url, loc_to, route_key.dates, search_year)
+                self._merge_matrix_cell(matrix, row, col, url, route_key, cell_deals)
+                progress.update()
+        else:
+            if self.session_pool is None:
+                self.session_pool = self._create_session_pool(workers)
+
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                futures = {executor.submit(self._run_matrix_cell_worker, url, loc_to, route_key.dates, search_year):
+                           (row, col, url, route_key) for row, col, url, route_key, search_year in pending}
+                # merged (and streamed) as soon as each cell is done
+                for future in as_completed(futures):
+                    cell_deals, worker_error_count, worker_wait_profiler = future.result()
+                    self.f_error_count += worker_error_count
+                    self.wait_profiler.merge(worker_wait_profiler)
+                    self._merge_matrix_cell(matrix, *futures[future], cell_deals)
+                    progress.update()
+        progress.close()
+        print("\n")
+
+        self._shorten_deal_links()
+
+        return matrix
+
+    def _scrape_matrix_cell(self, url, city, dates, year):
+        """
+        deals of a single date matrix cell (a blocked page is retried after the backoff)
+        :param url: results page url
+        :param city:
+        :param dates: trip dates text
+        :param year: search year
+        :return: list of Deal (None if the page stayed blocked), number of errors
+        """
+        errors_before = self.f_error_count
+        for attempt in range(self.cfg_data['blocking']['retries'] + 1):
+            try:
+                with metrics.stage_seconds.time(stage='date_matrix_cell'):
+                    flight_boxes = self._load_results_page(url, city)
+                    return (self._deals_from_flight_boxes(city, dates, year, flight_boxes),
+                            self.f_error_count - errors_before)
+            except SiteBlockedError as e:
+                self.logger.error(f"{e.state} page for {city} {dates} (attempt {attempt + 1})")
+
+        self.f_error_count += 1
+        return None, self.f_error_count - errors_before
+
+    def _run_matrix_cell_worker(self, url, city, dates, year):
+        """
+        scrape a date matrix cell in a pooled browser instance
+        :param url: results page url
+        :param city:
+        :param dates: trip dates text
+        :param year: search year
+        :return: cell deals (None if failed), error count and wait profiler
+        """
+        try:
+            with self.session_pool.borrow() as worker:
+                cell_deals, error_count = worker._scrape_matrix_cell(url, city, dates, year)
+                return cell_deals, error_count, worker.wait_profiler
+        except Exception as e:
+            self.logger.exception(f"issue with date matrix worker ({city} {dates}): {e}")
+            return None, 1, WaitProfiler()
+
+    def _merge_matrix_cell(self, matrix, row, col, url, route_key, cell_deals):
+        """
+        keep a scraped cell (cache and store its deals, the cheapest one fills the grid)
+        :param matrix: DateMatrix
+        :param row:
+        :param col:
+        :param url: results page url
+        :param route_key: RouteKey of the cell
+        :param cell_deals: list of Deal, None if the page couldn't be scraped (left empty, not cached)
+        :return:
+        """
+        if cell_deals is None:
+            return
+
+        if self.result_store:
+            self.result_store.save_deals(route_key, cell_deals)
+        self._page_cache[url] = min(cell_deals, key=lambda deal: deal.price) if cell_deals else None
+        self._fill_matrix_cell(matrix, row, col, self._page_cache[url])
+
+    def _fill_matrix_cell(self, matrix, row, col, deal):
+        if deal is not None:
+            matrix.fill(row, col, deal)
+            self._add_deal(deal)
+
+    def _create_session_pool(self, size):
+        """
+        pool of warm worker sessions - attached to the session pool daemon browsers if cfg 'session_pool' -> 'attach'
+        (except the one this instance uses), new browsers otherwise
+        :param size: number of sessions (when not attaching)
+        :return: SessionPool
+        """
+        pool_cfg = self.cfg_data['session_pool']
+        if pool_cfg['attach']:
+            addresses = [address for address in debugger_addresses(pool_cfg) if address != self.debugger_address]
+            if not addresses:
+                raise ValueError(f"no session pool daemon browser left for the workers (cfg 'session_pool' -> 'size' "
+                                 f"{pool_cfg['size']}, one is used by this instance)")
+            return SessionPool(lambda index: self._create_worker(debugger_address=addresses[index]), len(addresses),
+                               logger=self.logger)
+
+        return SessionPool(lambda index: self._create_worker(), size, logger=self.logger)
+
+    def _create_worker(self, debugger_address=None):
+        """
+        create a new browser instance with the same configuration (used as a pool worker)
+        :param debugger_address: running browser to attach to
+        :return: Flights instance
+        """
+        return Flights(sender=self.sender, receiver=self.receiver, s_password=self.s_password, subject=self.subject,
+                       body=self.body, server=self.server, port=self.port, driver_path='', cfg_file=self.cfg_file,
+                       teardown=True, loc_from=self.loc_from, loc_to=self.loc_to, logger=self.logger,
+                       shortener=self.shortener, debugger_address=debugger_address, rate_limiter=self.rate_limiter,
+                       result_store=self.result_store, mailer=self._mailer, sink=self.sink)
+
+    def _wait_for(self, key, condition=None, xpath=None, timeout=None):
+        """
+        wait only until the element of an xPaths key is ready (instead of fixed sleeps / implicit waits).
+        the time each wait took is recorded per key in self.wait_profiler
+        :param key: xPaths key in the config (label in the timing report)
+        :param condition: expected condition, presence of the key's xpath if not given
+        :param xpath: overrides the key's xpath (e.g. indexed xpath)
+        :param timeout: seconds, cfg 'waits' -> 'timeout' if not given
+        :return: condition result (the element for presence)
+        """
+        if condition is None:
+            xpath = xpath if xpath else self.selectors.xpath(key)
+            condition = EC.presence_of_element_located((By.XPATH, xpath))
+        if timeout is None:
+            timeout = self.cfg_data['waits']['timeout']
+
+        return self.wait_profiler.wait(self, key, condition, timeout=timeout)
+
+    def _wait_for_results_refresh(self, old_box):
+        """
+        wait for the flight results to re-render after changing filters
+        :param old_box: flight box element from before the filters change
+        :return:
+        """
+        try:
+            self._wait_for('filters_refresh', EC.staleness_of(old_box),
+                           timeout=self.cfg_data['waits']['filters_timeout'])
+            self._wait_for('flight_box_xpath', timeout=self.cfg_data['waits']['results_timeout'])
+        except TimeoutException:
+            pass
+
+    def _element_click_by_xpath(self, key, xpath=None):
+        """
+        wait for element to be present and click it
+        :param key: xPaths key of the element
+        :param xpath: overrides the key's xpath
+        :return:
+        """
+        self._wait_for(key, xpath=xpath).click()
 
-        return link
+    def _element_double_click_by_xpath(self, key, xpath=None):
+        element = self._wait_for(key, xpath=xpath)
+        ActionChains(self).double_click(element).perform()
+
+    def _shorten_deal_links(self):
+        """
+        shorten all the (filtered) deal links for convince - one concurrent batch, cached across runs
+        :return:
+        """
+        with metrics.stage_seconds.time(stage='shorten'):
+            self.deals.set_links(self.shortener.shorten_all(self.deals.column('link')))
 
     def _add_luggage(self, carry_on_bag=None, checked_bag=None):
         """
         apply luggage filters - carry-on and checked bags
         :param carry_on_bag:
         :param checked_bag:
-        :return:
+        :return: True if a filter was clicked
         """
-        if not carry_on_bag and not checked_bag:
-            carry_on_bag = self.cfg_data['flight']['luggage']['carry-on_bag']
-            checked_bag = self.cfg_data['flight']['luggage']['checked_bag']
-
-        luggage_carry_xpath = self.cfg_data['xPaths']['luggage_carry_xpath']
-        luggage_checked_xpath = self.cfg_data['xPaths']['luggage_checked_xpath']
+        carry_on_bag, checked_bag = self._resolve_luggage(carry_on_bag, checked_bag)
 
         try:
             # can use _ instead of i (if variable is not used)
-            [self._element_click_by_xpath(luggage_carry_xpath) for _ in range(carry_on_bag)]
-            [self._element_click_by_xpath(luggage_checked_xpath) for _ in range(checked_bag)]
+            [self._element_click_by_xpath('luggage_carry_xpath') for _ in range(carry_on_bag)]
+            [self._element_click_by_xpath('luggage_checked_xpath') for _ in range(checked_bag)]
         except TimeoutException as time_e:
-            pass
+            return False
+
+        return bool(carry_on_bag or checked_bag)
+
+    def _resolve_luggage(self, carry_on_bag=None, checked_bag=None):
+        """
+        luggage to search with - cfg defaults for the counts not given (0 is a count)
+        :param carry_on_bag:
+        :param checked_bag:
+        :return: carry-on bags, checked bags
+        """
+        if carry_on_bag is None:
+            carry_on_bag = self.cfg_data['flight']['luggage']['carry-on_bag']
+        if checked_bag is None:
+            checked_bag = self.cfg_data['flight']['luggage']['checked_bag']
+
+        return carry_on_bag, checked_bag
 
     def _apply_nonstop_flight(self):
         """
         apply non-stop flight filter
-        :return:
+        :return: True if the filter was clicked
         """
         try:
-            nonstop_xpath = self.cfg_data['xPaths']['nonstop_xpath']
-            WebDriverWait(self, 10).until(EC.presence_of_element_located((By.XPATH, nonstop_xpath)))
-            nonstop_element = self.find_element(By.XPATH, nonstop_xpath)
+            nonstop_element = self._wait_for('nonstop_xpath')
             if not nonstop_element.is_selected():
                 nonstop_element.click()
+                return True
         except Exception as e:
             pass
 
-    def _select_destination_to_explore_by_index(self, index, xpath):
-        curr_cheap_dest_xpath = f'{xpath}[{index + 1}]'
-        self._element_click_by_xpath(curr_cheap_dest_xpath)
+        return False
 
-    def _check_if_carry_available(self, element_soup):
-        """
-        checking if a specific flight really offers a carry-on bag (for pricing considerations)
-        :param element_soup:
-        :return:
-        """
-        f_carry_bag_class = self.cfg_data['xPaths']['f_carry_bag_class']
-        carry_bag = element_soup.findAll("div", {"class": f_carry_bag_class})[1].text
-        if carry_bag == '?':  # TODO: has some issues (sometimes gives 0 when ?)
-            return False
-        return True
+    def _select_destination_to_explore_by_index(self, index, key):
+        curr_cheap_dest_xpath = f"{self.selectors.xpath(key)}[{index + 1}]"
+        self._element_click_by_xpath(key, xpath=curr_cheap_dest_xpath)
 
     def create_results_table(self, cols_names, cols_data, title, sort=None):
         """
@@ -397,18 +1034,31 @@ class Flights(webdriver.Chrome):
         :param sort:
         :return:
         """
-        results_table = PrettyTable()
-        for i, col in enumerate(cols_names):
-            results_table.add_column(col, cols_data[i])
-
         print(f"\n{title} ({len(cols_data[0])}):\n\n")
-        results = results_table.get_string(sortby=sort, sort_key=lambda row: int(row[0].split('$')[-1]))
+        results = self.render_results_table(cols_names, cols_data, sort=sort)
         print(results)
 
         self.logger.debug(f"Errors (table={title}): {self.f_error_count}\n")
 
         return results
 
+    @staticmethod
+    def render_results_table(cols_names, cols_data, sort=None):
+        """
+        render a results table using prettyTable (no browser needed)
+        :param cols_names:
+        :param cols_data:
+        :param sort: column to sort by (price strings)
+        :return: table string
+        """
+        from prettytable import PrettyTable
+
+        results_table = PrettyTable()
+        for i, col in enumerate(cols_names):
+            results_table.add_column(col, cols_data[i])
+
+        return results_table.get_string(sortby=sort, sort_key=lambda row: int(row[0].split('$')[-1]))
+
     def generate_generic_table(self):
         """
         creating base table with general info
@@ -428,58 +1078,99 @@ class Flights(webdriver.Chrome):
         headers = ["City", "Dates", "Price", "Is Final Price ?", "Company",
                    f"Times: {self.loc_from}-{self.loc_to}", f"Times:{self.loc_to}-{self.loc_from}", "Link to Deal"]
 
+        report_cfg = self.cfg_data['report']
+
         print("\n\n" + "*" * 100 + "\n")
         try:
-            results = self.create_results_table(headers, self.top_data, "Top Flights", sort="Price")
-            self.report_results_via_email(results)
+            # ranked (or sorted) once on the numeric columns, rendered page by page
+            report = DealReport(self.ranked_deals(), "Top Flights", headers=headers, page_size=report_cfg['page_size'],
+                                group_by_destination=report_cfg['group_by_destination'], sort=False)
+            pages = report.pages()
+            for page in pages:
+                print(f"\n{page}")
+            self.logger.debug(f"Errors (table=Top Flights): {self.f_error_count}\n")
+
+            if self.receiver:
+                # the first page in the text body, everything in the html body and attachments
+                body = pages[0] if len(pages) == 1 else f"{pages[0]}\n\n({len(pages) - 1} more pages in the report)"
+                self.report_results_via_email(body, html=report.html() if report_cfg['html_email'] else None,
+                                              attachments=report.attachments(report_cfg['attachments'],
+                                                                             name=f"deals_{self.loc_from}"))
         except Exception as e:
             self.logger.exception(f"issue with creating top table: {e}")
         print("\n")
 
+    def generate_date_matrix_table(self, matrix, top=None):
+        """
+        print the date matrix grid and its cheapest date combinations (and email them)
+        :param matrix: DateMatrix
+        :param top: number of cheapest combinations (cfg 'date_matrix' -> 'top' if not given)
+        :return: report string
+        """
+        top = top if top else self.cfg_data['date_matrix']['top']
+        cheapest = matrix.cheapest(top)
+        links = self.shortener.shorten_all([deal.link for _, _, deal in cheapest])
+
+        lines = [f"Date Matrix {self.loc_from}-{matrix.destination} ({matrix.filled}/{matrix.prices.size} dates)",
+                 matrix.render(), "", f"Cheapest {len(cheapest)} Dates:"]
+        lines += [f"{depart_date:%a %b %d} - {return_date:%a %b %d} "
+                  f"({(return_date - depart_date).days} days): {deal.display_price} {deal.company} {link}"
+                  for (depart_date, return_date, deal), link in zip(cheapest, links)]
+        report = "\n".join(lines)
+
+        print("\n\n" + "*" * 100 + "\n")
+        print(report)
+        print("\n")
+        try:
+            self.report_results_via_email(report)
+        except Exception as e:
+            self.logger.exception(f"issue with emailing the date matrix: {e}")
+
+        return report
+
     def _modify_locations_to_explore(self):
         """
         changing departure and return locations according to user input
         :return:
         """
-        from_xpath = self.cfg_data['xPaths']['from_xpath']
-        to_xpath = self.cfg_data['xPaths']['to_xpath']
-        from_loc_drop_down_xpath = self.cfg_data['xPaths']['from_loc_drop_down_xpath']
-        to_loc_drop_down_xpath = self.cfg_data['xPaths']['to_loc_drop_down_xpath']
-        from_click_drop_xpath = self.cfg_data['xPaths']['from_click_drop_xpath']
-        to_click_drop_xpath = self.cfg_data['xPaths']['to_click_drop_xpath']
-
         # change from location
-        self._change_explore_location(from_click_drop_xpath, from_xpath, from_loc_drop_down_xpath, self.loc_from)
+        self._change_explore_location('from_click_drop_xpath', 'from_xpath', 'from_loc_drop_down_xpath', self.loc_from)
 
         # change to location
-        self._change_explore_location(to_click_drop_xpath, to_xpath, to_loc_drop_down_xpath, self.loc_to)
+        self._change_explore_location('to_click_drop_xpath', 'to_xpath', 'to_loc_drop_down_xpath', self.loc_to)
 
         # submit(=explore options) - redundant
         # submit_xpath = self.cfg_data['xPaths']['submit_xpath']
         # self._element_click_by_xpath(submit_xpath)
 
-    def _change_explore_location(self, click_xpath, loc_xpath, drop_xpath, loc):
+    def _change_explore_location(self, click_key, loc_key, drop_key, loc):
         """
         helper method to change locations to explore. changes value in text box
-        :param click_xpath:
-        :param loc_xpath:
-        :param drop_xpath:
+        :param click_key: xPaths key
+        :param loc_key: xPaths key
+        :param drop_key: xPaths key
         :param loc:
         :return:
         """
-        self._element_click_by_xpath(click_xpath)
-        element = self.find_element(By.XPATH, loc_xpath)
+        self._element_click_by_xpath(click_key)
+        element = self._wait_for(loc_key)
         while element.get_attribute("value"):
-            if 'destination' in loc_xpath:
+            if 'destination' in self.selectors.xpath(loc_key):
                 element.send_keys(Keys.CONTROL, "a")
                 element.send_keys(Keys.DELETE)
             else:
                 element.clear()
-            time.sleep(0.5)
+
+            # wait for the text box to clear (retry if it didn't)
+            try:
+                self._wait_for(loc_key, lambda _: not element.get_attribute("value"),
+                               timeout=self.cfg_data['waits']['clear_timeout'])
+            except TimeoutException:
+                pass
 
         # changing location value
         element.send_keys(loc)
-        drop_elem = self.find_element(By.XPATH, drop_xpath)
+        drop_elem = self._wait_for(drop_key)
 
         if (loc != 'anywhere') and (loc != 'EUcg'):
             passed = False
@@ -493,6 +1184,17 @@ class Flights(webdriver.Chrome):
                 if passed:
                     break
 
+    def report_wait_times(self):
+        """
+        print and log how long the waits took (per xPaths key)
+        :return: report string
+        """
+        report = self.wait_profiler.report()
+        print(f"\nWait Times:\n\n{report}\n")
+        self.logger.debug(f"Wait times:\n{report}")
+
+        return report
+
     @staticmethod
     def init_logger(logger_name=__name__):
         """
@@ -500,30 +1202,25 @@ class Flights(webdriver.Chrome):
         :param logger_name:
         :return: log instance
         """
-        now = datetime.now()
-        current_time = now.strftime('%d-%m-%Y_%H-%M-%S')
-
-        logger = configure_logger(logger_name=logger_name, logging_level=logging.DEBUG, print_logging=True,
-                                  log_output_path=f'.\\log_files\\flights-log_file-{current_time}.log')
+        # shares the process log file (and background writer) with the other loggers
+        logger = configure_structured_logger(logger_name=logger_name, logging_level=logging.DEBUG,
+                                             print_logging=True, file_prefix='flights')
 
         logger.info("Flights logger initiated ... ")
 
         return logger
 
-    def report_results_via_email(self, results):
+    def report_results_via_email(self, results, html=None, attachments=None):
         """
-        send table of results via email
+        queue table of results to be emailed (sent in the background by the mailer)
+        :param results: text results
+        :param html: html results (email html alternative)
+        :param attachments: list of (filename, bytes, mime type)
         :return:
         """
-        em = EmailMessage()
-        em['From'] = self.sender
-        em['To'] = self.receiver
-        em['Subject'] = self.subject
-        em.set_content(f"{self.body}\n\n{results}")
-
-        context = ssl.create_default_context()
+        if not self.receiver:
+            return
 
-        self.logger.info("sending results via email")
-        with smtplib.SMTP_SSL(self.server, self.port, context=context) as smtp:
-            smtp.login(self.sender, self.s_password)
-            smtp.sendmail(self.sender, self.receiver, em.as_string())
+        self.logger.info("queueing results email")
+        self.mailer.send(self.receiver, self.subject, f"{self.body}\n\n{results}",
+                         html=f"<p>{escape(self.body)}</p>\n{html}" if html else None, attachments=attachments)
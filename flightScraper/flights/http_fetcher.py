@@ -0,0 +1,96 @@
+from concurrent.futures import ThreadPoolExecutor
+import logging
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from flights.urls import build_search_explore_url
+from flights.selector_registry import SelectorRegistry
+from flights.blocking import BlockDetector, BLOCKED, CAPTCHA
+from flights.throttle import RateLimiter
+from flights import parser
+
+
+class ExploreFetcher:
+    def __init__(self, cfg_data, logger=None, rate_limiter=None, block_detector=None):
+        """
+        lightweight (no browser) explore page fetcher - pooled keep-alive http connections.
+        only useful when the results are in the server response (otherwise the page needs javascript rendering).
+        requests go through the same rate limiter (and circuit breaker) as the browser page loads
+        :param cfg_data: loaded cfg.json
+        :param logger:
+        :param rate_limiter: shared (per site) RateLimiter, a new one from cfg 'throttle' if not given
+        :param block_detector: BlockDetector, a new one from cfg 'blocking' if not given
+        """
+        self.cfg_data = cfg_data
+        self.http_cfg = cfg_data['http']
+        self.selectors = SelectorRegistry.from_cfg(cfg_data['xPaths'])
+        self.logger = logger if logger else logging.getLogger(__name__)
+        self.rate_limiter = rate_limiter if rate_limiter else RateLimiter.from_cfg(cfg_data['throttle'],
+                                                                                    logger=self.logger)
+        self.block_detector = block_detector if block_detector else BlockDetector(cfg_data['blocking'])
+
+        # 429 isn't retried here - it is a block, the rate limiter backs off instead
+        retries = Retry(total=self.http_cfg['retries'], backoff_factor=0.5, status_forcelist=[500, 502, 503])
+        adapter = HTTPAdapter(pool_connections=self.http_cfg['pool_size'], pool_maxsize=self.http_cfg['pool_size'],
+                              max_retries=retries)
+        self.session = requests.Session()
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.session.headers.update(self.http_cfg['headers'])
+
+    def fetch_general_results(self, url):
+        """
+        fetch and parse the explore page results
+        :param url: explore page url
+        :return: list of GeneralResult, None if the results need a browser (not in the response / blocked)
+        """
+        if not parser.has_fast_parser():
+            return None
+
+        self.rate_limiter.acquire()
+        try:
+            response = self.session.get(url, timeout=self.http_cfg['timeout'])
+        except requests.RequestException as e:
+            self.logger.info(f"http fast path failed ({e}), using the browser")
+            return None
+
+        results = parser.parse_general_results(response.text, self.selectors.explore) if response.ok else None
+        if results and all(result.price is not None and result.city is not None for result in results):
+            self.rate_limiter.reward()
+            return results
+
+        if response.status_code in (403, 429) or self.block_detector.classify(
+                response.url, parser.page_title(response.text), response.text, False) in (BLOCKED, CAPTCHA):
+            self.logger.warning(f"http fast path blocked ({response.status_code}): {response.url}")
+            self.rate_limiter.penalize()
+            return None
+
+        self.logger.info("explore results not in the server response, using the browser")
+        return None
+
+    def close(self):
+        self.session.close()
+
+
+def sweep_explore(cfg_data, origins, year=None, month=None, duration=None, logger=None):
+    """
+    cheapest destinations from several origins without a browser (a few http requests)
+    :param cfg_data: loaded cfg.json
+    :param origins: origin codes
+    :param year:
+    :param month:
+    :param duration:
+    :param logger:
+    :return: {origin: list of GeneralResult, None if the origin needs the browser}
+    """
+    # one rate limiter for all the origins (same site)
+    fetcher = ExploreFetcher(cfg_data, logger)
+    urls = [build_search_explore_url(cfg_data['site'], cfg_data['explore'], origin, duration=duration, year=year,
+                                     month=month)[0] for origin in origins]
+    try:
+        with ThreadPoolExecutor(max_workers=cfg_data['http']['pool_size']) as executor:
+            return dict(zip(origins, executor.map(fetcher.fetch_general_results, urls)))
+    finally:
+        fetcher.close()
@@ -0,0 +1,331 @@
+from threading import Lock, Thread, Event
+import logging
+import sqlite3
+import socket
+import json
+import time
+import os
+
+from flights.batch import scrape_job
+from flights.selector_registry import SelectorRegistry
+from flights.session_pool import SessionPool
+from flights.throttle import RateLimiter
+
+# job states
+PENDING = 'pending'
+LEASED = 'leased'
+DONE = 'done'
+FAILED = 'failed'
+
+
+class JobQueue:
+    def __init__(self, path, lease_seconds=900, max_attempts=3, retry_delay=60):
+        """
+        shared (sqlite) queue of search jobs - worker processes lease jobs, scrape them and push the deal records
+        back. a job is leased by one worker at a time, a lease that isn't completed in time (crashed / stuck worker)
+        expires and the job is retried, up to max_attempts. active jobs are deduped by id (same search = same job),
+        a finished one is run again when re-queued. single host only - the file must be on a local disk (sqlite
+        locking isn't reliable on network file systems), run several worker processes to scale out on the host
+        :param path: sqlite file
+        :param lease_seconds: how long a worker owns a job (renewed while it runs)
+        :param max_attempts: attempts per job before it fails
+        :param retry_delay: seconds before a failed job is retried (doubled every attempt)
+        """
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self._lock = Lock()
+        # autocommit - transactions are started explicitly (BEGIN IMMEDIATE takes the write lock up front).
+        # rollback journal (not WAL) - only file locks, no shared memory index
+        self._conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode = DELETE")
+        self._create_tables()
+
+    @classmethod
+    def from_cfg(cls, queue_cfg):
+        """
+        queue with the settings of cfg 'queue'
+        :param queue_cfg: cfg 'queue'
+        :return: JobQueue
+        """
+        return cls(queue_cfg['path'], lease_seconds=queue_cfg['lease_seconds'],
+                   max_attempts=queue_cfg['max_attempts'], retry_delay=queue_cfg['retry_delay'])
+
+    def _create_tables(self):
+        with self._lock:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY, job TEXT, status TEXT, attempts INTEGER, worker TEXT,
+                    available_at REAL, error TEXT, updated_at REAL)
+            """)
+            self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_available ON jobs (status, available_at)")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS results (
+                    job_id TEXT, worker TEXT, scraped_at REAL, record TEXT)
+            """)
+            self._conn.execute("CREATE INDEX IF NOT EXISTS results_job ON results (job_id)")
+
+    def _transaction(self, statements):
+        """
+        run statements in one write transaction
+        :param statements: callable(conn) -> result
+        :return: result
+        """
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = statements(self._conn)
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+        return result
+
+    def enqueue(self, jobs):
+        """
+        add jobs - jobs that are pending or leased are skipped, done / failed jobs are queued again
+        (new attempts, the results of their previous run are cleared)
+        :param jobs: list of jobs (with an 'id', see batch.load_jobs)
+        :return: number of jobs queued
+        """
+        now = time.time()
+
+        def insert(conn):
+            added = 0
+            for job in jobs:
+                if conn.execute("""
+                    INSERT INTO jobs VALUES (?, ?, ?, 0, NULL, ?, NULL, ?)
+                    ON CONFLICT (id) DO UPDATE SET job = excluded.job, status = excluded.status, attempts = 0,
+                                                   worker = NULL, available_at = excluded.available_at, error = NULL,
+                                                   updated_at = excluded.updated_at
+                    WHERE jobs.status IN (?, ?)
+                """, (job['id'], json.dumps(job), PENDING, now, now, DONE, FAILED)).rowcount:
+                    # a re-queued job - its stale deals aren't mixed with the new run's
+                    conn.execute("DELETE FROM results WHERE job_id = ?", (job['id'],))
+                    added += 1
+            return added
+
+        return self._transaction(insert)
+
+    def lease(self, worker):
+        """
+        take the next available job (pending, or with an expired lease)
+        :param worker: worker id
+        :return: job, None if no job is available
+        """
+        now = time.time()
+
+        def take(conn):
+            # expired leases of jobs that used all their attempts
+            conn.execute("""
+                UPDATE jobs SET status = ?, error = 'lease expired', updated_at = ?
+                WHERE status = ? AND available_at <= ? AND attempts >= ?
+            """, (FAILED, now, LEASED, now, self.max_attempts))
+
+            row = conn.execute("""
+                SELECT id, job FROM jobs WHERE status IN (?, ?) AND available_at <= ?
+                ORDER BY available_at LIMIT 1
+            """, (PENDING, LEASED, now)).fetchone()
+            if row is None:
+                return None
+
+            conn.execute("""
+                UPDATE jobs SET status = ?, attempts = attempts + 1, worker = ?, available_at = ?, updated_at = ?
+                WHERE id = ?
+            """, (LEASED, worker, now + self.lease_seconds, now, row[0]))
+            return json.loads(row[1])
+
+        return self._transaction(take)
+
+    def renew(self, job_id, worker):
+        """
+        extend a job's lease (heartbeat of a long job)
+        :param job_id:
+        :param worker:
+        :return: True if the worker still owns the job
+        """
+        now = time.time()
+        return self._transaction(lambda conn: conn.execute("""
+            UPDATE jobs SET available_at = ?, updated_at = ? WHERE id = ? AND status = ? AND worker = ?
+        """, (now + self.lease_seconds, now, job_id, LEASED, worker)).rowcount == 1)
+
+    def complete(self, job_id, worker, records):
+        """
+        push a job's deal records and mark it done - ignored if the lease was lost (the job was retried
+        by another worker), so every job's results are stored once
+        :param job_id:
+        :param worker:
+        :param records: deal records (see Deal.to_record)
+        :return: True if the results were stored
+        """
+        now = time.time()
+
+        def store(conn):
+            if conn.execute("""
+                UPDATE jobs SET status = ?, error = NULL, updated_at = ? WHERE id = ? AND status = ? AND worker = ?
+            """, (DONE, now, job_id, LEASED, worker)).rowcount != 1:
+                return False
+            conn.executemany("INSERT INTO results VALUES (?, ?, ?, ?)",
+                             [(job_id, worker, now, json.dumps(record)) for record in records])
+            return True
+
+        return self._transaction(store)
+
+    def fail(self, job_id, worker, error):
+        """
+        give a job back after a failed attempt - retried after a backoff, failed after max_attempts
+        :param job_id:
+        :param worker:
+        :param error:
+        :return:
+        """
+        now = time.time()
+        self._transaction(lambda conn: conn.execute("""
+            UPDATE jobs SET status = CASE WHEN attempts >= ? THEN ? ELSE ? END,
+                            available_at = ? + ? * (1 << (attempts - 1)), error = ?, updated_at = ?
+            WHERE id = ? AND status = ? AND worker = ?
+        """, (self.max_attempts, FAILED, PENDING, now, self.retry_delay, str(error), now, job_id, LEASED, worker)))
+
+    def counts(self):
+        """
+        number of jobs per state
+        :return: {state: count}
+        """
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+
+        return {**{state: 0 for state in (PENDING, LEASED, DONE, FAILED)}, **dict(rows)}
+
+    def is_drained(self):
+        counts = self.counts()
+        return not counts[PENDING] and not counts[LEASED]
+
+    def results(self, job_id=None):
+        """
+        deal records pushed by the workers
+        :param job_id: a single job's records, all the records if not given
+        :return: list of (job id, record)
+        """
+        query = "SELECT job_id, record FROM results"
+        params = ()
+        if job_id is not None:
+            query += " WHERE job_id = ?"
+            params = (job_id,)
+        with self._lock:
+            rows = self._conn.execute(query + " ORDER BY rowid", params).fetchall()
+
+        return [(row_job_id, json.loads(record)) for row_job_id, record in rows]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def default_worker_id():
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+class QueueWorker:
+    def __init__(self, flights_factory, cfg_data, job_queue, worker_id=None, logger=None):
+        """
+        worker node - its browser sessions pull jobs from the shared queue, scrape them and push the deals back.
+        every node has its own sessions and rate limiter, so adding a node adds throughput
+        :param flights_factory: callable(rate_limiter, slot index) -> new Flights instance (see SessionPool)
+        :param cfg_data: loaded cfg.json
+        :param job_queue: JobQueue
+        :param worker_id: node id, host-pid if not given
+        :param logger:
+        """
+        # fail before any browser starts if the selectors are broken
+        SelectorRegistry.from_cfg(cfg_data['xPaths'])
+
+        queue_cfg = cfg_data['queue']
+        self.job_queue = job_queue
+        self.workers = queue_cfg['workers']
+        self.poll_interval = queue_cfg['poll_interval']
+        self.worker_id = worker_id if worker_id else default_worker_id()
+        self.logger = logger if logger else logging.getLogger(__name__)
+
+        self.rate_limiter = RateLimiter.from_cfg(cfg_data['throttle'],
+                                                min_interval=cfg_data['batch']['min_request_interval'],
+                                                logger=self.logger)
+        self.session_pool = SessionPool(lambda index: flights_factory(self.rate_limiter, index), self.workers,
+                                        logger=self.logger)
+        self.completed = 0
+        self.failed = 0
+        self._stop = Event()
+        self._counts_lock = Lock()
+
+    def run(self, exit_when_drained=False):
+        """
+        pull and run jobs until stopped (or until the queue is drained)
+        :param exit_when_drained: stop when no job is pending or leased
+        :return: completed jobs, failed attempts
+        """
+        self.logger.info(f"queue worker {self.worker_id}: {self.workers} sessions")
+        with self.session_pool:
+            threads = [Thread(target=self._loop, args=(f"{self.worker_id}/{i}", exit_when_drained),
+                              name=f"queue-worker-{i}") for i in range(self.workers)]
+            for thread in threads:
+                thread.start()
+            try:
+                for thread in threads:
+                    while thread.is_alive():
+                        thread.join(timeout=1)
+            except KeyboardInterrupt:
+                # the running jobs finish, their leases would expire otherwise
+                self.logger.info("stopping queue worker ...")
+                self.stop()
+                for thread in threads:
+                    thread.join()
+
+        return self.completed, self.failed
+
+    def stop(self):
+        self._stop.set()
+
+    def _loop(self, worker, exit_when_drained):
+        while not self._stop.is_set():
+            job = self.job_queue.lease(worker)
+            if job is None:
+                if exit_when_drained and self.job_queue.is_drained():
+                    return
+                self._stop.wait(self.poll_interval)
+                continue
+
+            self._run_job(worker, job)
+
+    def _run_job(self, worker, job):
+        """
+        run a leased job (its lease is renewed while it runs)
+        :param worker: worker id (of the lease)
+        :param job:
+        :return:
+        """
+        done = Event()
+
+        def heartbeat():
+            while not done.wait(self.job_queue.lease_seconds / 3):
+                if not self.job_queue.renew(job['id'], worker):
+                    self.logger.warning(f"lost the lease of job {job['id']}")
+                    return
+
+        Thread(target=heartbeat, name=f"lease-{job['id']}", daemon=True).start()
+        try:
+            with self.session_pool.borrow() as flights_bot:
+                records = scrape_job(flights_bot, job).to_records()
+        except Exception as e:
+            self.logger.exception(f"issue with queued job {job['id']}: {e}")
+            self.job_queue.fail(job['id'], worker, e)
+            with self._counts_lock:
+                self.failed += 1
+            return
+        finally:
+            done.set()
+
+        if self.job_queue.complete(job['id'], worker, records):
+            self.logger.info(f"queued job {job['id']} done ({len(records)} deals)")
+            with self._counts_lock:
+                self.completed += 1
@@ -0,0 +1,113 @@
+from itertools import count
+import threading
+import os
+
+from selenium.common import WebDriverException
+
+try:
+    import fcntl
+except ImportError:  # windows
+    fcntl = None
+    import msvcrt
+
+# disk cache dirs in use by the browsers of this process (one chrome per dir) - slot: locked file of the slot.
+# the file lock keeps other processes on the host (queue workers, an interactive run) off the dir
+_cache_slots_lock = threading.Lock()
+_cache_slots = {}
+
+
+def lean_arguments(lean_cfg):
+    """
+    chrome command line switches of the lean mode (also used for the session pool daemon browsers)
+    :param lean_cfg: cfg 'lean'
+    :return: list of switches
+    """
+    args = ["--disable-extensions", "--disable-background-networking", "--mute-audio"]
+    if lean_cfg['block_images']:
+        args.append("--blink-settings=imagesEnabled=false")
+
+    return args
+
+
+def apply_lean_options(options, lean_cfg, cache_dir=None):
+    """
+    lean browser - no images, eager page load (don't wait for subresources), persistent disk cache
+    :param options: ChromeOptions
+    :param lean_cfg: cfg 'lean'
+    :param cache_dir: disk cache dir (see acquire_cache_dir)
+    :return:
+    """
+    options.page_load_strategy = lean_cfg['page_load_strategy']
+    for arg in lean_arguments(lean_cfg):
+        options.add_argument(arg)
+    if cache_dir:
+        options.add_argument(f"--disk-cache-dir={cache_dir}")
+    if lean_cfg['block_images']:
+        options.add_experimental_option('prefs', {'profile.managed_default_content_settings.images': 2})
+
+
+def block_resources(driver, lean_cfg, logger=None):
+    """
+    block the requests the scraper never reads (images, media, fonts, ads/trackers/analytics) with devtools
+    :param driver: chrome webdriver
+    :param lean_cfg: cfg 'lean'
+    :param logger:
+    :return:
+    """
+    try:
+        driver.execute_cdp_cmd('Network.enable', {})
+        driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': lean_cfg['blocked_urls']})
+    except WebDriverException as e:
+        if logger:
+            logger.error(f"issue with blocking resources: {e}")
+
+
+def acquire_cache_dir(lean_cfg):
+    """
+    free disk cache dir (reused across runs - a dir is used by one browser at a time)
+    :param lean_cfg: cfg 'lean'
+    :return: slot, dir path
+    """
+    root = os.path.abspath(lean_cfg['disk_cache_dir'])
+    os.makedirs(root, exist_ok=True)
+    with _cache_slots_lock:
+        for slot in count():
+            if slot in _cache_slots:
+                continue
+            lock_file = _try_lock(os.path.join(root, f"cache-{slot}.lock"))
+            if lock_file:
+                _cache_slots[slot] = lock_file
+                break
+
+    cache_dir = os.path.join(root, f"cache-{slot}")
+    os.makedirs(cache_dir, exist_ok=True)
+
+    return slot, cache_dir
+
+
+def release_cache_dir(slot):
+    with _cache_slots_lock:
+        lock_file = _cache_slots.pop(slot, None)
+    if lock_file:
+        # closing the file drops the lock
+        lock_file.close()
+
+
+def _try_lock(path):
+    """
+    exclusive non blocking lock of a slot lock file (released by the os if the process dies)
+    :param path: lock file path
+    :return: open locked file, None if another process holds the slot
+    """
+    lock_file = open(path, 'a+')
+    try:
+        if fcntl:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            lock_file.seek(0)
+            msvcrt.locking(lock_file.fileno(), msvcrt.LK_NBLCK, 1)
+    except OSError:
+        lock_file.close()
+        return None
+
+    return lock_file
@@ -0,0 +1,175 @@
+from email.message import EmailMessage
+from threading import Thread, Lock
+import logging
+import smtplib
+import queue
+import time
+import ssl
+
+
+class Mailer:
+    def __init__(self, server, port, sender, password, use_ssl=True, batch_size=20, max_retries=3, backoff=2.0,
+                 idle_timeout=60, logger=None):
+        """
+        notification queue - emails are sent by a background worker over one reusable (logged in) smtp connection,
+        so a slow smtp server doesn't stall the scraping and many digests share a session.
+        use_ssl=False for plain smtp (e.g. a local aiosmtpd stand-in: python -m aiosmtpd -n -l localhost:8025)
+        :param server:
+        :param port:
+        :param sender:
+        :param password: no login if empty
+        :param use_ssl: SMTP_SSL or plain SMTP
+        :param batch_size: max messages sent per wake-up of the worker
+        :param max_retries: attempts per message after the first one
+        :param backoff: seconds before the first retry (doubled every retry)
+        :param idle_timeout: seconds without messages before the connection is closed
+        :param logger:
+        """
+        self.server = server
+        self.port = port
+        self.sender = sender
+        self.password = password
+        self.use_ssl = use_ssl
+        self.batch_size = batch_size
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.idle_timeout = idle_timeout
+        self.logger = logger if logger else logging.getLogger(__name__)
+
+        self.failed = 0
+        self._queue = queue.Queue()
+        self._smtp = None
+        self._worker = None
+        self._worker_lock = Lock()
+
+    @classmethod
+    def from_cfg(cls, email_cfg, server, port, sender, password, logger=None):
+        """
+        mailer with the delivery settings of cfg 'email'
+        :param email_cfg: cfg 'email'
+        :return: Mailer
+        """
+        return cls(server, port, sender, password, use_ssl=email_cfg['use_ssl'], batch_size=email_cfg['batch_size'],
+                   max_retries=email_cfg['max_retries'], backoff=email_cfg['backoff'],
+                   idle_timeout=email_cfg['idle_timeout'], logger=logger)
+
+    def send(self, receiver, subject, body, html=None, attachments=None):
+        """
+        queue an email (returns immediately)
+        :param receiver:
+        :param subject:
+        :param body: plain text body
+        :param html: html alternative of the body
+        :param attachments: list of (filename, bytes, mime type)
+        :return:
+        """
+        em = EmailMessage()
+        em['From'] = self.sender
+        em['To'] = receiver
+        em['Subject'] = subject
+        em.set_content(body)
+        if html:
+            em.add_alternative(html, subtype='html')
+        for filename, data, mime_type in attachments or []:
+            maintype, subtype = mime_type.split('/')
+            em.add_attachment(data, maintype=maintype, subtype=subtype, filename=filename)
+
+        self._queue.put(em)
+        self._start_worker()
+
+    def _start_worker(self):
+        with self._worker_lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = Thread(target=self._run, name='mailer', daemon=True)
+                self._worker.start()
+
+    def _run(self):
+        """
+        worker loop - sends the queued messages in batches, closes the connection when idle
+        :return:
+        """
+        while True:
+            try:
+                em = self._queue.get(timeout=self.idle_timeout)
+            except queue.Empty:
+                self._disconnect()
+                continue
+            if em is None:
+                self._disconnect()
+                return
+
+            batch = [em]
+            while len(batch) < self.batch_size:
+                try:
+                    em = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if em is None:
+                    # stop after this batch
+                    self._queue.put(None)
+                    break
+                batch.append(em)
+
+            for em in batch:
+                self._deliver(em)
+
+    def _deliver(self, em):
+        """
+        send a message, reconnecting and backing off between failed attempts
+        :param em: EmailMessage
+        :return: True if sent
+        """
+        for attempt in range(self.max_retries + 1):
+            try:
+                self._connect().send_message(em)
+                self.logger.info(f"email sent to {em['To']}")
+                return True
+            except (smtplib.SMTPException, OSError) as e:
+                self.logger.error(f"issue with sending email to {em['To']} (attempt {attempt + 1}): {e}")
+                self._disconnect()
+                if attempt < self.max_retries:
+                    time.sleep(self.backoff * 2 ** attempt)
+
+        self.failed += 1
+        return False
+
+    def _connect(self):
+        """
+        the open smtp connection, a new (logged in) one if there is none
+        :return: smtp connection
+        """
+        if self._smtp is None:
+            if self.use_ssl:
+                smtp = smtplib.SMTP_SSL(self.server, self.port, context=ssl.create_default_context())
+            else:
+                smtp = smtplib.SMTP(self.server, self.port)
+            if self.password:
+                smtp.login(self.sender, self.password)
+            self._smtp = smtp
+
+        return self._smtp
+
+    def _disconnect(self):
+        if self._smtp is not None:
+            try:
+                self._smtp.quit()
+            except (smtplib.SMTPException, OSError):
+                pass
+            self._smtp = None
+
+    def close(self):
+        """
+        send the queued emails and stop the worker
+        :return:
+        """
+        if self._worker is not None and self._worker.is_alive():
+            self._queue.put(None)
+            self._worker.join()
+        if self.failed:
+            self.logger.error(f"{self.failed} emails could not be sent")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
@@ -0,0 +1,188 @@
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from collections import defaultdict
+from threading import Lock, Thread
+from contextlib import contextmanager
+import bisect
+import time
+import os
+
+# latency buckets (seconds)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+def _labels_text(labels):
+    if not labels:
+        return ''
+    return "{" + ",".join(f'{name}="{value}"' for name, value in labels) + "}"
+
+
+class Counter:
+    def __init__(self, name, help_text):
+        """
+        monotonically increasing count (per label set)
+        :param name: metric name
+        :param help_text:
+        """
+        self.name = name
+        self.help_text = help_text
+        self._lock = Lock()
+        self._values = defaultdict(float)
+
+    def inc(self, amount=1, **labels):
+        with self._lock:
+            self._values[tuple(sorted(labels.items()))] += amount
+
+    def value(self, **labels):
+        with self._lock:
+            return self._values.get(tuple(sorted(labels.items())), 0)
+
+    def exposition(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_labels_text(labels)} {value:g}")
+
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help_text, buckets=DEFAULT_BUCKETS):
+        """
+        distribution of observed values (e.g. latencies) in cumulative buckets (per label set)
+        :param name: metric name
+        :param help_text:
+        :param buckets: upper bounds (ascending)
+        """
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(buckets)
+        self._lock = Lock()
+        # label set -> [bucket counts..., +Inf count], sum
+        self._counts = {}
+        self._sums = defaultdict(float)
+
+    def observe(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            counts = self._counts.setdefault(key, [0] * (len(self.buckets) + 1))
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            self._sums[key] += value
+
+    @contextmanager
+    def time(self, **labels):
+        """
+        observe the duration of the with block
+        :param labels:
+        :return:
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def count(self, **labels):
+        with self._lock:
+            return sum(self._counts.get(tuple(sorted(labels.items())), []))
+
+    def exposition(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for labels, counts in sorted(self._counts.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets + ('+Inf',), counts):
+                    cumulative += count
+                    lines.append(f"{self.name}_bucket{_labels_text(labels + (('le', bound),))} {cumulative}")
+                lines.append(f"{self.name}_sum{_labels_text(labels)} {self._sums[labels]:g}")
+                lines.append(f"{self.name}_count{_labels_text(labels)} {cumulative}")
+
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self, prefix='flights'):
+        """
+        the process metrics (counters and histograms), exported in prometheus text format
+        :param prefix: metric names prefix
+        """
+        self.prefix = prefix
+        self._lock = Lock()
+        self._metrics = {}
+
+    def counter(self, name, help_text=''):
+        return self._get(Counter, name, help_text)
+
+    def histogram(self, name, help_text='', buckets=DEFAULT_BUCKETS):
+        return self._get(Histogram, name, help_text, buckets)
+
+    def _get(self, metric_type, name, *args):
+        """
+        registered metric by name (created on first use)
+        :return: metric
+        """
+        name = f"{self.prefix}_{name}"
+        with self._lock:
+            if name not in self._metrics:
+                self._metrics[name] = metric_type(name, *args)
+
+        return self._metrics[name]
+
+    def to_prometheus(self):
+        """
+        prometheus text exposition format
+        :return:
+        """
+        with self._lock:
+            metrics = list(self._metrics.values())
+
+        return "\n".join(line for metric in metrics for line in metric.exposition()) + "\n"
+
+    def write(self, path):
+        """
+        write the metrics to a file (atomic - e.g. for node exporter's textfile collector)
+        :param path:
+        :return:
+        """
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as metrics_file:
+            metrics_file.write(self.to_prometheus())
+        os.replace(tmp_path, path)
+
+    def serve(self, port, host='0.0.0.0'):
+        """
+        serve /metrics over http (in a daemon thread) for prometheus scraping
+        :param port:
+        :param host:
+        :return: server
+        """
+        registry = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = registry.to_prometheus().encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), MetricsHandler)
+        Thread(target=server.serve_forever, daemon=True).start()
+
+        return server
+
+
+# process wide registry
+registry = MetricsRegistry()
+
+pages_loaded = registry.counter('pages_loaded_total', "browser page loads")
+page_load_seconds = registry.histogram('page_load_seconds', "browser page load latency")
+flight_boxes_parsed = registry.counter('flight_boxes_parsed_total', "flight boxes parsed (dom or captured)")
+flight_box_errors = registry.counter('flight_box_errors_total', "flight boxes that failed to parse (f_error_count)")
+page_states = registry.counter('page_states_total', "loaded pages by state (ok, empty, blocked, captcha)")
+shortener_failures = registry.counter('shortener_failures_total', "links that failed to shorten")
+stage_seconds = registry.histogram('stage_seconds', "scraping stage latency")
+wait_seconds = registry.histogram('wait_seconds', "explicit element waits latency")
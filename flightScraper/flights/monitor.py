@@ -0,0 +1,233 @@
+from concurrent.futures import ThreadPoolExecutor
+from collections import namedtuple
+from threading import Lock
+import logging
+import time
+
+import numpy as np
+
+from flights.batch import load_jobs, scrape_job
+from flights.session_pool import SessionPool
+from flights.flights import Flights
+from flights.throttle import RateLimiter
+
+Alert = namedtuple('Alert', ['city', 'price', 'previous', 'currency', 'reason', 'link'])
+
+
+def load_routes(routes_file):
+    """
+    load the tracked routes - batch jobs (see batch.load_jobs) with optional alert rules, e.g.
+    {"origin": "TLV", "month": 9, "duration": "5,10", "max_price": 150, "drop_pct": 15}
+    :param routes_file:
+    :return: list of routes (with an 'id')
+    """
+    return load_jobs(routes_file)
+
+
+def cheapest_per_city(deals):
+    """
+    cheapest deal of each destination
+    :param deals: DealSet
+    :return: list of Deal
+    """
+    if not len(deals):
+        return []
+
+    cities = np.asarray(deals.column('city'), dtype=object)
+    order = np.argsort(deals.column('price'), kind='stable')
+    # first (cheapest) row of every city in price order
+    _, first_rows = np.unique(cities[order], return_index=True)
+
+    return list(deals.take(order[np.sort(first_rows)]))
+
+
+def find_alerts(previous, current, max_price=None, drop_pct=None):
+    """
+    deals worth notifying about - crossed below the price threshold or dropped by at least drop_pct
+    :param previous: {city: price} of the last check
+    :param current: cheapest Deal per destination
+    :param max_price: price threshold
+    :param drop_pct: minimal drop (percent of the previous price)
+    :return: list of Alert
+    """
+    alerts = []
+    for deal in current:
+        before = previous.get(deal.city)
+        if max_price is not None and deal.price <= max_price and (before is None or before > max_price):
+            reason = f"below {deal.currency}{max_price}"
+        elif drop_pct is not None and before and (before - deal.price) * 100 / before >= drop_pct:
+            reason = f"dropped {(before - deal.price) * 100 / before:.0f}%"
+        else:
+            continue
+        alerts.append(Alert(city=deal.city, price=deal.price, previous=before, currency=deal.currency,
+                            reason=reason, link=deal.link))
+
+    return alerts
+
+
+def is_volatile(previous, current, volatility_pct):
+    """
+    checking if any destination's price moved by at least volatility_pct since the last check
+    :param previous: {city: price}
+    :param current: cheapest Deal per destination
+    :param volatility_pct:
+    :return:
+    """
+    return any(deal.city in previous and previous[deal.city] and
+               abs(deal.price - previous[deal.city]) * 100 / previous[deal.city] >= volatility_pct
+               for deal in current)
+
+
+def next_interval(interval, volatile, monitor_cfg):
+    """
+    adaptive polling - check volatile routes more often and stable ones less often
+    :param interval: current interval (seconds)
+    :param volatile: prices moved at the last check
+    :param monitor_cfg: cfg 'monitor'
+    :return: new interval (seconds)
+    """
+    interval = interval * monitor_cfg['speedup_factor'] if volatile else interval * monitor_cfg['backoff_factor']
+    return min(max(interval, monitor_cfg['min_interval_minutes'] * 60), monitor_cfg['max_interval_minutes'] * 60)
+
+
+def retry_delay(interval, failures, monitor_cfg):
+    """
+    delay before re-checking a route whose check failed - doubled on every consecutive failure, never longer than
+    the route's polling interval
+    :param interval: current interval (seconds)
+    :param failures: consecutive failed checks
+    :param monitor_cfg: cfg 'monitor'
+    :return: seconds
+    """
+    return min(monitor_cfg['retry_minutes'] * 60 * 2 ** (failures - 1), interval)
+
+
+def render_alerts(alerts):
+    """
+    alerts text table (for the notification)
+    :param alerts: list of Alert
+    :return:
+    """
+    previous = [f"{alert.currency}{alert.previous}" if alert.previous is not None else '-' for alert in alerts]
+    return Flights.render_results_table(["City", "Price", "Previous", "Why", "Link"],
+                                        [[alert.city for alert in alerts],
+                                         [f"{alert.currency}{alert.price}" for alert in alerts], previous,
+                                         [alert.reason for alert in alerts], [alert.link for alert in alerts]])
+
+
+class PriceMonitor:
+    def __init__(self, flights_factory, cfg_data, store, notify=None, logger=None):
+        """
+        long-running monitor - re-checks the tracked routes on an adaptive schedule, diffs the cheapest price per
+        destination against the previous snapshot (in the result store) and notifies only about the deals that
+        crossed the route's price threshold or dropped enough
+        :param flights_factory: callable(rate_limiter, slot index) -> new Flights instance (see SessionPool)
+        :param cfg_data: loaded cfg.json
+        :param store: ResultStore (snapshots and schedule)
+        :param notify: callable(route, alerts), emails the alerts table (from the session) if not given
+        :param logger:
+        """
+        self.cfg = cfg_data['monitor']
+        self.store = store
+        self.notify = notify
+        self.logger = logger if logger else logging.getLogger(__name__)
+
+        self.rate_limiter = RateLimiter.from_cfg(cfg_data['throttle'], min_interval=self.cfg['min_request_interval'],
+                                                logger=self.logger)
+        self.session_pool = SessionPool(lambda index: flights_factory(self.rate_limiter, index), self.cfg['workers'],
+                                        logger=self.logger)
+        # consecutive failed checks per route (retry backoff)
+        self._failures = {}
+        self._failures_lock = Lock()
+
+    def due_routes(self, routes, now=None):
+        """
+        routes whose next check time has come (never checked routes are due)
+        :param routes:
+        :param now: timestamp
+        :return: list of routes
+        """
+        now = now if now else time.time()
+        due = []
+        for route in routes:
+            schedule = self.store.load_schedule(route['id'])
+            if schedule is None or schedule[1] <= now:
+                due.append(route)
+
+        return due
+
+    def check(self, route):
+        """
+        scrape a route, diff against the previous snapshot, notify and reschedule
+        :param route:
+        :return: list of Alert, None if the check failed
+        """
+        try:
+            with self.session_pool.borrow() as flights_bot:
+                current = cheapest_per_city(scrape_job(flights_bot, route, desc=f"Monitoring ({route['id']}): ",
+                                                       refresh=True))
+                if not current:
+                    # blocked / empty explore page - a failed check, not a stable price
+                    self.logger.warning(f"monitored route {route['id']}: no deals found")
+                    self._reschedule_retry(route['id'])
+                    return None
+
+                previous = self.store.load_snapshot(route['id'])
+                alerts = find_alerts(previous, current, max_price=route.get('max_price'),
+                                     drop_pct=route.get('drop_pct', self.cfg['drop_pct']))
+                if alerts:
+                    self.logger.info(f"monitor {route['id']}: {len(alerts)} alerts")
+                    if self.notify:
+                        self.notify(route, alerts)
+                    else:
+                        flights_bot.report_results_via_email(render_alerts(alerts))
+        except Exception as e:
+            self.logger.exception(f"issue with monitored route {route['id']}: {e}")
+            self._reschedule_retry(route['id'])
+            return None
+
+        with self._failures_lock:
+            self._failures.pop(route['id'], None)
+        self.store.save_snapshot(route['id'], current)
+        self._reschedule(route['id'], volatile=is_volatile(previous, current, self.cfg['volatility_pct']))
+
+        return alerts
+
+    def _current_interval(self, route_id):
+        schedule = self.store.load_schedule(route_id)
+        return schedule[0] if schedule else self.cfg['initial_interval_minutes'] * 60
+
+    def _reschedule(self, route_id, volatile):
+        interval = next_interval(self._current_interval(route_id), volatile, self.cfg)
+        self.store.save_schedule(route_id, interval, time.time() + interval)
+        self.logger.info(f"monitor {route_id}: next check in {interval / 60:.0f} minutes")
+
+    def _reschedule_retry(self, route_id):
+        """
+        retry a failed check after a backoff - the polling interval is kept (a failure says nothing about the prices)
+        :param route_id:
+        :return:
+        """
+        with self._failures_lock:
+            failures = self._failures[route_id] = self._failures.get(route_id, 0) + 1
+
+        interval = self._current_interval(route_id)
+        delay = retry_delay(interval, failures, self.cfg)
+        self.store.save_schedule(route_id, interval, time.time() + delay)
+        self.logger.info(f"monitor {route_id}: failed {failures} times, retrying in {delay / 60:.0f} minutes")
+
+    def run(self, routes):
+        """
+        monitor the routes until interrupted
+        :param routes: list of routes (see load_routes)
+        :return:
+        """
+        self.logger.info(f"monitoring {len(routes)} routes")
+        with self.session_pool:
+            with ThreadPoolExecutor(max_workers=self.cfg['workers']) as executor:
+                try:
+                    while True:
+                        list(executor.map(self.check, self.due_routes(routes)))
+                        time.sleep(self.cfg['check_interval'])
+                except KeyboardInterrupt:
+                    self.logger.info("stopping price monitor")
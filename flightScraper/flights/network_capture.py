@@ -0,0 +1,174 @@
+from datetime import datetime
+import json
+import re
+
+from selenium.common import WebDriverException
+
+from flights.parser import GeneralResult, FlightBox
+
+
+def enable_performance_logging(options):
+    """
+    chrome performance (devtools network) logs are needed for capturing the site's api responses
+    :param options: ChromeOptions
+    :return:
+    """
+    options.set_capability('goog:loggingPrefs', {'performance': 'ALL'})
+
+
+def get_path(data, path):
+    """
+    value at a dotted path in a json payload (list indices may be negative), e.g. 'legs.0.segments.-1.arrival'
+    :param data:
+    :param path:
+    :return: value, None if missing
+    """
+    for key in path.split('.'):
+        try:
+            data = data[int(key)] if isinstance(data, list) else data[key]
+        except (KeyError, IndexError, ValueError, TypeError):
+            return None
+
+    return data
+
+
+def _time_of(value):
+    """
+    'HH:MM' from an iso datetime (or the value itself if it isn't one)
+    :param value:
+    :return:
+    """
+    try:
+        return datetime.fromisoformat(value).strftime('%H:%M')
+    except (TypeError, ValueError):
+        return value
+
+
+class NetworkCapture:
+    def __init__(self, driver, capture_cfg):
+        """
+        picks up the json (xhr/fetch) responses behind the explore and results pages from the devtools performance
+        logs, and parses prices, times and carriers straight from them (no waiting for paint / dom traversal).
+        the payload field paths are in cfg 'capture' (site api specific)
+        :param driver: Flights (chrome with performance logging enabled)
+        :param capture_cfg: cfg 'capture'
+        """
+        self.driver = driver
+        self.cfg = capture_cfg
+        self.explore_pattern = re.compile(capture_cfg['explore_url_pattern'])
+        self.results_pattern = re.compile(capture_cfg['results_url_pattern'])
+        self._pending = {}
+        self._payloads = []
+
+    def reset(self):
+        """
+        drop the responses captured so far (call before loading a new page)
+        :return:
+        """
+        self._read_logs()
+        self._pending.clear()
+        self._payloads.clear()
+
+    def _read_logs(self):
+        """
+        collect the bodies of finished json responses that match the explore/results patterns
+        :return:
+        """
+        for entry in self.driver.get_log('performance'):
+            message = json.loads(entry['message'])['message']
+            params = message.get('params', {})
+
+            if message['method'] == 'Network.responseReceived':
+                response = params['response']
+                url = response['url']
+                if 'json' in response.get('mimeType', '') and \
+                        (self.explore_pattern.search(url) or self.results_pattern.search(url)):
+                    self._pending[params['requestId']] = url
+
+            elif message['method'] == 'Network.loadingFinished' and params['requestId'] in self._pending:
+                url = self._pending.pop(params['requestId'])
+                try:
+                    body = self.driver.execute_cdp_cmd('Network.getResponseBody', {'requestId': params['requestId']})
+                    self._payloads.append((url, json.loads(body['body'])))
+                except (WebDriverException, ValueError, KeyError):
+                    continue
+
+    def _latest_payload(self, pattern):
+        self._read_logs()
+        for url, payload in reversed(self._payloads):
+            if pattern.search(url):
+                return payload
+
+        return None
+
+    def explore_results(self):
+        """
+        explore page results from the captured api response
+        :return: list of GeneralResult, None if not captured (yet)
+        """
+        payload = self._latest_payload(self.explore_pattern)
+        if payload is None:
+            return None
+
+        fields = self.cfg['explore']
+        results = []
+        for item in get_path(payload, fields['items']) or []:
+            price = get_path(item, fields['price'])
+            # no price - not a deal (would show as "from $None")
+            if price is None:
+                continue
+            depart = get_path(item, fields['depart'])
+            return_date = get_path(item, fields['return'])
+            dates = None
+            if depart and return_date:
+                dates = f"{self._display_date(depart)} - {self._display_date(return_date)}"
+            results.append(GeneralResult(price=f"from {self.cfg['currency']}{price}",
+                                         city=get_path(item, fields['city']), dates=dates,
+                                         dest_code=get_path(item, fields['code'])))
+
+        return results
+
+    def flight_boxes(self):
+        """
+        flight results from the captured api responses (same records as the dom parser)
+        :return: list of FlightBox, None if not captured (yet)
+        """
+        payload = self._latest_payload(self.results_pattern)
+        if payload is None:
+            return None
+
+        fields = self.cfg['results']
+        boxes = []
+        for item in get_path(payload, fields['items']) or []:
+            legs = get_path(item, fields['legs']) or []
+            # a deal needs a price and a link to book it
+            if len(legs) < 2 or get_path(item, fields['price']) is None or not get_path(item, fields['link']):
+                continue
+
+            times = [f"{_time_of(get_path(leg, fields['leg_depart']))} – "
+                     f"{_time_of(get_path(leg, fields['leg_arrive']))}" for leg in legs[:2]]
+            carriers = [get_path(leg, fields['leg_carrier']) for leg in legs[:2]]
+            boxes.append(FlightBox(price=f"{self.cfg['currency']}{get_path(item, fields['price'])}",
+                                   is_final_price=not get_path(item, fields['carry_on_unknown']),
+                                   time_from=times[0], time_to=times[1],
+                                   from_company=carriers[0], to_company=carriers[1],
+                                   link=get_path(item, fields['link'])))
+
+        return boxes
+
+    @staticmethod
+    def _display_date(value):
+        """
+        api date (yyyymmdd or iso) to the explore page format ('Sep 5')
+        :param value:
+        :return:
+        """
+        value = str(value)
+        for date_format in ("%Y%m%d", "%Y-%m-%d"):
+            try:
+                parsed = datetime.strptime(value[:10] if '-' in value else value[:8], date_format)
+                return f"{parsed.strftime('%b')} {parsed.day}"
+            except ValueError:
+                continue
+
+        return value
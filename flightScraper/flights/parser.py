@@ -0,0 +1,158 @@
+from collections import namedtuple
+
+from flights.urls import parse_route_codes
+
+# lxml is used (when available) to parse a whole results page in one pass
+try:
+    from lxml import html as lxml_html
+except ImportError:
+    lxml_html = None
+
+
+GeneralResult = namedtuple('GeneralResult', ['price', 'city', 'dates', 'dest_code', 'origin_code'], defaults=(None,))
+FlightBox = namedtuple('FlightBox', ['price', 'is_final_price', 'time_from', 'time_to',
+                                     'from_company', 'to_company', 'link'])
+
+
+def has_fast_parser():
+    """
+    checking if a one pass (page_source) parser is available
+    :return:
+    """
+    return lxml_html is not None
+
+
+def page_title(page_html):
+    """
+    title of a page (e.g. a fetched block page)
+    :param page_html:
+    :return: title text, '' if none
+    """
+    title = lxml_html.fromstring(page_html).find('.//title') if page_html else None
+    return title.text_content().strip() if title is not None else ''
+
+
+def _soup(web_element):
+    """
+    bs4 tree of a web element (bs4 is imported only when the per-element fallback is used)
+    :param web_element:
+    :return: BeautifulSoup
+    """
+    from bs4 import BeautifulSoup
+
+    return BeautifulSoup(web_element.get_attribute('outerHTML'), 'html.parser')
+
+
+def _text(element):
+    return element.text_content() if element is not None else None
+
+
+def parse_general_results(page_html, selectors):
+    """
+    parse all the explore page results in one pass
+    :param page_html: page_source
+    :param selectors: compiled ExploreSelectors (see selector_registry)
+    :return: list of GeneralResult (text values, destination code if found in the links)
+    """
+    tree = lxml_html.fromstring(page_html)
+
+    results = []
+    for element in selectors.results(tree):
+        price = next(iter(selectors.price(element)), None)
+        city = next(iter(selectors.city(element)), None)
+        dates = next(iter(selectors.dates(element)), None)
+        origin_code, dest_code = parse_route_codes(selectors.links(element))
+        results.append(GeneralResult(_text(price), _text(city), _text(dates), dest_code, origin_code))
+
+    return results
+
+
+def parse_general_result_elements(web_elements, selectors):
+    """
+    fallback (no lxml) - parse the explore page results element by element
+    :param web_elements: selenium web elements
+    :param selectors: ExploreSelectors (class names)
+    :return: list of GeneralResult (text values, destination code if found in the links)
+    """
+    results = []
+    for web_element in web_elements:
+        element_soup = _soup(web_element)
+        price = element_soup.find("div", {"class": selectors.price_class})
+        city = element_soup.find("div", {"class": selectors.city_class})
+        dates = element_soup.find("div", {"class": selectors.date_class})
+        origin_code, dest_code = parse_route_codes([a.get('href') for a in element_soup.find_all(href=True)])
+        results.append(GeneralResult(*[element.text if element else None for element in (price, city, dates)],
+                                     dest_code, origin_code))
+
+    return results
+
+
+def parse_flight_boxes(page_html, selectors):
+    """
+    parse all the flight boxes of a results page in one pass
+    :param page_html: page_source
+    :param selectors: compiled BoxSelectors (see selector_registry)
+    :return: list of FlightBox, number of boxes that could not be parsed
+    """
+    tree = lxml_html.fromstring(page_html)
+
+    boxes = []
+    errors = 0
+    for box in selectors.boxes(tree):
+        try:
+            time_from, time_to = selectors.times(box)[:2]
+            carry_bag = selectors.carry_bag(box)[1].text_content()
+            link = selectors.link(box)[0].getparent()[0].get('href')
+
+            boxes.append(FlightBox(price=selectors.price(box)[0].text_content(),
+                                   is_final_price=_is_final_price(carry_bag),
+                                   time_from=time_from.text_content(),
+                                   time_to=time_to.text_content(),
+                                   from_company=_text(time_from.getnext()),
+                                   to_company=_text(time_to.getnext()),
+                                   link=link))
+        except (IndexError, ValueError):
+            errors += 1
+
+    return boxes, errors
+
+
+def parse_flight_box_elements(web_elements, selectors):
+    """
+    fallback (no lxml) - parse the flight boxes element by element
+    :param web_elements: selenium web elements
+    :param selectors: BoxSelectors (class names)
+    :return: list of FlightBox, number of boxes that could not be parsed
+    """
+    boxes = []
+    errors = 0
+    for web_element in web_elements:
+        try:
+            element_soup = _soup(web_element)
+
+            time_from, time_to = element_soup.findAll("div", {"class": selectors.times_class})[:2]
+            carry_bag = element_soup.findAll("div", {"class": selectors.carry_bag_class})[1].text
+            link = element_soup.findAll("a", href=True)[0].parent.contents[0].attrs['href']
+
+            boxes.append(FlightBox(price=element_soup.findAll("div", {"class": selectors.price_class})[0].text,
+                                   is_final_price=_is_final_price(carry_bag),
+                                   time_from=time_from.text,
+                                   time_to=time_to.text,
+                                   from_company=time_from.next_sibling.text,
+                                   to_company=time_to.next_sibling.text,
+                                   link=link))
+        except Exception:
+            errors += 1
+
+    return boxes, errors
+
+
+def _is_final_price(carry_bag):
+    """
+    checking if a specific flight really offers a carry-on bag (for pricing considerations)
+    :param carry_bag: carry-on bag fee text
+    :return:
+    """
+    if carry_bag == '?':  # TODO: has some issues (sometimes gives 0 when ?)
+        return False
+    return True
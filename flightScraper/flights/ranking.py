@@ -0,0 +1,173 @@
+import numpy as np
+
+from flights.deals import UNKNOWN
+
+MINUTES_PER_DAY = 24 * 60
+
+
+def parse_clock(clock_text):
+    """
+    time of day text to minutes of day
+    :param clock_text: HH:MM
+    :return: minutes
+    """
+    hours, minutes = (int(part) for part in clock_text.split(':'))
+    return hours * 60 + minutes
+
+
+def window_mask(minutes, window):
+    """
+    checking which times fall in a time of day window (unknown times pass)
+    :param minutes: minutes of day array (UNKNOWN if missing)
+    :param window: [start, end] (HH:MM) - may wrap past midnight (e.g. ["22:00", "02:00"])
+    :return: boolean array
+    """
+    start, end = (parse_clock(clock) for clock in window)
+    if start <= end:
+        in_window = (minutes >= start) & (minutes <= end)
+    else:
+        in_window = (minutes >= start) | (minutes <= end)
+
+    return in_window | (minutes == UNKNOWN)
+
+
+def filter_mask(deals, filters):
+    """
+    the deals matching the filters (vectorized over the columns) - any filter missing / None is not applied
+    :param deals: DealSet
+    :param filters: dict - max_price, final_price_only, destinations, carriers, exclude_carriers,
+                    depart_window / arrive_window (outbound flight, [HH:MM, HH:MM])
+    :return: boolean array
+    """
+    mask = np.ones(len(deals), dtype=bool)
+    if filters.get('max_price') is not None:
+        mask &= deals.column('price') <= filters['max_price']
+    if filters.get('final_price_only'):
+        mask &= deals.column('is_final_price').astype(bool)
+    if filters.get('destinations'):
+        mask &= np.isin(np.asarray(deals.column('city'), dtype=object), filters['destinations'])
+    if filters.get('carriers'):
+        mask &= np.isin(np.asarray(deals.column('company'), dtype=object), filters['carriers'])
+    if filters.get('exclude_carriers'):
+        mask &= ~np.isin(np.asarray(deals.column('company'), dtype=object), filters['exclude_carriers'])
+    if filters.get('depart_window'):
+        mask &= window_mask(deals.column('out_depart'), filters['depart_window'])
+    if filters.get('arrive_window'):
+        mask &= window_mask(deals.column('out_arrive'), filters['arrive_window'])
+
+    return mask
+
+
+def _normalized(values):
+    """
+    min-max scale to [0, 1] (nan -> 0.5, constant -> 0)
+    :param values: float array
+    :return: float array
+    """
+    known = ~np.isnan(values)
+    if not known.any():
+        return np.zeros(len(values))
+
+    low, high = values[known].min(), values[known].max()
+    scaled = (values - low) / (high - low) if high > low else np.zeros(len(values))
+
+    return np.where(known, scaled, 0.5)
+
+
+def flight_minutes(depart, arrive):
+    """
+    flight durations from the departure and arrival minutes of day (local times - only comparable on the same route)
+    :param depart: minutes of day array
+    :param arrive: minutes of day array
+    :return: float array (nan if unknown)
+    """
+    durations = ((arrive - depart) % MINUTES_PER_DAY).astype(float)
+    durations[(depart == UNKNOWN) | (arrive == UNKNOWN)] = np.nan
+
+    return durations
+
+
+def hours_outside(minutes, preferred_hours):
+    """
+    how far (hours) departures are from the preferred hours of the day (0 inside)
+    :param minutes: minutes of day array
+    :param preferred_hours: [first hour, last hour]
+    :return: float array (nan if unknown)
+    """
+    start, end = preferred_hours[0] * 60, preferred_hours[1] * 60
+    # to the nearest edge of the preferred hours (around midnight)
+    distance = np.minimum((start - minutes) % MINUTES_PER_DAY, (minutes - end) % MINUTES_PER_DAY) / 60
+    distance[(minutes >= start) & (minutes <= end)] = 0
+
+    return np.where(minutes == UNKNOWN, np.nan, distance)
+
+
+def scores(deals, ranking_cfg, rows=None):
+    """
+    weighted score of deals (lower is better) - price, flights duration and departure time of day,
+    each min-max scaled over the scored deals
+    :param deals: DealSet
+    :param ranking_cfg: cfg 'ranking'
+    :param rows: row indices to score, all the deals if not given
+    :return: float array (one per row)
+    """
+    weights = ranking_cfg['weights']
+    rows = slice(None) if rows is None else rows
+    out_depart, in_depart = deals.column('out_depart')[rows], deals.column('in_depart')[rows]
+
+    duration = flight_minutes(out_depart, deals.column('out_arrive')[rows]) + \
+        flight_minutes(in_depart, deals.column('in_arrive')[rows])
+    time_of_day = np.fmax(hours_outside(out_depart, ranking_cfg['preferred_hours']),
+                          hours_outside(in_depart, ranking_cfg['preferred_hours']))
+
+    return weights['price'] * _normalized(deals.column('price')[rows].astype(float)) + \
+        weights['duration'] * _normalized(duration) + \
+        weights['time_of_day'] * _normalized(time_of_day)
+
+
+def group_codes(labels):
+    """
+    integer code of every label (in order of first appearance) - faster than sorting the text
+    :param labels: list of labels (e.g. cities)
+    :return: int array
+    """
+    codes = {}
+    return np.fromiter((codes.setdefault(label, len(codes)) for label in labels), dtype=np.intp, count=len(labels))
+
+
+def top_k_per_group(groups, scores_array, k):
+    """
+    rows of the k best scores of every group
+    :param groups: int group code of every row (see group_codes)
+    :param scores_array: float array (lower is better)
+    :param k:
+    :return: row indices, best first
+    """
+    if not len(scores_array):
+        return np.empty(0, dtype=np.intp)
+
+    # sort by group then score, and number the rows inside each group
+    order = np.lexsort((scores_array, groups))
+    sorted_groups = groups[order]
+    group_starts = np.flatnonzero(np.r_[True, sorted_groups[1:] != sorted_groups[:-1]])
+    group_sizes = np.diff(np.r_[group_starts, len(order)])
+    rank_in_group = np.arange(len(order)) - np.repeat(group_starts, group_sizes)
+
+    top = order[rank_in_group < k]
+    return top[np.argsort(scores_array[top], kind='stable')]
+
+
+def rank_deals(deals, ranking_cfg):
+    """
+    the ranking stage - filter the deals and keep the top k (by score) of every destination
+    :param deals: DealSet
+    :param ranking_cfg: cfg 'ranking'
+    :return: DealSet, best score first
+    """
+    rows = np.flatnonzero(filter_mask(deals, ranking_cfg))
+    # scaled over the matching deals only
+    candidates_scores = scores(deals, ranking_cfg, rows)
+    top = top_k_per_group(group_codes(deals.column('city'))[rows], candidates_scores, ranking_cfg['top_k'])
+
+    # the only copy of the (text) rows
+    return deals.take(rows[top])
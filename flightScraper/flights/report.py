@@ -0,0 +1,179 @@
+from html import escape
+import csv
+import io
+
+import numpy as np
+
+from flights.ranking import group_codes
+from flights.deals import RECORD_FIELDS
+
+# parquet attachments are optional (pyarrow)
+try:
+    import pyarrow
+    import pyarrow.parquet as pq
+except ImportError:
+    pyarrow = None
+
+HEADERS = ["City", "Dates", "Price", "Is Final Price ?", "Company", "Times: outbound", "Times: inbound",
+           "Link to Deal"]
+
+
+class DealReport:
+    def __init__(self, deals, title="Top Flights", headers=HEADERS, page_size=50, group_by_destination=True,
+                 sort=True):
+        """
+        report of a deal set - paginated text, html (email) and csv/parquet attachments, rendered straight from
+        the columns. the rows are ordered once (numeric keys), rendering is linear in the number of rows
+        :param deals: DealSet
+        :param title:
+        :param headers: display columns headers (see DealSet.display_columns)
+        :param page_size: rows per text page
+        :param group_by_destination: rows grouped by city (cheapest destination first)
+        :param sort: sort by price (False keeps the deals order, e.g. ranked deals)
+        """
+        self.deals = deals
+        self.title = title
+        self.headers = headers
+        self.page_size = page_size
+        self.group_by_destination = group_by_destination
+        self.order = self._order(sort)
+        self._display_rows = None
+
+    def _order(self, sort):
+        """
+        rows order - by price (or as given), grouped by destination if enabled
+        :param sort:
+        :return: row indices
+        """
+        prices = self.deals.column('price')
+        order = np.argsort(prices, kind='stable') if sort else np.arange(len(prices))
+        if not self.group_by_destination or not len(order):
+            return order
+
+        codes = group_codes(self.deals.column('city'))[order]
+        group_best = np.full(codes.max() + 1, np.iinfo(prices.dtype).max, dtype=prices.dtype)
+        np.minimum.at(group_best, codes, prices[order])
+
+        # cheapest group first, rows keep their order inside the group
+        return order[np.lexsort((np.arange(len(order)), codes, group_best[codes]))]
+
+    def _rows(self):
+        """
+        display rows in report order
+        :return: list of rows (lists of strings)
+        """
+        if self._display_rows is None:
+            columns = [[str(value) for value in column] for column in self.deals.display_columns()]
+            self._display_rows = [[column[i] for column in columns] for i in self.order.tolist()]
+
+        return self._display_rows
+
+    def pages(self):
+        """
+        fixed width text pages (column widths computed once over all the rows, so pages line up)
+        :return: list of page strings
+        """
+        rows = self._rows()
+        if not rows:
+            return [f"{self.title} (0)"]
+
+        # the city is the group header when grouping
+        first_column = 1 if self.group_by_destination else 0
+        headers = self.headers[first_column:]
+        widths = [max(len(headers[i]), *(len(row[i + first_column]) for row in rows)) for i in range(len(headers))]
+        separator = "+" + "+".join("-" * (width + 2) for width in widths) + "+"
+
+        def line(values):
+            return "| " + " | ".join(value.ljust(width) for value, width in zip(values, widths)) + " |"
+
+        page_count = (len(rows) + self.page_size - 1) // self.page_size
+        pages = []
+        for page in range(page_count):
+            lines = [f"{self.title} ({len(rows)}) - page {page + 1}/{page_count}", separator, line(headers),
+                     separator]
+            city = None
+            for row in rows[page * self.page_size:(page + 1) * self.page_size]:
+                if self.group_by_destination and row[0] != city:
+                    if city is not None:
+                        lines.append(separator)
+                    city = row[0]
+                    lines.append(f"| {city}".ljust(len(separator) - 1) + "|")
+                    lines.append(separator)
+                lines.append(line(row[first_column:]))
+            lines.append(separator)
+            pages.append("\n".join(lines))
+
+        return pages
+
+    def text(self):
+        return "\n\n".join(self.pages())
+
+    def html(self):
+        """
+        html table (email body) - grouped rows under a destination header row
+        :return: html string
+        """
+        rows = self._rows()
+        first_column = 1 if self.group_by_destination else 0
+        headers = self.headers[first_column:]
+
+        parts = [f"<h2>{escape(self.title)} ({len(rows)})</h2>",
+                 '<table border="1" cellpadding="4" cellspacing="0" style="border-collapse:collapse">',
+                 "<tr>" + "".join(f"<th>{escape(header)}</th>" for header in headers) + "</tr>"]
+        city = None
+        for row in rows:
+            if self.group_by_destination and row[0] != city:
+                city = row[0]
+                parts.append(f'<tr><th colspan="{len(headers)}" align="left">{escape(city)}</th></tr>')
+            cells = [escape(value) for value in row[first_column:-1]]
+            cells.append(f'<a href="{escape(row[-1])}">link</a>')
+            parts.append("<tr>" + "".join(f"<td>{cell}</td>" for cell in cells) + "</tr>")
+        parts.append("</table>")
+
+        return "\n".join(parts)
+
+    def _records(self):
+        return self.deals.take(self.order).to_records()
+
+    def csv_bytes(self):
+        """
+        csv attachment (deal records in report order)
+        :return: bytes
+        """
+        output = io.StringIO()
+        writer = csv.DictWriter(output, fieldnames=RECORD_FIELDS)
+        writer.writeheader()
+        writer.writerows(self._records())
+
+        return output.getvalue().encode('utf-8')
+
+    def parquet_bytes(self):
+        """
+        parquet attachment (deal records in report order)
+        :return: bytes
+        """
+        if pyarrow is None:
+            raise ImportError("parquet attachments need pyarrow (pip install pyarrow)")
+
+        output = io.BytesIO()
+        pq.write_table(pyarrow.Table.from_pylist(self._records()), output)
+
+        return output.getvalue()
+
+    def attachments(self, formats, name='deals'):
+        """
+        report attachments
+        :param formats: list of 'csv' / 'parquet'
+        :param name: file name (without extension)
+        :return: list of (filename, bytes, mime type)
+        """
+        attachments = []
+        for attachment_format in formats:
+            if attachment_format == 'csv':
+                attachments.append((f"{name}.csv", self.csv_bytes(), 'text/csv'))
+            elif attachment_format == 'parquet':
+                attachments.append((f"{name}.parquet", self.parquet_bytes(), 'application/octet-stream'))
+            else:
+                raise ValueError(f"unknown attachment format: {attachment_format}")
+
+        return attachments
@@ -0,0 +1,128 @@
+from collections import namedtuple
+from functools import lru_cache
+import json
+
+# selectors are compiled (when lxml is available) for the one pass parser
+try:
+    from lxml import etree
+except ImportError:
+    etree = None
+
+# xPaths keys used by the scraper (browser waits/clicks and page parsing)
+XPATH_KEYS = ['flight_xpath', 'specific_flight_xpath', 'check_flights_xpath', 'luggage_carry_xpath',
+              'luggage_checked_xpath', 'curr_cheap_dest_xpath', 'nonstop_xpath', 'flight_box_xpath', 'from_xpath',
+              'to_xpath', 'from_loc_drop_down_xpath', 'to_loc_drop_down_xpath', 'from_click_drop_xpath',
+              'to_click_drop_xpath', 'consent_xpath']
+# class keys (elements inside a result / flight box)
+CLASS_KEYS = ['price_class', 'specific_price_class', 'city_class', 'specific_city_class', 'date_class',
+              'specific_date_class', 'f_price_class', 'f_times_class', 'f_carry_bag_class']
+
+# compiled selectors of a parsing stage (lxml XPath objects, None without lxml) and the raw class names
+# (used by the per-element fallback parser)
+ExploreSelectors = namedtuple('ExploreSelectors', ['results', 'price', 'city', 'dates', 'links',
+                                                   'price_class', 'city_class', 'date_class'])
+BoxSelectors = namedtuple('BoxSelectors', ['boxes', 'price', 'times', 'carry_bag', 'link',
+                                           'price_class', 'times_class', 'carry_bag_class'])
+
+
+class SelectorError(ValueError):
+    pass
+
+
+def class_xpath(tag, class_name):
+    """
+    relative xpath of elements that have all the classes in class_name (what a '.cls1.cls2' css selector means)
+    :param tag:
+    :param class_name: space separated classes
+    :return: xpath string
+    """
+    conditions = " and ".join(f"contains(concat(' ', normalize-space(@class), ' '), ' {cls} ')"
+                              for cls in class_name.split())
+    return f".//{tag}[{conditions}]"
+
+
+def _compile(xpath, key, errors):
+    """
+    compiled xpath (None without lxml), invalid xpaths are added to errors
+    :param xpath:
+    :param key: label in the error
+    :param errors: list of errors
+    :return: etree.XPath
+    """
+    if etree is None:
+        return None
+
+    try:
+        return etree.XPath(xpath)
+    except etree.XPathSyntaxError as e:
+        errors.append(f"{key}: invalid xpath {xpath!r} ({e})")
+        return None
+
+
+class SelectorRegistry:
+    def __init__(self, xpaths_cfg):
+        """
+        the page selectors of cfg 'xPaths' - validated once (a bad config fails before scraping starts) and
+        precompiled for the parsers
+        :param xpaths_cfg: cfg 'xPaths'
+        """
+        errors = [f"{key}: missing" for key in XPATH_KEYS + CLASS_KEYS if key not in xpaths_cfg]
+        errors += [f"{key}: empty" for key in XPATH_KEYS + CLASS_KEYS
+                   if key in xpaths_cfg and (not isinstance(xpaths_cfg[key], str) or not xpaths_cfg[key].strip())]
+        if errors:
+            raise SelectorError("invalid cfg 'xPaths' - " + "; ".join(errors))
+
+        self._xpaths = dict(xpaths_cfg)
+        for key in XPATH_KEYS:
+            _compile(xpaths_cfg[key], key, errors)
+
+        self.explore = self._explore_selectors('flight_xpath', 'price_class', 'city_class', 'date_class', errors)
+        self.specific_explore = self._explore_selectors('specific_flight_xpath', 'specific_price_class',
+                                                        'specific_city_class', 'specific_date_class', errors)
+        self.flight_box = BoxSelectors(boxes=_compile(xpaths_cfg['flight_box_xpath'], 'flight_box_xpath', []),
+                                       price=_compile(class_xpath('div', xpaths_cfg['f_price_class']),
+                                                      'f_price_class', errors),
+                                       times=_compile(class_xpath('div', xpaths_cfg['f_times_class']),
+                                                      'f_times_class', errors),
+                                       carry_bag=_compile(class_xpath('div', xpaths_cfg['f_carry_bag_class']),
+                                                          'f_carry_bag_class', errors),
+                                       link=_compile('.//a[@href]', 'link', errors),
+                                       price_class=xpaths_cfg['f_price_class'],
+                                       times_class=xpaths_cfg['f_times_class'],
+                                       carry_bag_class=xpaths_cfg['f_carry_bag_class'])
+        if errors:
+            raise SelectorError("invalid cfg 'xPaths' - " + "; ".join(errors))
+
+    def _explore_selectors(self, results_key, price_key, city_key, date_key, errors):
+        return ExploreSelectors(results=_compile(self._xpaths[results_key], results_key, []),
+                                price=_compile(class_xpath('div', self._xpaths[price_key]), price_key, errors),
+                                city=_compile(class_xpath('div', self._xpaths[city_key]), city_key, errors),
+                                dates=_compile(class_xpath('div', self._xpaths[date_key]), date_key, errors),
+                                links=_compile('.//@href | @href', 'links', errors),
+                                price_class=self._xpaths[price_key], city_class=self._xpaths[city_key],
+                                date_class=self._xpaths[date_key])
+
+    def xpath(self, key):
+        """
+        raw xpath of a key (for the browser waits / clicks)
+        :param key: xPaths key
+        :return: xpath string
+        """
+        try:
+            return self._xpaths[key]
+        except KeyError:
+            raise SelectorError(f"unknown xPaths key: {key}") from None
+
+    @classmethod
+    def from_cfg(cls, xpaths_cfg):
+        """
+        shared registry of a cfg 'xPaths' (validated and compiled once per process, e.g. for all the pool workers)
+        :param xpaths_cfg: cfg 'xPaths'
+        :return: SelectorRegistry
+        """
+        return _registry(json.dumps(xpaths_cfg, sort_keys=True))
+
+
+@lru_cache(maxsize=None)
+def _registry(xpaths_json):
+    return SelectorRegistry(json.loads(xpaths_json))
@@ -0,0 +1,269 @@
+from contextlib import contextmanager
+from threading import Lock
+import subprocess
+import logging
+import heapq
+import queue
+import json
+import time
+import os
+
+from selenium.common import TimeoutException, WebDriverException
+
+from flights.lean_profile import lean_arguments
+
+# put in the idle queue when a slot is freed (or the pool closed), so a waiting borrower wakes up
+_FREED_SLOT = object()
+
+
+class SessionPool:
+    def __init__(self, factory, size, logger=None):
+        """
+        pool of warmed browser sessions (Flights instances). sessions are created lazily (up to size),
+        warmed once (site loaded, consent dialog accepted) and reused by every borrow. every session owns a slot
+        index (0 to size - 1) until it is discarded - a slot is never shared by two live sessions
+        :param factory: callable(slot index) -> new Flights instance
+        :param size: max number of sessions
+        :param logger:
+        """
+        if size < 1:
+            raise ValueError(f"a session pool needs at least one session (size {size})")
+
+        self.factory = factory
+        self.size = size
+        self.logger = logger if logger else logging.getLogger(__name__)
+        self._idle = queue.Queue()
+        # slot index -> live session, and the free slots (lowest first)
+        self._sessions = {}
+        self._free_slots = list(range(size))
+        self._closed = False
+        self._lock = Lock()
+
+    @contextmanager
+    def borrow(self, timeout=None):
+        """
+        borrow a warmed session (blocks until one is available if the pool is full)
+        :param timeout: seconds to wait for an idle session
+        :return: Flights instance with cleared results
+        """
+        session = self._acquire(timeout)
+        broken = False
+        try:
+            session.reset_results()
+            yield session
+        except WebDriverException:
+            # the browser may be broken - don't give it to the next borrower
+            broken = True
+            raise
+        finally:
+            if broken:
+                self._discard(session)
+            elif not self._closed:
+                self._idle.put(session)
+
+    def _acquire(self, timeout):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            if self._closed:
+                # pass the wake up on to the next waiting borrower
+                self._idle.put(_FREED_SLOT)
+                raise RuntimeError("the session pool is closed")
+            try:
+                session = self._idle.get_nowait()
+            except queue.Empty:
+                session = self._create_or_wait(deadline)
+
+            # a freed slot (or the pool was closed) - try again
+            if session is not _FREED_SLOT:
+                return session
+
+    def _create_or_wait(self, deadline):
+        """
+        create a session if the pool isn't full, else wait for an idle session (or a freed slot)
+        :param deadline: time.monotonic() to give up waiting at (queue.Empty), None to wait forever
+        :return: Flights instance or _FREED_SLOT
+        """
+        # reserve a slot before creating the session (creation is slow and done outside the lock)
+        with self._lock:
+            index = heapq.heappop(self._free_slots) if self._free_slots else None
+
+        if index is None:
+            return self._idle.get(timeout=None if deadline is None else max(0, deadline - time.monotonic()))
+
+        session = None
+        try:
+            session = self.factory(index)
+            warm_session(session, self.logger)
+        except Exception:
+            if session is not None:
+                close_session(session, self.logger)
+            self._free_slot(index)
+            raise
+
+        with self._lock:
+            self._sessions[index] = session
+
+        return session
+
+    def _free_slot(self, index):
+        with self._lock:
+            heapq.heappush(self._free_slots, index)
+        # wakes a borrower waiting for an idle session, it creates a new one instead
+        self._idle.put(_FREED_SLOT)
+
+    def _discard(self, session):
+        with self._lock:
+            index = next((index for index, owner in self._sessions.items() if owner is session), None)
+            if index is not None:
+                del self._sessions[index]
+        if index is not None:
+            self._free_slot(index)
+        close_session(session, self.logger)
+
+    def close(self):
+        """
+        close all the sessions (attached sessions leave their browser running) - the pool can't be borrowed from after
+        :return:
+        """
+        with self._lock:
+            self._closed = True
+            sessions = list(self._sessions.values())
+            self._sessions = {}
+
+        # drop the closed sessions, and wake the borrowers still waiting (they fail on the closed pool)
+        while True:
+            try:
+                self._idle.get_nowait()
+            except queue.Empty:
+                break
+        self._idle.put(_FREED_SLOT)
+
+        for session in sessions:
+            close_session(session, self.logger)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def close_session(session, logger):
+    """
+    close a session like leaving its with block (its explore fetcher and own mailer are closed, the browser quit)
+    :param session: Flights instance
+    :param logger:
+    :return:
+    """
+    try:
+        session.__exit__(None, None, None)
+    except Exception as e:
+        logger.error(f"issue with closing session: {e}")
+
+
+def warm_session(session, logger):
+    """
+    load the site and accept the consent dialog (cookies are kept in the session)
+    :param session: Flights instance
+    :param logger:
+    :return:
+    """
+    start = time.perf_counter()
+    session.get(session.site)
+    session.accept_consent()
+    logger.info(f"session warmed in {time.perf_counter() - start:.2f}s")
+
+
+def debugger_addresses(pool_cfg):
+    """
+    addresses of the daemon's browsers (one per debugging port)
+    :param pool_cfg: cfg 'session_pool'
+    :return: list of host:port
+    """
+    return [f"{pool_cfg['host']}:{pool_cfg['base_port'] + i}" for i in range(pool_cfg['size'])]
+
+
+def attach_address(pool_cfg, index):
+    """
+    daemon browser of a session pool slot - every concurrent session drives its own browser
+    :param pool_cfg: cfg 'session_pool'
+    :param index: slot index
+    :return: host:port
+    """
+    addresses = debugger_addresses(pool_cfg)
+    if index >= len(addresses):
+        raise ValueError(f"no session pool daemon browser for session {index} (cfg 'session_pool' -> 'size' "
+                         f"{pool_cfg['size']})")
+
+    return addresses[index]
+
+
+def launch_browser(pool_cfg, index, headless=True, extra_args=None):
+    """
+    launch a long-lived chrome with remote debugging and a persistent profile (cookies, consent, cache)
+    :param pool_cfg: cfg 'session_pool'
+    :param index: browser index (port and profile)
+    :param headless:
+    :param extra_args: more chrome switches (e.g. lean mode)
+    :return: chrome process
+    """
+    profile_dir = os.path.abspath(os.path.join(pool_cfg['profile_dir'], f"profile-{index}"))
+    os.makedirs(profile_dir, exist_ok=True)
+
+    args = [pool_cfg['chrome_binary'], f"--remote-debugging-port={pool_cfg['base_port'] + index}",
+            f"--user-data-dir={profile_dir}", "--no-first-run", "--no-default-browser-check"]
+    if headless:
+        args.append("--headless=new")
+    if extra_args:
+        args.extend(extra_args)
+
+    return subprocess.Popen(args, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def run_daemon(cfg_file='flights/cfg.json', check_interval=30):
+    """
+    daemon mode - keep warmed browsers running so searches (Flights with debugger_address) attach in milliseconds
+    instead of launching chrome. dead browsers are relaunched and re-warmed
+    :param cfg_file:
+    :param check_interval: seconds between health checks
+    :return:
+    """
+    from flights.flights import Flights
+
+    log = Flights.init_logger('session_pool')
+    with open(cfg_file) as config_file:
+        cfg_data = json.load(config_file)
+    pool_cfg = cfg_data['session_pool']
+    lean_args = lean_arguments(cfg_data['lean']) if cfg_data['lean']['enabled'] else None
+
+    def warm(index):
+        # attaching only - the browser stays up after the driver quits
+        session = Flights(sender=None, receiver=None, s_password=None, subject=None, body=None, driver_path='',
+                          cfg_file=cfg_file, logger=log, debugger_address=debugger_addresses(pool_cfg)[index])
+        warm_session(session, log)
+        session.quit()
+
+    processes = {}
+    try:
+        while True:
+            for index in range(pool_cfg['size']):
+                process = processes.get(index)
+                if process is None or process.poll() is not None:
+                    log.info(f"launching browser {index}")
+                    processes[index] = launch_browser(pool_cfg, index, headless=cfg_data['headless'],
+                                                      extra_args=lean_args)
+                    time.sleep(pool_cfg['launch_delay'])
+                    try:
+                        warm(index)
+                    except (TimeoutException, WebDriverException) as e:
+                        log.error(f"issue with warming browser {index}: {e}")
+            time.sleep(check_interval)
+    except KeyboardInterrupt:
+        log.info("stopping session pool daemon")
+    finally:
+        for process in processes.values():
+            process.terminate()
+
+
+if __name__ == "__main__":
+    run_daemon()
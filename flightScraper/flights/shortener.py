@@ -0,0 +1,88 @@
+from threading import Lock
+import asyncio
+import logging
+import json
+import os
+
+from flights import metrics
+
+
+def tinyurl_backend():
+    """
+    default shortening backend (TinyURL through pyshorteners), one Shortener for all the links
+    :return: callable(url) -> short url
+    """
+    import pyshorteners
+
+    shortener = pyshorteners.Shortener()
+    return shortener.tinyurl.short
+
+
+class LinkShortener:
+    def __init__(self, cache_file=None, backend=None, concurrency=8, logger=None):
+        """
+        batched, concurrent link shortening with a persistent on-disk cache (keyed by the full url)
+        :param cache_file: json file of {url: short url}, no persistence if not given
+        :param backend: callable(url) -> short url (e.g. a local stub), TinyURL if not given
+        :param concurrency: max concurrent shortening requests
+        :param logger:
+        """
+        self.cache_file = cache_file
+        self.backend = backend
+        self.concurrency = concurrency
+        self.logger = logger if logger else logging.getLogger(__name__)
+        self._lock = Lock()
+        self.cache = self._load_cache()
+
+    def _load_cache(self):
+        if not self.cache_file or not os.path.exists(self.cache_file):
+            return {}
+        try:
+            with open(self.cache_file) as cache:
+                return json.load(cache)
+        except (OSError, ValueError) as e:
+            self.logger.error(f"issue with loading shortened links cache: {e}")
+            return {}
+
+    def _save_cache(self):
+        if not self.cache_file:
+            return
+
+        # write to a temp file first so an interrupted run doesn't corrupt the cache
+        # (per process tmp file, replaced under the lock - the shortener is shared by the pool sessions)
+        tmp_file = f"{self.cache_file}.{os.getpid()}.tmp"
+        with self._lock:
+            with open(tmp_file, 'w') as cache:
+                json.dump(self.cache, cache)
+            os.replace(tmp_file, self.cache_file)
+
+    def shorten_all(self, links):
+        """
+        shorten a batch of links (cached links are not sent to the shortener)
+        :param links: original urls
+        :return: shortened urls (same order), the original url when shortening failed
+        """
+        missing = list(dict.fromkeys(link for link in links if link not in self.cache))
+        if missing:
+            if self.backend is None:
+                self.backend = tinyurl_backend()
+            asyncio.run(self._shorten_missing(missing))
+            self._save_cache()
+
+        return [self.cache.get(link, link) for link in links]
+
+    async def _shorten_missing(self, links):
+        semaphore = asyncio.Semaphore(self.concurrency)
+        await asyncio.gather(*[self._shorten(link, semaphore) for link in links])
+
+    async def _shorten(self, link, semaphore):
+        async with semaphore:
+            try:
+                short_link = await asyncio.to_thread(self.backend, link)
+            except Exception as e:
+                self.logger.exception(f"\nunsuccessful link shortening: {e}")
+                metrics.shortener_failures.inc()
+                return
+
+        with self._lock:
+            self.cache[link] = short_link
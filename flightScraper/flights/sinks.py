@@ -0,0 +1,188 @@
+from abc import ABC, abstractmethod
+from threading import Lock
+import json
+import csv
+import os
+
+from prettytable import PrettyTable
+
+from flights.deals import RECORD_FIELDS
+
+# parquet output is optional (pyarrow)
+try:
+    import pyarrow
+    import pyarrow.parquet as pq
+except ImportError:
+    pyarrow = None
+
+
+class DealSink(ABC):
+    def __init__(self):
+        """
+        streaming output - every deal is written (and flushed) as soon as it is parsed, so partial results survive
+        a crash and consumers can start before the scrape finishes. thread safe (shared by pool workers)
+        """
+        self._lock = Lock()
+
+    def write(self, deal):
+        """
+        emit a deal
+        :param deal: Deal
+        :return:
+        """
+        with self._lock:
+            self._write(deal.to_record())
+
+    @abstractmethod
+    def _write(self, record):
+        """
+        write a deal record (called under the sink lock)
+        :param record: Deal.to_record()
+        :return:
+        """
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class JsonLinesSink(DealSink):
+    def __init__(self, path):
+        """
+        deals appended to a json lines file
+        :param path:
+        """
+        super().__init__()
+        self._file = open(path, 'a', encoding='utf-8')
+
+    def _write(self, record):
+        self._file.write(json.dumps(record) + "\n")
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+class CsvSink(DealSink):
+    def __init__(self, path):
+        """
+        deals appended to a csv file (header written once)
+        :param path:
+        """
+        super().__init__()
+        is_new = not os.path.exists(path) or os.path.getsize(path) == 0
+        self._file = open(path, 'a', newline='', encoding='utf-8')
+        self._writer = csv.DictWriter(self._file, fieldnames=RECORD_FIELDS)
+        if is_new:
+            self._writer.writeheader()
+
+    def _write(self, record):
+        self._writer.writerow(record)
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+class ParquetSink(DealSink):
+    def __init__(self, path, batch_size=50):
+        """
+        deals written to a dir of parquet part files (one per batch_size deals - a parquet file is only readable
+        once it is closed, so every part is complete on its own)
+        :param path: output dir
+        :param batch_size: deals per part file
+        """
+        if pyarrow is None:
+            raise ImportError("parquet output needs pyarrow (pip install pyarrow)")
+
+        super().__init__()
+        self.path = path
+        self.batch_size = batch_size
+        os.makedirs(path, exist_ok=True)
+        self._part = len([name for name in os.listdir(path) if name.endswith('.parquet')])
+        self._records = []
+
+    def _write(self, record):
+        self._records.append(record)
+        if len(self._records) >= self.batch_size:
+            self._flush()
+
+    def _flush(self):
+        if not self._records:
+            return
+
+        table = pyarrow.Table.from_pylist(self._records)
+        pq.write_table(table, os.path.join(self.path, f"part-{self._part:05d}.parquet"))
+        self._part += 1
+        self._records = []
+
+    def close(self):
+        with self._lock:
+            self._flush()
+
+
+class LiveTableSink(DealSink):
+    def __init__(self, max_rows=15):
+        """
+        live terminal table of the cheapest deals found so far (redrawn on every deal)
+        :param max_rows: rows shown
+        """
+        super().__init__()
+        self.max_rows = max_rows
+        self._top = []
+
+    def _write(self, record):
+        self._top.append(record)
+        self._top.sort(key=lambda top_record: top_record['price'])
+        del self._top[self.max_rows:]
+
+        table = PrettyTable(["City", "Dates", "Price", "Company", "Link"])
+        for top_record in self._top:
+            table.add_row([top_record['city'], top_record['dates'], f"{top_record['currency']}{top_record['price']}",
+                           top_record['company'], top_record['link']])
+
+        # clear the terminal and redraw
+        print("\033[2J\033[H" + table.get_string(), flush=True)
+
+
+class MultiSink(DealSink):
+    def __init__(self, sinks):
+        """
+        write every deal to several sinks
+        :param sinks: list of DealSink
+        """
+        super().__init__()
+        self.sinks = sinks
+
+    def _write(self, record):
+        # the sinks are owned by this sink - its lock serializes their writes
+        for sink in self.sinks:
+            sink._write(record)
+
+    def close(self):
+        for sink in self.sinks:
+            sink.close()
+
+
+def open_sinks(sinks_cfg):
+    """
+    the sinks enabled in cfg 'sinks'
+    :param sinks_cfg: cfg 'sinks'
+    :return: MultiSink, None if no sink is enabled
+    """
+    sinks = []
+    if sinks_cfg['jsonl']:
+        sinks.append(JsonLinesSink(sinks_cfg['jsonl']))
+    if sinks_cfg['csv']:
+        sinks.append(CsvSink(sinks_cfg['csv']))
+    if sinks_cfg['parquet']:
+        sinks.append(ParquetSink(sinks_cfg['parquet'], batch_size=sinks_cfg['parquet_batch_size']))
+    if sinks_cfg['live_table']:
+        sinks.append(LiveTableSink(sinks_cfg['live_rows']))
+
+    return MultiSink(sinks) if sinks else None
@@ -0,0 +1,156 @@
+from collections import namedtuple
+from threading import Lock
+import sqlite3
+import time
+
+from flights.deals import Deal, RECORD_FIELDS
+
+RouteKey = namedtuple('RouteKey', ['origin', 'destination', 'dates', 'carry', 'checked'])
+
+# bumped when the tables change (the store is a cache - old tables are dropped)
+SCHEMA_VERSION = 3
+
+# route key columns in the deals table ('dates' is also a deal column)
+ROUTE_WHERE = "origin = ? AND destination = ? AND route_dates = ? AND carry = ? AND checked = ?"
+
+
+class ResultStore:
+    def __init__(self, path, ttl_hours):
+        """
+        local (sqlite) store of top deals per route (origin, destination, dates, bags) with scrape timestamps,
+        so routes scraped less than ttl ago are not scraped again
+        :param path: sqlite file
+        :param ttl_hours: how long a route's deals are considered fresh
+        """
+        self.path = path
+        self.ttl = ttl_hours * 3600
+        self._lock = Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._create_tables()
+
+    def _create_tables(self):
+        with self._lock, self._conn:
+            if self._conn.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+                self._conn.execute("DROP TABLE IF EXISTS routes")
+                self._conn.execute("DROP TABLE IF EXISTS deals")
+                self._conn.execute("DROP TABLE IF EXISTS snapshots")
+                self._conn.execute("DROP TABLE IF EXISTS schedule")
+                self._conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS routes (
+                    origin TEXT, destination TEXT, dates TEXT, carry INTEGER, checked INTEGER,
+                    scraped_at REAL,
+                    PRIMARY KEY (origin, destination, dates, carry, checked))
+            """)
+            self._conn.execute(f"""
+                CREATE TABLE IF NOT EXISTS deals (
+                    origin TEXT, destination TEXT, route_dates TEXT, carry INTEGER, checked INTEGER,
+                    {', '.join(RECORD_FIELDS)})
+            """)
+            self._conn.execute("""
+                CREATE INDEX IF NOT EXISTS deals_route ON deals (origin, destination, route_dates, carry, checked)
+            """)
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS snapshots (
+                    route TEXT, city TEXT, price INTEGER, currency TEXT, link TEXT, checked_at REAL,
+                    PRIMARY KEY (route, city))
+            """)
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS schedule (
+                    route TEXT PRIMARY KEY, interval REAL, next_check REAL)
+            """)
+
+    def scraped_at(self, key):
+        """
+        last scrape time of a route
+        :param key: RouteKey
+        :return: timestamp, None if never scraped
+        """
+        with self._lock:
+            row = self._conn.execute("""
+                SELECT scraped_at FROM routes
+                WHERE origin = ? AND destination = ? AND dates = ? AND carry = ? AND checked = ?
+            """, key).fetchone()
+
+        return row[0] if row else None
+
+    def is_fresh(self, key):
+        """
+        checking if a route was scraped less than ttl ago
+        :param key: RouteKey
+        :return:
+        """
+        scraped_at = self.scraped_at(key)
+        return scraped_at is not None and time.time() - scraped_at < self.ttl
+
+    def load_deals(self, key):
+        """
+        stored deals of a route
+        :param key: RouteKey
+        :return: list of Deal
+        """
+        with self._lock:
+            rows = self._conn.execute(f"""
+                SELECT {', '.join(RECORD_FIELDS)} FROM deals WHERE {ROUTE_WHERE} ORDER BY rowid
+            """, key).fetchall()
+
+        return [Deal.from_record(dict(zip(RECORD_FIELDS, row))) for row in rows]
+
+    def save_deals(self, key, deals):
+        """
+        replace the stored deals of a route (and mark it as scraped now)
+        :param key: RouteKey
+        :param deals: iterable of Deal
+        :return:
+        """
+        with self._lock, self._conn:
+            self._conn.execute(f"DELETE FROM deals WHERE {ROUTE_WHERE}", key)
+            self._conn.executemany(f"""
+                INSERT INTO deals VALUES ({', '.join('?' * (len(RouteKey._fields) + len(RECORD_FIELDS)))})
+            """, [(*key, *deal.to_record().values()) for deal in deals])
+            self._conn.execute("""
+                INSERT OR REPLACE INTO routes VALUES (?, ?, ?, ?, ?, ?)
+            """, (*key, time.time()))
+
+    def load_snapshot(self, route):
+        """
+        cheapest price per destination of a monitored route at its last check
+        :param route: monitored route id
+        :return: {city: price}
+        """
+        with self._lock:
+            rows = self._conn.execute("SELECT city, price FROM snapshots WHERE route = ?", (route,)).fetchall()
+
+        return dict(rows)
+
+    def save_snapshot(self, route, deals):
+        """
+        replace the snapshot of a monitored route
+        :param route: monitored route id
+        :param deals: cheapest Deal per destination
+        :return:
+        """
+        checked_at = time.time()
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM snapshots WHERE route = ?", (route,))
+            self._conn.executemany("INSERT INTO snapshots VALUES (?, ?, ?, ?, ?, ?)",
+                                   [(route, deal.city, deal.price, deal.currency, deal.link, checked_at)
+                                    for deal in deals])
+
+    def load_schedule(self, route):
+        """
+        polling interval and next check time of a monitored route
+        :param route: monitored route id
+        :return: (interval seconds, next check timestamp), None if never checked
+        """
+        with self._lock:
+            return self._conn.execute("SELECT interval, next_check FROM schedule WHERE route = ?",
+                                      (route,)).fetchone()
+
+    def save_schedule(self, route, interval, next_check):
+        with self._lock, self._conn:
+            self._conn.execute("INSERT OR REPLACE INTO schedule VALUES (?, ?, ?)", (route, interval, next_check))
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,106 @@
+from threading import Lock
+import logging
+import json
+
+from flights.batch import job_id
+from flights.ranking import filter_mask
+from flights.report import DealReport
+
+# subscription fields that define the search (the rest are per subscriber filters)
+SEARCH_FIELDS = ['origin', 'year', 'month', 'duration', 'depart', 'return', 'carry', 'checked']
+
+
+def load_subscriptions(subscriptions_file):
+    """
+    load the users' subscriptions - a json list, each with an email, a search (like a batch job) and filters, e.g.
+    {"email": "a@b.com", "origin": "TLV", "month": 9, "duration": "5,10", "carry": 1,
+     "destinations": ["Athens", "Rome"], "max_price": 250, "carriers": ["Aegean"], "final_price_only": true}
+    :param subscriptions_file:
+    :return: list of subscriptions
+    """
+    with open(subscriptions_file) as subscriptions:
+        subscriptions_data = json.load(subscriptions)
+
+    for subscription in subscriptions_data:
+        if 'email' not in subscription or 'origin' not in subscription:
+            raise ValueError(f"subscription needs an email and an origin: {subscription}")
+        if 'month' not in subscription and not ('depart' in subscription and 'return' in subscription):
+            raise ValueError(f"subscription needs a month or depart/return dates: {subscription}")
+
+    return subscriptions_data
+
+
+def search_of(subscription):
+    """
+    the search (batch job) behind a subscription - overlapping subscriptions share the same job id
+    :param subscription:
+    :return: job
+    """
+    job = {field: subscription[field] for field in SEARCH_FIELDS if field in subscription}
+    job['id'] = job_id(job)
+
+    return job
+
+
+def filter_deals(deals, subscription):
+    """
+    the deals matching a subscriber's filters (destinations, max price, carriers, final price only, time windows)
+    :param deals: DealSet
+    :param subscription:
+    :return: DealSet
+    """
+    return deals.take(filter_mask(deals, subscription))
+
+
+class SubscriptionFanout:
+    def __init__(self, subscriptions, mailer, subject="Flights Bot", logger=None):
+        """
+        scrape once, deliver to many - the unique searches of all the subscriptions are scraped once
+        (see jobs, run with BatchScheduler on_results=deliver) and every subscriber gets a digest of the deals
+        matching their filters
+        :param subscriptions: list of subscriptions (see load_subscriptions)
+        :param mailer: Mailer for the digests
+        :param subject: digests subject
+        :param logger:
+        """
+        self.mailer = mailer
+        self.subject = subject
+        self.logger = logger if logger else logging.getLogger(__name__)
+
+        self._jobs = {}
+        self._subscribers = {}
+        for subscription in subscriptions:
+            job = search_of(subscription)
+            self._jobs.setdefault(job['id'], job)
+            self._subscribers.setdefault(job['id'], []).append(subscription)
+
+        self.sent = 0
+        self._lock = Lock()
+
+    def jobs(self):
+        """
+        unique searches (batch jobs)
+        :return: list of jobs
+        """
+        return list(self._jobs.values())
+
+    def deliver(self, job, deals):
+        """
+        queue a digest for every subscriber of the job (with matching deals)
+        :param job:
+        :param deals: DealSet of the job
+        :return:
+        """
+        subscribers = self._subscribers.get(job['id'], [])
+        self.logger.info(f"fan-out {job['id']}: {len(deals)} deals to {len(subscribers)} subscribers")
+
+        for subscription in subscribers:
+            matching = filter_deals(deals, subscription)
+            if not len(matching):
+                continue
+
+            report = DealReport(matching, f"{len(matching)} deals from {job['origin']}", page_size=len(matching))
+            self.mailer.send(subscription['email'], f"{self.subject} - {job['origin']}", report.text(),
+                             html=report.html())
+            with self._lock:
+                self.sent += 1
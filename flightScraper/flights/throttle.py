@@ -0,0 +1,147 @@
+from threading import Lock
+import logging
+import time
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold, cooldown, max_cooldown, logger=None):
+        """
+        pauses every worker sharing it after failure_threshold consecutive blocks, for a cooldown that doubles
+        every time the breaker opens again (up to max_cooldown). a success closes it and resets the cooldown
+        :param failure_threshold: consecutive failures that open the breaker
+        :param cooldown: first pause (seconds)
+        :param max_cooldown: longest pause (seconds)
+        :param logger:
+        """
+        self.failure_threshold = failure_threshold
+        self.base_cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.logger = logger if logger else logging.getLogger(__name__)
+
+        self._lock = Lock()
+        self._failures = 0
+        self._cooldown = cooldown
+        self._open_until = 0.0
+
+    @property
+    def is_open(self):
+        with self._lock:
+            return time.monotonic() < self._open_until
+
+    def record_failure(self):
+        """
+        a blocked page - opens the breaker once there are enough consecutive failures
+        :return:
+        """
+        with self._lock:
+            self._failures += 1
+            if self._failures >= self.failure_threshold and time.monotonic() >= self._open_until:
+                self._open_until = time.monotonic() + self._cooldown
+                self.logger.warning(f"circuit breaker open - pausing all workers for {self._cooldown:.0f}s "
+                                    f"({self._failures} consecutive blocks)")
+                self._cooldown = min(self._cooldown * 2, self.max_cooldown)
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._cooldown = self.base_cooldown
+
+    def wait(self):
+        """
+        block while the breaker is open (after the cooldown a trial request goes through - half open)
+        :return:
+        """
+        while True:
+            with self._lock:
+                wait_time = self._open_until - time.monotonic()
+            if wait_time <= 0:
+                return
+            time.sleep(wait_time)
+
+
+class RateLimiter:
+    def __init__(self, min_interval, burst=1, max_interval=60, backoff_factor=2.0, recovery_factor=0.9,
+                 breaker=None):
+        """
+        per-site token bucket - page loads (across all workers sharing it) at one per interval on average, with short
+        bursts of up to burst loads. the interval backs off exponentially when the site blocks us and recovers
+        gradually on successful pages
+        :param min_interval: seconds between page loads when the site is fine
+        :param burst: bucket size
+        :param max_interval: longest interval when backing off
+        :param backoff_factor: interval multiplier on a block
+        :param recovery_factor: interval multiplier on a success (< 1)
+        :param breaker: CircuitBreaker shared by the workers (optional)
+        """
+        self.min_interval = min_interval
+        self.burst = burst
+        self.max_interval = max_interval
+        self.backoff_factor = backoff_factor
+        self.recovery_factor = recovery_factor
+        self.breaker = breaker
+
+        self._lock = Lock()
+        self.interval = min_interval
+        self._tokens = float(burst)
+        self._last_refill = time.monotonic()
+
+    @classmethod
+    def from_cfg(cls, throttle_cfg, min_interval=None, logger=None):
+        """
+        limiter (and circuit breaker) with the cfg 'throttle' settings
+        :param throttle_cfg: cfg 'throttle'
+        :param min_interval: overrides cfg 'throttle' -> 'min_interval' (e.g. batch runs)
+        :param logger:
+        :return: RateLimiter
+        """
+        breaker = CircuitBreaker(throttle_cfg['breaker_threshold'], throttle_cfg['breaker_cooldown'],
+                                 throttle_cfg['breaker_max_cooldown'], logger=logger)
+        return cls(min_interval if min_interval is not None else throttle_cfg['min_interval'],
+                   burst=throttle_cfg['burst'], max_interval=throttle_cfg['max_interval'],
+                   backoff_factor=throttle_cfg['backoff_factor'], recovery_factor=throttle_cfg['recovery_factor'],
+                   breaker=breaker)
+
+    def acquire(self):
+        """
+        block until the next page load is allowed (and the circuit breaker is closed)
+        :return:
+        """
+        if self.breaker:
+            self.breaker.wait()
+
+        with self._lock:
+            now = time.monotonic()
+            if self.interval > 0:
+                self._tokens = min(self.burst, self._tokens + (now - self._last_refill) / self.interval)
+            else:
+                self._tokens = float(self.burst)
+            self._last_refill = now
+
+            # take a token - a negative balance is a reservation, waited for outside the lock
+            self._tokens -= 1
+            wait_time = -self._tokens * self.interval if self._tokens < 0 else 0.0
+
+        if wait_time:
+            time.sleep(wait_time)
+
+    def penalize(self):
+        """
+        the site blocked us - back off (and count the failure in the circuit breaker)
+        :return:
+        """
+        with self._lock:
+            self.interval = min(max(self.interval, 1.0) * self.backoff_factor, self.max_interval)
+            # no bursting while backing off
+            self._tokens = min(self._tokens, 0.0)
+        if self.breaker:
+            self.breaker.record_failure()
+
+    def reward(self):
+        """
+        a successful page - recover towards min_interval
+        :return:
+        """
+        with self._lock:
+            self.interval = max(self.min_interval, self.interval * self.recovery_factor)
+        if self.breaker:
+            self.breaker.record_success()
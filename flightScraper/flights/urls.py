@@ -0,0 +1,161 @@
+from datetime import datetime, date
+from calendar import monthrange
+import re
+
+
+# explore page dates formats (e.g. 'Sep 5 - Sep 12', 'Thu 9/5 - Thu 9/12')
+EXPLORE_DATE_FORMATS = ["%b %d", "%a %b %d", "%d %b", "%a %d %b", "%m/%d", "%a %m/%d"]
+
+ROUTE_CODES_PATTERN = re.compile(r"/flights/([A-Z]{3})[^/]*-([A-Z]{3})")
+AIRPORT_CODE_PATTERN = re.compile(r"[A-Z]{3}")
+
+
+def build_explore_url(site, loc_from, dates, stops=None, duration=None):
+    """
+    explore page url
+    :param site:
+    :param loc_from:
+    :param dates: website format dates (yyyymmdd,yyyymmdd)
+    :param stops:
+    :param duration: trip duration range (d,d)
+    :return: url
+    """
+    url = f"{site}/explore/{loc_from}-anywhere/{dates}"
+    filters = []
+    if stops is not None:
+        filters.append(f"stops={stops}")
+    if duration:
+        filters.append(f"tripdurationrange={duration}")
+    if filters:
+        url = f"{url}?{'&'.join(filters)}"
+
+    return url
+
+
+def month_dates(year, month):
+    """
+    whole month in the website dates format
+    :param year:
+    :param month:
+    :return: yyyymmdd,yyyymmdd
+    """
+    month_days = monthrange(year, month)
+    return f"{date(year, month, 1).strftime('%Y%m%d')},{date(year, month, month_days[1]).strftime('%Y%m%d')}"
+
+
+def build_search_explore_url(site, explore_cfg, loc_from, is_exact=False, duration=None, year=None, month=None,
+                             depart_date=None, return_date=None):
+    """
+    explore page url of a search (exact dates or a whole month) - cfg defaults for a month search if not given
+    :param site:
+    :param explore_cfg: cfg 'explore'
+    :param loc_from:
+    :param is_exact:
+    :param duration:
+    :param year:
+    :param month:
+    :param depart_date: yyyymmdd
+    :param return_date: yyyymmdd
+    :return: url, year of the search
+    """
+    if is_exact:
+        return build_explore_url(site, loc_from, f"{depart_date},{return_date}"), int(str(depart_date)[:4])
+
+    # each one not given falls back to its own cfg default (e.g. only the month given keeps the cfg duration)
+    if not duration:
+        duration = explore_cfg['dates']['range']['duration']
+    if not month:
+        month = explore_cfg['dates']['range']['month']
+    if not year:
+        year = date.today().year
+
+    url = build_explore_url(site, loc_from, month_dates(year, month), stops=explore_cfg['filters']['stops'],
+                            duration=duration)
+    return url, year
+
+
+def build_results_url(site, loc_from, loc_to, depart_date, return_date, carry_on_bag=0, checked_bag=0, stops=None):
+    """
+    flights results page url with the filters (bags, stops) encoded, instead of clicking them
+    :param site:
+    :param loc_from: airport/city code
+    :param loc_to: airport/city code
+    :param depart_date: date
+    :param return_date: date
+    :param carry_on_bag: number of carry-on bags
+    :param checked_bag: number of checked bags
+    :param stops: max stops (no filter if None)
+    :return: url
+    """
+    filters = []
+    if stops is not None:
+        filters.append(f"stops={stops}")
+    if carry_on_bag:
+        filters.append(f"cfc={carry_on_bag}")
+    if checked_bag:
+        filters.append(f"bfc={checked_bag}")
+
+    url = f"{site}/flights/{loc_from}-{loc_to}/{depart_date.isoformat()}/{return_date.isoformat()}?sort=bestflight_a"
+    if filters:
+        url = f"{url}&fs={';'.join(filters)}"
+
+    return url
+
+
+def parse_explore_dates(dates_text, year):
+    """
+    parse explore page dates text (e.g. 'Sep 5 - Sep 12') to depart and return dates
+    :param dates_text:
+    :param year: year of the search (the explore page doesn't show it)
+    :return: (depart date, return date) or None if the format is unknown
+    """
+    parts = [part.strip() for part in re.split(r"\s[-–]\s|[–]", dates_text or '') if part.strip()]
+    if len(parts) != 2:
+        return None
+
+    trip_dates = []
+    for part in parts:
+        for date_format in EXPLORE_DATE_FORMATS:
+            try:
+                parsed = datetime.strptime(f"{part} {year}", f"{date_format} %Y")
+                break
+            except ValueError:
+                continue
+        else:
+            return None
+        trip_dates.append(parsed.date())
+
+    depart_date, return_date = trip_dates
+
+    # trip over new year
+    if return_date < depart_date:
+        return_date = date(return_date.year + 1, return_date.month, return_date.day)
+
+    return depart_date, return_date
+
+
+def parse_route_codes(hrefs):
+    """
+    origin and destination codes from an explore result's links (if it links to a results page)
+    :param hrefs:
+    :return: origin code, destination code (None, None if not found)
+    """
+    for href in hrefs:
+        match = ROUTE_CODES_PATTERN.search(href or '')
+        if match:
+            return match.group(1), match.group(2)
+
+    return None, None
+
+
+def airport_code(location, airports):
+    """
+    airport/city code of a location - a code as is, a city through cfg 'explore' -> 'airports'
+    :param location: code or city name
+    :param airports: cfg 'explore' -> 'airports' (city -> code)
+    :return: code, None if unknown
+    """
+    if location and AIRPORT_CODE_PATTERN.fullmatch(location):
+        return location
+
+    return airports.get(location)
@@ -0,0 +1,79 @@
+from collections import defaultdict
+from threading import Lock
+import time
+
+from selenium.webdriver.support.wait import WebDriverWait
+from selenium.common import TimeoutException
+
+from flights import metrics
+
+
+class WaitProfiler:
+    def __init__(self):
+        """
+        records how long each wait (per xPaths key from the config) actually took
+        """
+        self._lock = Lock()
+        self.durations = defaultdict(list)
+        self.timeouts = defaultdict(int)
+
+    def wait(self, driver, key, condition, timeout=10, poll_frequency=0.1):
+        """
+        block until condition is met (or timeout) and record the time it took
+        :param driver: webdriver instance
+        :param key: xPaths key (or any other label) to record the wait under
+        :param condition: expected condition / callable receiving the driver
+        :param timeout: seconds
+        :param poll_frequency: seconds between condition checks
+        :return: the condition result
+        """
+        start = time.perf_counter()
+        timed_out = False
+        try:
+            return WebDriverWait(driver, timeout, poll_frequency=poll_frequency).until(condition)
+        except TimeoutException:
+            timed_out = True
+            raise
+        finally:
+            self.record(key, time.perf_counter() - start, timed_out)
+
+    def record(self, key, seconds, timed_out=False):
+        """
+        add a single wait measurement
+        :param key:
+        :param seconds:
+        :param timed_out:
+        :return:
+        """
+        metrics.wait_seconds.observe(seconds, key=key)
+        with self._lock:
+            self.durations[key].append(seconds)
+            if timed_out:
+                self.timeouts[key] += 1
+
+    def merge(self, other):
+        """
+        add the measurements of another profiler (e.g. from a pool worker)
+        :param other: WaitProfiler
+        :return:
+        """
+        with self._lock:
+            for key, durations in other.durations.items():
+                self.durations[key].extend(durations)
+            for key, count in other.timeouts.items():
+                self.timeouts[key] += count
+
+    def report(self):
+        """
+        timing report - one line per key, slowest total first
+        :return: report string
+        """
+        with self._lock:
+            rows = sorted(self.durations.items(), key=lambda item: sum(item[1]), reverse=True)
+            lines = [f"{'Key':<28}{'Count':>7}{'Total(s)':>10}{'Avg(s)':>9}{'Max(s)':>9}{'Timeouts':>10}"]
+            for key, durations in rows:
+                total = sum(durations)
+                lines.append(f"{key:<28}{len(durations):>7}{total:>10.2f}{total / len(durations):>9.2f}"
+                             f"{max(durations):>9.2f}{self.timeouts[key]:>10}")
+
+        return "\n".join(lines)
@@ -1,14 +1,18 @@
 from config.email_config import *
 
-from config.logger_config import configure_logger
+from config.logger_config import configure_structured_logger
 import logging
 
-from flights.flights import Flights
-
+# the flights modules (selenium, numpy, ...) are imported by the commands that need them - fast startup
 from datetime import datetime
+import argparse
+import json
 import uuid
+import sys
 import os
 
+DEFAULT_CFG_FILE = 'flights/cfg.json'
+
 
 def init_logger(logger_name=__name__):
     """
@@ -16,23 +20,93 @@ def init_logger(logger_name=__name__):
     :param logger_name:
     :return: log object
     """
-    now = datetime.now()
-    current_time = now.strftime('%d-%m-%Y_%H-%M-%S')
-
     base_dir = os.path.dirname(os.getcwd())
-    if 'flightScraper' in base_dir.split('/')[-1]:
+    if 'flightScraper' in os.path.basename(base_dir):
         os.chdir(base_dir)
-    if not os.path.exists(f'.\\log_files'):
-        os.makedirs(f'.\\log_files')
 
-    log = configure_logger(logger_name=logger_name, logging_level=logging.DEBUG, print_logging=True,
-                           log_output_path=f'.\\log_files\\bot-log_file-{current_time}.log')
+    # one json lines log file per run (shared with the Flights loggers), written in the background
+    log = configure_structured_logger(logger_name=logger_name, logging_level=logging.DEBUG, print_logging=True,
+                                      log_dir='log_files', file_prefix='bot')
 
     log.info("Logger initiated ... ")
 
     return log
 
 
+def load_cfg(cfg_file=DEFAULT_CFG_FILE):
+    """
+    load the config
+    :param cfg_file:
+    :return: cfg data
+    """
+    with open(cfg_file) as config_file:
+        return json.load(config_file)
+
+
+def sessions_factory(cfg_data, logger, workers, cfg_file=DEFAULT_CFG_FILE, receiver=None, subject="Flights Bot",
+                     body="Today's Results: ", **flights_kwargs):
+    """
+    factory of the browser sessions of a multi-session command (batch, worker, subscriptions, monitor) - the sessions
+    share one link shortener (and cache). with cfg 'session_pool' -> 'attach' each session pool slot attaches to its
+    own daemon browser
+    :param cfg_data: loaded cfg.json
+    :param logger:
+    :param workers: number of concurrent sessions (checked against the daemon browsers when attaching)
+    :param cfg_file:
+    :param receiver: email receiver
+    :param subject: email subject
+    :param body: email body
+    :param flights_kwargs: more Flights arguments shared by the sessions (sink, mailer, result_store)
+    :return: callable(rate_limiter, slot index) -> new Flights instance
+    """
+    from flights.session_pool import attach_address
+    from flights.shortener import LinkShortener
+    from flights.flights import Flights
+
+    pool_cfg = cfg_data['session_pool']
+    if pool_cfg['attach'] and workers > pool_cfg['size']:
+        raise ValueError(f"{workers} sessions but {pool_cfg['size']} session pool daemon browsers "
+                         f"(cfg 'session_pool' -> 'size')")
+
+    shortener = LinkShortener(cache_file=cfg_data['shortener']['cache_file'],
+                              concurrency=cfg_data['shortener']['concurrency'], logger=logger)
+
+    def flights_factory(rate_limiter, index):
+        return Flights(sender=email_sender, receiver=receiver, s_password=email_pass, subject=subject, body=body,
+                       cfg_file=cfg_file, teardown=True, logger=logger, shortener=shortener,
+                       debugger_address=attach_address(pool_cfg, index) if pool_cfg['attach'] else None,
+                       rate_limiter=rate_limiter, **flights_kwargs)
+
+    return flights_factory
+
+
+def export_metrics(cfg_data, log=None):
+    """
+    write the run's metrics (prometheus text format) to cfg 'metrics' -> 'file'
+    :param cfg_data: loaded cfg.json
+    :param log:
+    :return:
+    """
+    if cfg_data['metrics']['file']:
+        from flights import metrics
+
+        metrics.registry.write(cfg_data['metrics']['file'])
+        if log:
+            log.info(f"metrics written to {cfg_data['metrics']['file']}")
+
+
+def serve_metrics(cfg_data):
+    """
+    serve the metrics for prometheus scraping (long-running modes) if cfg 'metrics' -> 'port' is set
+    :param cfg_data: loaded cfg.json
+    :return:
+    """
+    if cfg_data['metrics']['port']:
+        from flights import metrics
+
+        metrics.registry.serve(cfg_data['metrics']['port'])
+
+
 def get_inputs(log=None):
     """
     getting inputs for flights search
@@ -58,10 +132,227 @@ def get_inputs(log=None):
         return from_loc, to_loc, carry_on, checked_bag, duration, year, month, date_format
 
 
-def main():
+def run_batch(jobs_file, cfg_file=DEFAULT_CFG_FILE):
+    """
+    run a batch of searches (see flights.batch.load_jobs) - resumes an interrupted batch
+    :param jobs_file:
+    :param cfg_file:
+    :return:
+    """
+    from flights.batch import BatchScheduler, load_jobs
+    from flights.sinks import open_sinks
+
+    logger = init_logger()
+
+    cfg_data = load_cfg(cfg_file)
+
+    # deals are streamed as they are found (cfg 'sinks')
+    sink = open_sinks(cfg_data['sinks'])
+
+    scheduler = BatchScheduler(sessions_factory(cfg_data, logger, cfg_data['batch']['workers'], cfg_file=cfg_file,
+                                                sink=sink), cfg_data, logger=logger)
+    serve_metrics(cfg_data)
+    try:
+        failed = scheduler.run(load_jobs(jobs_file))
+    finally:
+        if sink:
+            sink.close()
+    export_metrics(cfg_data, logger)
+    print(f"\nBatch finished, results in {scheduler.output_file} ({failed} failed jobs)")
+
+
+def run_enqueue(jobs_file, cfg_file=DEFAULT_CFG_FILE):
+    """
+    add search jobs (see flights.batch.load_jobs) to the shared job queue - jobs still pending or running are skipped,
+    finished (done / failed) jobs are queued again
+    :param jobs_file:
+    :param cfg_file:
+    :return:
+    """
+    from flights.batch import load_jobs
+    from flights.job_queue import JobQueue
+
+    cfg_data = load_cfg(cfg_file)
+
+    job_queue = JobQueue.from_cfg(cfg_data['queue'])
+    try:
+        jobs = load_jobs(jobs_file)
+        added = job_queue.enqueue(jobs)
+        print(f"{added} jobs queued ({len(jobs) - added} still pending or running) - {job_queue.counts()}")
+    finally:
+        job_queue.close()
+
+
+def run_queue_status(export_file=None, cfg_file=DEFAULT_CFG_FILE):
+    """
+    print the job queue state, optionally export the pushed deal records
+    :param export_file: json lines file for the deal records
+    :param cfg_file:
+    :return:
+    """
+    from flights.job_queue import JobQueue
+
+    cfg_data = load_cfg(cfg_file)
+
+    job_queue = JobQueue.from_cfg(cfg_data['queue'])
+    try:
+        print(job_queue.counts())
+        if export_file:
+            results = job_queue.results()
+            with open(export_file, 'w') as output:
+                for job_id, record in results:
+                    output.write(json.dumps({'job': job_id, **record}) + "\n")
+            print(f"{len(results)} deals exported to {export_file}")
+    finally:
+        job_queue.close()
+
+
+def run_worker(worker_id=None, workers=None, exit_when_drained=False, cfg_file=DEFAULT_CFG_FILE):
+    """
+    worker node - pull jobs from the shared job queue, scrape them and push the deals back
+    (run one on every host that can reach the queue file)
+    :param worker_id: node id, host-pid if not given
+    :param workers: browser sessions (cfg 'queue' -> 'workers' if not given)
+    :param exit_when_drained: stop when no job is pending or leased
+    :param cfg_file:
+    :return:
+    """
+    from flights.job_queue import JobQueue, QueueWorker
+    from flights.sinks import open_sinks
+
+    logger = init_logger()
+
+    cfg_data = load_cfg(cfg_file)
+    if workers:
+        cfg_data['queue']['workers'] = workers
+
+    sink = open_sinks(cfg_data['sinks'])
+
+    job_queue = JobQueue.from_cfg(cfg_data['queue'])
+    worker = QueueWorker(sessions_factory(cfg_data, logger, cfg_data['queue']['workers'], cfg_file=cfg_file,
+                                          sink=sink), cfg_data, job_queue, worker_id=worker_id, logger=logger)
+    serve_metrics(cfg_data)
+    try:
+        completed, failed = worker.run(exit_when_drained=exit_when_drained)
+    finally:
+        job_queue.close()
+        if sink:
+            sink.close()
+    export_metrics(cfg_data, logger)
+    print(f"\nWorker {worker.worker_id} stopped ({completed} jobs done, {failed} failed attempts)")
+
+
+def run_subscriptions(subscriptions_file, cfg_file=DEFAULT_CFG_FILE):
+    """
+    scrape every unique search of the subscriptions once and email each subscriber a filtered digest
+    (see flights.subscriptions.load_subscriptions) - resumes an interrupted run of the same day
+    :param subscriptions_file:
+    :param cfg_file:
+    :return:
+    """
+    from flights.subscriptions import SubscriptionFanout, load_subscriptions
+    from flights.batch import BatchScheduler
+    from flights.mailer import Mailer
+
+    logger = init_logger()
+
+    cfg_data = load_cfg(cfg_file)
+
+    mailer = Mailer.from_cfg(cfg_data['email'], 'smtp.gmail.com', 465, email_sender, email_pass, logger=logger)
+    fanout = SubscriptionFanout(load_subscriptions(subscriptions_file), mailer, logger=logger)
+
+    today = datetime.now().strftime('%Y-%m-%d')
+    subscriptions_cfg = cfg_data['subscriptions']
+    flights_factory = sessions_factory(cfg_data, logger, cfg_data['batch']['workers'], cfg_file=cfg_file,
+                                       mailer=mailer)
+    scheduler = BatchScheduler(flights_factory, cfg_data,
+                               output_file=subscriptions_cfg['output_file'].format(date=today),
+                               state_file=subscriptions_cfg['state_file'].format(date=today),
+                               on_results=fanout.deliver, logger=logger)
+    serve_metrics(cfg_data)
+    try:
+        failed = scheduler.run(fanout.jobs())
+    finally:
+        mailer.close()
+        export_metrics(cfg_data, logger)
+    print(f"\nSubscriptions finished, {len(fanout.jobs())} searches, {fanout.sent} digests ({failed} failed searches)")
+
+
+def run_monitor(routes_file, receiver, cfg_file=DEFAULT_CFG_FILE):
+    """
+    monitor the tracked routes (see flights.monitor.load_routes) until interrupted - emails only price drops
+    :param routes_file:
+    :param receiver: email for the alerts
+    :param cfg_file:
+    :return:
+    """
+    from flights.monitor import PriceMonitor, load_routes
+    from flights.mailer import Mailer
+    from flights.store import ResultStore
+
+    logger = init_logger()
+
+    cfg_data = load_cfg(cfg_file)
+
+    store = ResultStore(cfg_data['store']['path'], cfg_data['store']['ttl_hours'])
+    # one smtp connection for all the alerts
+    mailer = Mailer.from_cfg(cfg_data['email'], 'smtp.gmail.com', 465, email_sender, email_pass, logger=logger)
+
+    flights_factory = sessions_factory(cfg_data, logger, cfg_data['monitor']['workers'], cfg_file=cfg_file,
+                                       receiver=receiver, subject="Flights Bot - Price Drops", body="Price drops: ",
+                                       result_store=store, mailer=mailer)
+
+    serve_metrics(cfg_data)
+    try:
+        PriceMonitor(flights_factory, cfg_data, store, logger=logger).run(load_routes(routes_file))
+    finally:
+        mailer.close()
+        store.close()
+        export_metrics(cfg_data, logger)
+
+
+def run_explore_sweep(origins, year=None, month=None, duration=None, cfg_file=DEFAULT_CFG_FILE):
+    """
+    cheapest destinations from the given origins over plain http (no browser), cfg default dates
+    :param origins: origin codes
+    :param year:
+    :param month:
+    :param duration:
+    :param cfg_file:
+    :return:
+    """
+    # no browser - selenium isn't imported
+    from flights.http_fetcher import sweep_explore
+
+    logger = init_logger()
+
+    cfg_data = load_cfg(cfg_file)
+
+    results_by_origin = sweep_explore(cfg_data, origins, year=year, month=month, duration=duration, logger=logger)
+    for origin, results in results_by_origin.items():
+        if results is None:
+            print(f"\n{origin}: results not in the server response (run a browser search)")
+            continue
+
+        print(f"\n{origin}:")
+        for result in results:
+            print(f"  {result.city:<25}{result.dates or '':<20}{result.price.split()[-1]}")
+
+
+def main(cfg_file=DEFAULT_CFG_FILE):
+    """
+    interactive search (prompts for the search and the email)
+    :param cfg_file:
+    :return:
+    """
+    from flights.sinks import open_sinks
+    from flights.flights import Flights
+
     # logging setup
     logger = init_logger()
 
+    cfg_data = load_cfg(cfg_file)
+
     # creates a random uuid(universally unique identifier)
     print(f"{uuid.uuid4()}\n")
 
@@ -72,22 +363,29 @@ def main():
         inputs = get_inputs(logger)
 
     # running flights bot
+    sink = None
     try:
         results_receiver = input("\nEmail (to receive results): ")
 
         logger.info("creating a bot instance")
         print("\nloading driver...")
 
+        # deals are streamed as they are found (cfg 'sinks'), partial results survive a failed run
+        sink = open_sinks(cfg_data['sinks'])
+
         with Flights(sender=email_sender, receiver=results_receiver, s_password=email_pass, subject="Flights Bot",
-                     body="Today's Results: ", teardown=True, loc_from=inputs[0], loc_to=inputs[1]) as flightsBot:
+                     body="Today's Results: ", cfg_file=cfg_file, teardown=True, loc_from=inputs[0],
+                     loc_to=inputs[1], sink=sink) as flightsBot:
             if inputs[-1] == 'y':
                 flightsBot.load_explore_page(is_exact=True, depart_date=inputs[4], return_date=inputs[5])
             else:
                 flightsBot.load_explore_page(duration=inputs[4], year=inputs[5], month=inputs[6])
             flightsBot.get_general_flights_info(user_mode=not is_default)
             flightsBot.generate_generic_table()
-            flightsBot.get_top_flights(user_mode=not is_default, carry=inputs[2], checked=inputs[3])
+            flightsBot.get_top_flights_pooled(user_mode=not is_default, carry=inputs[2], checked=inputs[3])
             flightsBot.generate_top_deal_table()
+            flightsBot.report_wait_times()
+            export_metrics(flightsBot.cfg_data, logger)
             logger.info("Bot process finished.")
             print("Exiting ...")
     except Exception as e:
@@ -102,7 +400,269 @@ def main():
         else:
             logger.exception("other error")
             print(f"\n Error: {e}")
+    finally:
+        if sink:
+            sink.close()
+
+
+def parse_bags(bags):
+    """
+    bags argument 'carry,checked' (argparse type, e.g. '1,0')
+    :param bags:
+    :return: carry-on bags, checked bags
+    """
+    try:
+        carry, checked = (int(bag) for bag in bags.split(','))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected carry-on,checked bags (e.g. 1,0), got {bags!r}")
+    if carry < 0 or checked < 0:
+        raise argparse.ArgumentTypeError(f"bags can't be negative: {bags!r}")
+
+    return carry, checked
+
+
+def output_sinks_cfg(sinks_cfg, out):
+    """
+    cfg 'sinks' with the output file of the command line (its extension decides the format) instead of the cfg files
+    :param sinks_cfg: cfg 'sinks'
+    :param out: .jsonl / .csv file or .parquet dir
+    :return: sinks cfg
+    """
+    if not out:
+        return sinks_cfg
+
+    sinks_cfg = dict(sinks_cfg, jsonl=None, csv=None, parquet=None)
+    extension = os.path.splitext(out)[1].lower()
+    if extension not in ('.jsonl', '.csv', '.parquet'):
+        raise ValueError(f"unknown output format (.jsonl, .csv or .parquet): {out}")
+    sinks_cfg[extension[1:]] = out
+
+    return sinks_cfg
+
+
+def run_search(origin=None, destination=None, month=None, year=None, duration=None, depart_date=None,
+               return_date=None, bags=None, out=None, receiver=None, workers=None, live=False,
+               cfg_file=DEFAULT_CFG_FILE):
+    """
+    non-interactive search (cron friendly) - cfg defaults for everything not given
+    :param origin:
+    :param destination:
+    :param month:
+    :param year:
+    :param duration: d,d
+    :param depart_date: yyyymmdd (exact dates search)
+    :param return_date: yyyymmdd
+    :param bags: (carry-on, checked) bags, cfg defaults if not given (see parse_bags)
+    :param out: deals output file (.jsonl / .csv / .parquet)
+    :param receiver: email for the results (no email if not given)
+    :param workers: browser workers
+    :param live: live terminal table of the deals
+    :param cfg_file:
+    :return: exit code
+    """
+    from flights.sinks import open_sinks
+    from flights.flights import Flights
+
+    logger = init_logger()
+
+    cfg_data = load_cfg(cfg_file)
+
+    carry, checked = bags if bags else (None, None)
+    sinks_cfg = output_sinks_cfg(cfg_data['sinks'], out)
+    if live:
+        sinks_cfg = dict(sinks_cfg, live_table=True)
+    sink = open_sinks(sinks_cfg)
+
+    try:
+        with Flights(sender=email_sender, receiver=receiver, s_password=email_pass, subject="Flights Bot",
+                     body="Today's Results: ", cfg_file=cfg_file, teardown=True,
+                     loc_from=origin or cfg_data['explore']['location']['from'],
+                     loc_to=destination or cfg_data['explore']['location']['to'], logger=logger,
+                     sink=sink) as flightsBot:
+            if depart_date:
+                flightsBot.load_explore_page(is_exact=True, depart_date=depart_date, return_date=return_date)
+            else:
+                flightsBot.load_explore_page(duration=duration, year=year, month=month)
+            # a destination is searched like the interactive mode does (typed in the explore page)
+            user_mode = bool(destination)
+            flightsBot.get_general_flights_info(user_mode=user_mode)
+            flightsBot.generate_generic_table()
+            flightsBot.get_top_flights_pooled(user_mode=user_mode, carry=carry, checked=checked, workers=workers)
+            flightsBot.generate_top_deal_table()
+            flightsBot.report_wait_times()
+            export_metrics(cfg_data, logger)
+    except Exception as e:
+        logger.exception(f"unsuccessful search: {e}")
+        print(f"\n Error: {e}")
+        return 1
+    finally:
+        if sink:
+            sink.close()
+
+    logger.info("Bot process finished.")
+    return 0
+
+
+def run_date_matrix(origin=None, destination=None, month=None, year=None, duration=None, bags=None, out=None,
+                    receiver=None, workers=None, cfg_file=DEFAULT_CFG_FILE):
+    """
+    flexible dates search - price of every depart day / trip length of a month to one destination
+    :param origin:
+    :param destination:
+    :param month:
+    :param year:
+    :param duration: d,d
+    :param bags: (carry-on, checked) bags, cfg defaults if not given (see parse_bags)
+    :param out: deals output file (.jsonl / .csv / .parquet)
+    :param receiver: email for the results (no email if not given)
+    :param workers: browser workers
+    :param cfg_file:
+    :return: exit code
+    """
+    from flights.urls import airport_code
+    from flights.sinks import open_sinks
+    from flights.flights import Flights
+
+    logger = init_logger()
+
+    cfg_data = load_cfg(cfg_file)
+
+    # every cell is a results page of the route - checked before any browser starts
+    origin = origin or cfg_data['explore']['location']['from']
+    destination = destination or cfg_data['explore']['location']['to']
+    for location in (origin, destination):
+        if not airport_code(location, cfg_data['explore']['airports']):
+            print(f"\n Error: unknown airport {location!r} (an airport code or a city in cfg 'explore' -> 'airports')")
+            return 2
+
+    carry, checked = bags if bags else (None, None)
+    sink = open_sinks(output_sinks_cfg(cfg_data['sinks'], out))
+
+    try:
+        with Flights(sender=email_sender, receiver=receiver, s_password=email_pass, subject="Flights Bot",
+                     body="Date Matrix Results: ", cfg_file=cfg_file, teardown=True, loc_from=origin,
+                     loc_to=destination, logger=logger,
+                     sink=sink) as flightsBot:
+            matrix = flightsBot.get_date_matrix(year=year, month=month, duration=duration, carry=carry,
+                                                checked=checked, workers=workers)
+            flightsBot.generate_date_matrix_table(matrix)
+            flightsBot.report_wait_times()
+            export_metrics(cfg_data, logger)
+    except Exception as e:
+        logger.exception(f"unsuccessful date matrix search: {e}")
+        print(f"\n Error: {e}")
+        return 1
+    finally:
+        if sink:
+            sink.close()
+
+    logger.info("Bot process finished.")
+    return 0
+
+
+def build_arg_parser():
+    arg_parser = argparse.ArgumentParser(prog='runFlightsBot.py', description="Flights Bot - cheapest flights finder")
+    arg_parser.add_argument('--cfg', default=DEFAULT_CFG_FILE, help="config file")
+    commands = arg_parser.add_subparsers(dest='command')
+
+    search = commands.add_parser('search', help="search flights (non-interactive)")
+    search.add_argument('--from', dest='origin', help="origin airport/city code (cfg default)")
+    search.add_argument('--to', dest='destination', help="destination (cfg default)")
+    search.add_argument('--month', type=int, help="month to search (1-12)")
+    search.add_argument('--year', type=int, help="year of the month (current year by default)")
+    search.add_argument('--duration', help="trip duration range, e.g. 5,10")
+    search.add_argument('--depart', type=int, help="exact departure date (yyyymmdd)")
+    search.add_argument('--return', dest='return_date', type=int, help="exact return date (yyyymmdd)")
+    search.add_argument('--bags', type=parse_bags, help="carry-on,checked bags, e.g. 1,0")
+    search.add_argument('--out', help="stream the deals to a .jsonl / .csv file or a .parquet dir")
+    search.add_argument('--email', help="email the results to")
+    search.add_argument('--workers', type=int, help="browser workers (cfg 'pool' -> 'workers' by default)")
+    search.add_argument('--live', action='store_true', help="live table of the deals found so far")
+
+    matrix = commands.add_parser('matrix', help="cheapest dates to one destination (depart day x trip length)")
+    matrix.add_argument('--from', dest='origin', help="origin airport/city code (cfg default)")
+    matrix.add_argument('--to', dest='destination', required=True,
+                        help="destination airport code (or a city in cfg 'explore' -> 'airports')")
+    matrix.add_argument('--month', type=int, help="month to search (1-12)")
+    matrix.add_argument('--year', type=int, help="year of the month (current year by default)")
+    matrix.add_argument('--duration', help="trip length range, e.g. 5,10")
+    matrix.add_argument('--bags', type=parse_bags, help="carry-on,checked bags, e.g. 1,0")
+    matrix.add_argument('--out', help="stream the deals to a .jsonl / .csv file or a .parquet dir")
+    matrix.add_argument('--email', help="email the results to")
+    matrix.add_argument('--workers', type=int, help="browser workers (cfg 'pool' -> 'workers' by default)")
+
+    commands.add_parser('interactive', help="interactive search (prompts, the default)")
+
+    batch = commands.add_parser('batch', help="run a batch of searches (resumable)")
+    batch.add_argument('jobs_file')
+
+    enqueue = commands.add_parser('enqueue', help="add batch jobs to the shared job queue")
+    enqueue.add_argument('jobs_file')
+
+    worker = commands.add_parser('worker', help="pull jobs from the shared job queue and scrape them")
+    worker.add_argument('--id', dest='worker_id', help="worker node id (host-pid by default)")
+    worker.add_argument('--workers', type=int, help="browser sessions (cfg 'queue' -> 'workers' by default)")
+    worker.add_argument('--exit-when-drained', action='store_true', help="stop when the queue has no jobs left")
+
+    queue_status = commands.add_parser('queue-status', help="job queue state (and pushed deals export)")
+    queue_status.add_argument('--export', help="write the pushed deals to a json lines file")
+
+    subscriptions = commands.add_parser('subscriptions', help="scrape once, email every subscriber a digest")
+    subscriptions.add_argument('subscriptions_file')
+
+    monitor = commands.add_parser('monitor', help="monitor routes and email price drops")
+    monitor.add_argument('routes_file')
+    monitor.add_argument('email')
+
+    explore = commands.add_parser('explore', help="cheapest destinations over http (no browser)")
+    explore.add_argument('origins', nargs='+')
+    explore.add_argument('--month', type=int)
+    explore.add_argument('--year', type=int)
+    explore.add_argument('--duration')
+
+    return arg_parser
+
+
+def cli(argv=None):
+    """
+    command line entry point
+    :param argv:
+    :return: exit code
+    """
+    arg_parser = build_arg_parser()
+    args = arg_parser.parse_args(argv)
+
+    if args.command == 'search':
+        if bool(args.depart) != bool(args.return_date):
+            arg_parser.error("--depart and --return go together")
+        return run_search(origin=args.origin, destination=args.destination, month=args.month, year=args.year,
+                          duration=args.duration, depart_date=args.depart, return_date=args.return_date,
+                          bags=args.bags, out=args.out, receiver=args.email, workers=args.workers, live=args.live,
+                          cfg_file=args.cfg)
+    if args.command == 'matrix':
+        return run_date_matrix(origin=args.origin, destination=args.destination, month=args.month, year=args.year,
+                               duration=args.duration, bags=args.bags, out=args.out, receiver=args.email,
+                               workers=args.workers, cfg_file=args.cfg)
+    if args.command == 'batch':
+        run_batch(args.jobs_file, cfg_file=args.cfg)
+    elif args.command == 'enqueue':
+        run_enqueue(args.jobs_file, cfg_file=args.cfg)
+    elif args.command == 'worker':
+        run_worker(worker_id=args.worker_id, workers=args.workers, exit_when_drained=args.exit_when_drained,
+                   cfg_file=args.cfg)
+    elif args.command == 'queue-status':
+        run_queue_status(export_file=args.export, cfg_file=args.cfg)
+    elif args.command == 'subscriptions':
+        run_subscriptions(args.subscriptions_file, cfg_file=args.cfg)
+    elif args.command == 'monitor':
+        run_monitor(args.routes_file, args.email, cfg_file=args.cfg)
+    elif args.command == 'explore':
+        run_explore_sweep(args.origins, year=args.year, month=args.month, duration=args.duration, cfg_file=args.cfg)
+    else:
+        main(cfg_file=args.cfg)
+
+    return 0
 
 
 if __name__ == "__main__":
-    main()
+    sys.exit(cli())